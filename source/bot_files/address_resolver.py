@@ -0,0 +1,125 @@
+"""
+Keeps public IP and server_address DNS lookup up to date in the background, so commands like ?ip and ?status
+can show them right away without waiting on an outside website or DNS server.
+Values older than address_refresh_interval are fetched again, server_ip config only saved to file when IP changes.
+"""
+
+import time
+import socket
+import asyncio
+from typing import Union, List
+
+import aiohttp
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint
+from bot_files.metadata_client import metadata_client
+
+
+class Address_Resolver:
+    lookup_timeout = 5
+
+    def __init__(self):
+        self.public_ip = None
+        self.address = None  # server_address the address_ips are for, in case user switches servers.
+        self.address_ips = []
+        self.ip_updated = self.address_updated = 0  # time.monotonic() of last attempt.
+        self.refresh_lock = None
+
+    def _is_stale(self, last_updated: float) -> bool:
+        return not last_updated or time.monotonic() - last_updated >= config.get_config('address_refresh_interval')
+
+    async def fetch_public_ip(self) -> Union[str, None]:
+        """
+        Gets public IP from public_ip_url website.
+
+        Returns:
+            str, None: IP address, or None if failed.
+        """
+
+        try:
+            session = await metadata_client.get_session()
+            async with session.get(config.get_config('public_ip_url'), timeout=aiohttp.ClientTimeout(total=self.lookup_timeout)) as response:
+                response.raise_for_status()
+                return (await response.json(content_type=None))['ip']
+        except Exception as e:
+            lprint(f"ERROR: Could not get public IP: {e}")
+        return None
+
+    async def resolve_address(self, address: str) -> List[str]:
+        """
+        Looks up IP addresses of domain using event loop's resolver (doesn't block bot).
+
+        Args:
+            address str: Domain or IP.
+
+        Returns:
+            list: Unique IP addresses, empty if lookup failed.
+        """
+
+        if not address: return []
+        try:
+            results = await asyncio.wait_for(asyncio.get_event_loop().getaddrinfo(address, None, type=socket.SOCK_STREAM), timeout=self.lookup_timeout)
+        except Exception as e:
+            lprint(f"ERROR: Could not resolve {address}: {e}")
+            return []
+        return sorted({i[4][0] for i in results})
+
+    async def refresh(self, force: bool = False) -> None:
+        """
+        Updates public IP and server_address lookup if older than address_refresh_interval.
+
+        Args:
+            force bool(False): Update even if cached values are still fresh.
+        """
+
+        if self.refresh_lock is None:
+            self.refresh_lock = asyncio.Lock()
+
+        # If a refresh is already running, callers just wait for it instead of sending their own requests.
+        async with self.refresh_lock:
+            address = config.get_config('server_address')
+            update_ip = force or self._is_stale(self.ip_updated)
+            update_address = force or address != self.address or self._is_stale(self.address_updated)
+            if not update_ip and not update_address: return
+
+            public_ip, address_ips = await asyncio.gather(self.fetch_public_ip() if update_ip else asyncio.sleep(0),
+                                                          self.resolve_address(address) if update_address else asyncio.sleep(0))
+
+            if update_ip:
+                self.ip_updated = time.monotonic()  # Also set on fail so a site that's down isn't asked again every call.
+                if public_ip:
+                    self.public_ip = public_ip
+                    # Only rewrites config file if IP actually changed.
+                    if public_ip != config.get_config('server_ip'):
+                        config.set_config('server_ip', public_ip)
+                        lprint(f"INFO: Public IP changed: {public_ip}")
+
+            if update_address:
+                # Keeps last good lookup if DNS is briefly failing, unless it was for a different address.
+                if address_ips or address != self.address: self.address_ips = address_ips
+                self.address, self.address_updated = address, time.monotonic()
+
+    def get_public_ip(self) -> Union[str, None]:
+        """
+        Gets cached public IP, falls back to last saved server_ip config. Does not make any requests.
+
+        Returns:
+            str, None: IP address.
+        """
+
+        return self.public_ip or config.get_config('server_ip')
+
+    def get_address_ips(self) -> List[str]:
+        """
+        Gets cached IP addresses that server_address resolves to. Does not make any requests.
+
+        Returns:
+            list: IP addresses, empty if not resolved yet or lookup failed.
+        """
+
+        if self.address != config.get_config('server_address'): return []
+        return self.address_ips
+
+
+address_resolver = Address_Resolver()
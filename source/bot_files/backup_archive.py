@@ -0,0 +1,278 @@
+"""
+Compressed backup archives, used when server's backup_format is 'archive'.
+Backup folder gets a backup.tar.zst (or backup.tar.gz if zstandard module isn't installed) and an index.json.
+The tar stream is cut into frames of about archive_frame_size, each compressed on its own in a process pool. Frames are
+written one after another, which is still a normal .tar.zst/.tar.gz that other tools can open. index.json records where
+each frame and each file is, so one folder or file can be extracted by only decompressing the frames it's in.
+"""
+
+import os
+import gzip
+import json
+import time
+import bisect
+import hashlib
+import tarfile
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join, isfile, isdir, dirname
+from typing import Union, Dict, List, Tuple, Callable
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint
+from bot_files.io_throttle import io_throttle
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # Falls back to gzip.
+
+
+def _init_worker() -> None:
+    io_throttle.lower_priority()
+
+
+def _compress(data: bytes, compression: str, level: int) -> bytes:
+    if compression == 'zstd':
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=min(max(level, 1), 9), mtime=0)
+
+
+def _decompress(data: bytes, compression: str) -> bytes:
+    if compression == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _compress_frame(segments: List[Tuple], compression: str, level: int) -> Tuple[bytes, str]:
+    """
+    Runs in worker process. Reads frame's part of the tar stream and compresses it.
+
+    Args:
+        segments list: (bytes, None, 0, length) for tar headers/padding, (None, file path, offset, length) for file data.
+        compression str: 'zstd' or 'gzip'.
+        level int: Compression level.
+
+    Returns:
+        tuple: Compressed frame, SHA-256 of uncompressed frame.
+    """
+
+    raw = bytearray()
+    for data, file_path, offset, length in segments:
+        if file_path is None:
+            raw += data
+            continue
+        with open(file_path, 'rb') as file:
+            file.seek(offset)
+            data = file.read(length)
+        raw += data + bytes(length - len(data))  # If file shrank since it was listed, keeps planned offsets correct.
+    return _compress(bytes(raw), compression, level), hashlib.sha256(raw).hexdigest()
+
+
+class Backup_Archive:
+    index_name = 'index.json'
+
+    def get_compression(self) -> Tuple[str, str]:
+        """Returns compression name and archive file name."""
+
+        if zstandard: return 'zstd', 'backup.tar.zst'
+        return 'gzip', 'backup.tar.gz'
+
+    def is_archive_backup(self, backup_path: str) -> bool:
+        return isfile(join(backup_path, self.index_name))
+
+    def load_index(self, backup_path: str) -> Union[Dict, None]:
+        try:
+            with open(join(backup_path, self.index_name)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def backup_folders(self, backup_path: str) -> List[str]:
+        """Top level folders in archive, like listdir on a copied backup."""
+
+        if not (index := self.load_index(backup_path)): return []
+        return sorted({name.split('/')[0] for name, member in index['members'].items() if member['type'] == 'dir'})
+
+    def _plan_frames(self, root: str, folders: List[str]) -> Tuple[List[List[Tuple]], Dict, List[str]]:
+        """
+        Lists files and splits the tar stream into frames. Nothing is read yet, only file sizes are needed.
+
+        Returns:
+            tuple: Segments of each frame, members for index (with data offset in uncompressed stream), missing folders.
+        """
+
+        frame_size = config.get_config('archive_frame_size')
+        frames, members, missing = [], {}, []
+        current, current_size, offset = [], 0, 0
+
+        def add(segment):
+            nonlocal current, current_size, offset
+            current.append(segment)
+            current_size += segment[3]
+            offset += segment[3]
+            if current_size >= frame_size:
+                frames.append(current)
+                current, current_size = [], 0
+
+        def add_member(full_path, name, stat, is_dir):
+            info = tarfile.TarInfo(name)
+            info.mtime, info.mode = int(stat.st_mtime), stat.st_mode & 0o7777
+            if is_dir: info.type = tarfile.DIRTYPE
+            else: info.size = stat.st_size
+            header = info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+            add((header, None, 0, len(header)))
+            members[name] = {'type': 'dir' if is_dir else 'file', 'size': info.size, 'mtime': stat.st_mtime_ns, 'mode': info.mode, 'offset': offset}
+            if is_dir: return
+
+            file_offset = 0
+            while file_offset < stat.st_size:
+                length = min(stat.st_size - file_offset, max(frame_size - current_size, 512))
+                add((None, full_path, file_offset, length))
+                file_offset += length
+            if padding := -stat.st_size % tarfile.BLOCKSIZE:
+                add((bytes(padding), None, 0, padding))
+
+        for folder in folders:
+            folder_path = join(root, folder) if folder else root
+            if not isdir(folder_path):
+                missing.append(folder)
+                continue
+            for dir_path, dir_names, file_names in os.walk(folder_path):
+                rel_dir = os.path.relpath(dir_path, root).replace(os.sep, '/')
+                if rel_dir != '.': add_member(dir_path, rel_dir, os.stat(dir_path), True)
+                for name in file_names:
+                    try: stat = os.stat(join(dir_path, name))
+                    except OSError: continue  # File deleted while walking.
+                    add_member(join(dir_path, name), name if rel_dir == '.' else f'{rel_dir}/{name}', stat, False)
+
+        if current: frames.append(current)
+        return frames, members, missing
+
+    def create(self, root: str, folders: List[str], backup_path: str, level: int = 3, progress: Callable = None) -> Union[Dict, bool]:
+        """
+        Creates new archive backup. Frames are compressed by backup_workers processes.
+
+        Args:
+            root str: Server path.
+            folders list: Folders in root to back up, [''] for whole server folder.
+            backup_path str: New backup folder, archive and index.json will be saved in here.
+            level int(3): Compression level, see backup_compression_level config.
+            progress Callable(None): Called with (bytes, files) after each frame, e.g. Job.progress.
+
+        Returns:
+            dict, bool: Index of new archive, or False if failed.
+        """
+
+        start_time = time.time()
+        compression, archive_name = self.get_compression()
+        workers = config.get_config('backup_workers')
+        index = {'format': 'archive', 'created': start_time, 'compression': compression, 'archive': archive_name,
+                 'folders': folders, 'frames': [], 'members': {}, 'missing': [], 'total_bytes': 0, 'stored_bytes': 0}
+
+        try:
+            frames, index['members'], index['missing'] = self._plan_frames(root, folders)
+            frames.append([(bytes(tarfile.BLOCKSIZE * 2), None, 0, tarfile.BLOCKSIZE * 2)])  # End of tar archive marker.
+            os.makedirs(backup_path)
+
+            uncompressed_offset = compressed_offset = 0
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool, open(join(backup_path, archive_name), 'wb') as file:
+                def write_frame(future, segments):
+                    nonlocal uncompressed_offset, compressed_offset
+                    data, digest = future.result()
+                    size = sum(i[3] for i in segments)
+                    file.write(data)
+                    index['frames'].append([compressed_offset, len(data), uncompressed_offset, size, digest])
+                    compressed_offset += len(data)
+                    uncompressed_offset += size
+                    if progress: progress(size, 0)
+
+                # Only keeps a few frames in flight, so finished frames don't pile up in memory.
+                pending = deque()
+                for segments in frames:
+                    pending.append((pool.submit(_compress_frame, segments, compression, level), segments))
+                    if len(pending) >= workers * 2:
+                        write_frame(*pending.popleft())
+                while pending:
+                    write_frame(*pending.popleft())
+
+            if progress: progress(0, sum(i['type'] == 'file' for i in index['members'].values()))
+            index['total_bytes'] = sum(i['size'] for i in index['members'].values())
+            index['stored_bytes'] = compressed_offset
+            with open(join(backup_path, self.index_name), 'w') as file:
+                json.dump(index, file)
+        except:
+            lprint(f"ERROR: Issue creating backup archive: {root} > {backup_path}")
+            traceback.print_exc()
+            return False
+
+        lprint(f"INFO: Backup archive: {backup_path} ({len(index['members'])} items, {index['total_bytes']} bytes > {compressed_offset} {compression}, {time.time() - start_time:.1f}s)")
+        return index
+
+    def extract(self, backup_path: str, dest_root: str, folders: List[str] = None, progress: Callable = None, paths: List[str] = None) -> bool:
+        """
+        Extracts files from archive backup, only decompressing frames that are needed.
+
+        Args:
+            backup_path str: Backup folder containing archive and index.json.
+            dest_root str: Where to extract to, usually server path.
+            folders list(None): Only extract these top level folders, None for everything.
+            progress Callable(None): Called with (bytes, files) after each file, e.g. Job.progress.
+            paths list(None): Only extract these files (relative paths, '/' separated), for delta restores. Overrides folders.
+
+        Returns:
+            bool: If successful.
+        """
+
+        if not (index := self.load_index(backup_path)):
+            lprint(f"ERROR: Could not read archive index: {backup_path}")
+            return False
+        if index['compression'] == 'zstd' and not zstandard:
+            lprint(f"ERROR: Need zstandard module to extract: {backup_path}")
+            return False
+
+        frames = index['frames']
+        frame_starts = [i[2] for i in frames]
+        if paths is not None:
+            paths = set(paths)
+            selected = [(name, member) for name, member in index['members'].items() if name in paths]
+        else: selected = [(name, member) for name, member in index['members'].items() if folders is None or name.split('/')[0] in folders]
+        selected.sort(key=lambda i: i[1]['offset'])
+        cached = [None, None]  # Frame number, decompressed data. Members are in stream order, so each frame is only decompressed once.
+
+        try:
+            with open(join(backup_path, index['archive']), 'rb') as archive:
+                def get_frame(number):
+                    if cached[0] != number:
+                        archive.seek(frames[number][0])
+                        cached[:] = number, _decompress(archive.read(frames[number][1]), index['compression'])
+                    return cached[1]
+
+                for name, member in selected:
+                    path = join(dest_root, *name.split('/'))
+                    if member['type'] == 'dir':
+                        os.makedirs(path, exist_ok=True)
+                        continue
+                    os.makedirs(dirname(path), exist_ok=True)
+                    with open(path, 'wb') as file:
+                        position, end = member['offset'], member['offset'] + member['size']
+                        while position < end:
+                            number = bisect.bisect_right(frame_starts, position) - 1
+                            frame_start, frame_size = frames[number][2], frames[number][3]
+                            length = min(end, frame_start + frame_size) - position
+                            file.write(get_frame(number)[position - frame_start:position - frame_start + length])
+                            position += length
+                    os.chmod(path, member['mode'])
+                    os.utime(path, ns=(member['mtime'], member['mtime']))
+                    if progress: progress(member['size'], 1)
+        except:
+            lprint(f"ERROR: Issue extracting backup archive: {backup_path} > {dest_root}")
+            traceback.print_exc()
+            return False
+
+        lprint(f"INFO: Extracted backup archive: {backup_path} > {dest_root}")
+        return True
+
+
+backup_archive = Backup_Archive()
@@ -0,0 +1,402 @@
+"""
+SQLite catalog of world and server backups, so commands don't need to list and sort backup folders every time.
+Each backup gets an ID that never changes or gets reused, ?worldrestore 12 always means the same backup even if others
+were added or deleted since it was listed. Entries are added when a backup is made and removed when it's deleted.
+sync() picks up backup folders made or deleted outside the bot (and backups from before the catalog existed).
+
+Along with summary (size, file count, checksum), each file's size, modified time and SHA-256 (where known) is kept in
+the files table, used for verifying and restoring backups.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import datetime
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, isdir, isfile, dirname
+from typing import Union, Dict, List, Tuple, Callable, Iterable
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint, file_utils
+from bot_files.backup_store import chunk_store
+from bot_files.backup_archive import backup_archive
+from bot_files.io_throttle import io_throttle
+
+
+class Backup_Catalog:
+    schema = """
+        CREATE TABLE IF NOT EXISTS backups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            server TEXT NOT NULL,
+            kind TEXT NOT NULL,  -- 'world' or 'server'
+            name TEXT NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            created REAL NOT NULL,
+            version TEXT,
+            format TEXT,
+            size INTEGER,  -- Total bytes of backed up files.
+            stored INTEGER,  -- Bytes this backup added on disk, less than size for dedup, hardlink, and archive formats.
+            files INTEGER,
+            checksum TEXT
+        );
+        CREATE INDEX IF NOT EXISTS backups_server_kind ON backups (server, kind, created);
+        CREATE TABLE IF NOT EXISTS files (
+            backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+            path TEXT NOT NULL,  -- Relative to backup folder (or server folder for dedup and archive backups), '/' separated.
+            size INTEGER NOT NULL,
+            mtime INTEGER NOT NULL,  -- Nanoseconds.
+            digest TEXT,  -- SHA-256 of file, None for dedup and archive backups (chunks and frames have their own hashes).
+            PRIMARY KEY (backup_id, path)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS verifications (
+            backup_id INTEGER NOT NULL REFERENCES backups (id) ON DELETE CASCADE,
+            time REAL NOT NULL,
+            ok INTEGER NOT NULL,
+            checked INTEGER NOT NULL,  -- Files (or archive frames) checked.
+            problems TEXT  -- Newline separated, only first ones.
+        );
+        CREATE INDEX IF NOT EXISTS verifications_backup ON verifications (backup_id, time);
+        CREATE TABLE IF NOT EXISTS offsite (
+            backup_id INTEGER PRIMARY KEY REFERENCES backups (id) ON DELETE CASCADE,
+            uploaded REAL NOT NULL,
+            key TEXT NOT NULL,  -- Backup folder in bucket.
+            bytes INTEGER NOT NULL  -- Bytes uploaded, less than size if chunks or files were already in bucket.
+        );
+        CREATE TABLE IF NOT EXISTS offsite_objects (
+            digest TEXT PRIMARY KEY  -- Dedup store chunks already in bucket.
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self):
+        self.db = None
+        self.db_path = None
+        self.lock = threading.Lock()  # Jobs add backups from worker threads.
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens catalog database, creating it if needed."""
+
+        db_path = config.get_config('backup_catalog_filepath')
+        if self.db is None or self.db_path != db_path:
+            os.makedirs(dirname(db_path), exist_ok=True)
+            self.db = sqlite3.connect(db_path, check_same_thread=False)
+            self.db.row_factory = sqlite3.Row
+            self.db.execute('PRAGMA foreign_keys = ON')
+            self.db.execute('PRAGMA journal_mode = WAL')
+            self.db.executescript(self.schema)
+            self.db_path = db_path
+        return self.db
+
+    def _normalize_path(self, path: str) -> str:
+        return os.path.normpath(re.sub(r'/+', '/', str(path)))
+
+    def add_backup(self, server: str, kind: str, path: str, created: float = None, version: str = None, backup_format: str = None,
+                   summary: Dict = None) -> Union[int, bool]:
+        """
+        Adds backup to catalog, or updates its entry if path is already in it (e.g. picked up by sync()).
+
+        Args:
+            server str: Server name.
+            kind str: 'world' or 'server'.
+            path str: Backup folder.
+            created float(None): Unix time, defaults to now.
+            version str(None): Minecraft version backup was made with.
+            backup_format str(None): copy, hardlink, dedup, region, or archive.
+            summary dict(None): From summarize(), has size, stored, files, checksum, and file_rows.
+
+        Returns:
+            int, bool: Backup ID, or False if failed.
+        """
+
+        summary = summary or {}
+        path = self._normalize_path(path)
+        try:
+            with self.lock, self._connect() as db:
+                # Keeps ID of existing entry, so its verifications and offsite upload stay with it.
+                db.execute('INSERT INTO backups (server, kind, name, path, created, version, format, size, stored, files, checksum) '
+                           'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET server = excluded.server, '
+                           'kind = excluded.kind, name = excluded.name, created = excluded.created, version = excluded.version, '
+                           'format = excluded.format, size = excluded.size, stored = excluded.stored, files = excluded.files, '
+                           'checksum = excluded.checksum',
+                           (server, kind, os.path.basename(path), path, created or time.time(), version,
+                            backup_format, summary.get('size'), summary.get('stored'), summary.get('files'), summary.get('checksum')))
+                backup_id = db.execute('SELECT id FROM backups WHERE path = ?', (path,)).fetchone()[0]
+                db.execute('DELETE FROM files WHERE backup_id = ?', (backup_id,))
+                db.executemany('INSERT INTO files (backup_id, path, size, mtime, digest) VALUES (?, ?, ?, ?, ?)',
+                               ((backup_id, *row) for row in summary.get('file_rows', [])))
+                return backup_id
+        except:
+            lprint(f"ERROR: Could not add backup to catalog: {path}")
+            traceback.print_exc()
+            return False
+
+    def remove_backup(self, backup_id: int) -> bool:
+        """Removes backup (and its files list) from catalog. Does not delete backup folder, see backend.delete_backup()."""
+
+        try:
+            with self.lock, self._connect() as db:
+                return db.execute('DELETE FROM backups WHERE id = ?', (backup_id,)).rowcount > 0
+        except:
+            traceback.print_exc()
+            return False
+
+    def get_backup(self, backup_id: int, server: str = None, kind: str = None) -> Union[Dict, None]:
+        """
+        Gets catalog entry by ID.
+
+        Args:
+            backup_id int: Backup ID, from ?worldbackups or ?serverbackups.
+            server str(None): Only match if backup belongs to this server.
+            kind str(None): Only match if backup is this kind, 'world' or 'server'.
+
+        Returns:
+            dict, None: Backup entry, None if not found.
+        """
+
+        with self.lock:
+            row = self._connect().execute('SELECT * FROM backups WHERE id = ?', (backup_id,)).fetchone()
+        if not row or (server and row['server'] != server) or (kind and row['kind'] != kind):
+            return None
+        return dict(row)
+
+    def get_backups(self, server: str, kind: str, limit: int = None) -> List[Dict]:
+        """
+        Gets server's backups, newest first.
+
+        Args:
+            server str: Server name.
+            kind str: 'world' or 'server'.
+            limit int(None): Max number to get.
+
+        Returns:
+            list: Backup entries.
+        """
+
+        with self.lock:
+            rows = self._connect().execute('SELECT * FROM backups WHERE server = ? AND kind = ? ORDER BY created DESC, id DESC LIMIT ?',
+                                           (server, kind, -1 if limit is None else limit)).fetchall()
+        return [dict(i) for i in rows]
+
+    def get_backups_by_format(self, formats: List[str]) -> List[Dict]:
+        """Gets all servers' backups that use any of formats, e.g. ['dedup', 'region']."""
+
+        with self.lock:
+            rows = self._connect().execute(f"SELECT * FROM backups WHERE format IN ({', '.join('?' * len(formats))})", formats).fetchall()
+        return [dict(i) for i in rows]
+
+    def get_files(self, backup_id: int) -> Dict[str, Dict]:
+        """
+        Gets backup's recorded files.
+
+        Returns:
+            dict: Relative path as key, dict with 'size', 'mtime', 'digest' as value.
+        """
+
+        with self.lock:
+            rows = self._connect().execute('SELECT path, size, mtime, digest FROM files WHERE backup_id = ?', (backup_id,)).fetchall()
+        return {i['path']: {'size': i['size'], 'mtime': i['mtime'], 'digest': i['digest']} for i in rows}
+
+    def add_verification(self, backup_id: int, result: Dict) -> bool:
+        """
+        Saves result of backup verify.
+
+        Args:
+            backup_id int: Backup ID.
+            result dict: From backup_verify.verify(), has 'ok', 'checked', 'problems'.
+
+        Returns:
+            bool: If saved.
+        """
+
+        try:
+            with self.lock, self._connect() as db:
+                db.execute('INSERT INTO verifications (backup_id, time, ok, checked, problems) VALUES (?, ?, ?, ?, ?)',
+                           (backup_id, time.time(), int(result['ok']), result['checked'], '\n'.join(result['problems'])))
+            return True
+        except:
+            lprint(f"ERROR: Could not save verify result of backup {backup_id}")
+            traceback.print_exc()
+            return False
+
+    def get_verification(self, backup_id: int) -> Union[Dict, None]:
+        """
+        Gets backup's latest verify result.
+
+        Returns:
+            dict, None: 'time', 'ok' (bool), 'checked', 'problems' (list). None if never verified.
+        """
+
+        with self.lock:
+            row = self._connect().execute('SELECT * FROM verifications WHERE backup_id = ? ORDER BY time DESC LIMIT 1', (backup_id,)).fetchone()
+        if not row: return None
+        return {'time': row['time'], 'ok': bool(row['ok']), 'checked': row['checked'], 'problems': row['problems'].split('\n') if row['problems'] else []}
+
+    def get_unreplicated_backups(self) -> List[Dict]:
+        """Gets all servers' backups not uploaded to offsite storage yet, oldest first."""
+
+        with self.lock:
+            rows = self._connect().execute('SELECT * FROM backups WHERE id NOT IN (SELECT backup_id FROM offsite) ORDER BY created, id').fetchall()
+        return [dict(i) for i in rows]
+
+    def set_replicated(self, backup_id: int, key: str, num_bytes: int) -> bool:
+        """Marks backup as uploaded to offsite storage."""
+
+        try:
+            with self.lock, self._connect() as db:
+                db.execute('INSERT OR REPLACE INTO offsite (backup_id, uploaded, key, bytes) VALUES (?, ?, ?, ?)', (backup_id, time.time(), key, num_bytes))
+            return True
+        except:
+            traceback.print_exc()
+            return False
+
+    def get_replicated(self, backup_id: int) -> Union[Dict, None]:
+        """Gets backup's offsite upload info, 'uploaded' time, 'key', 'bytes'. None if not uploaded."""
+
+        with self.lock:
+            row = self._connect().execute('SELECT uploaded, key, bytes FROM offsite WHERE backup_id = ?', (backup_id,)).fetchone()
+        return dict(row) if row else None
+
+    def get_offsite_objects(self) -> set:
+        """Gets hashes of dedup chunks already uploaded to offsite storage."""
+
+        with self.lock:
+            return {i[0] for i in self._connect().execute('SELECT digest FROM offsite_objects')}
+
+    def add_offsite_objects(self, digests: List[str]) -> None:
+        if not digests: return
+        try:
+            with self.lock, self._connect() as db:
+                db.executemany('INSERT OR IGNORE INTO offsite_objects (digest) VALUES (?)', ((i,) for i in digests))
+        except:
+            traceback.print_exc()
+
+    def get_format(self, backup_path: str) -> str:
+        if chunk_store.is_dedup_backup(backup_path):
+            return (chunk_store.load_manifest(backup_path) or {}).get('format', 'dedup')
+        if backup_archive.is_archive_backup(backup_path):
+            return 'archive'
+        return 'copy'
+
+    def summarize(self, backup_path: str, previous_files: Dict[str, Dict] = None, progress: Callable = None) -> Dict:
+        """
+        Gets size, file count, checksum and files list of backup folder. Blocking, run in job thread.
+        Copied backups are hashed file by file (backup_workers threads), checksum is SHA-256 of all 'path digest' lines.
+        Dedup and archive backups use their manifest/index, checksum is SHA-256 of that file.
+
+        Args:
+            backup_path str: Backup folder.
+            previous_files dict(None): Files of previous backup from get_files(). Hardlinked files that match it aren't hashed again.
+            progress Callable(None): Called with (bytes, files) after each hashed file, e.g. Job.progress.
+
+        Returns:
+            dict: 'size', 'stored', 'files', 'checksum', and 'file_rows' (path, size, mtime, digest) tuples.
+        """
+
+        for meta_name, load in ((chunk_store.manifest_name, chunk_store.load_manifest), (backup_archive.index_name, backup_archive.load_index)):
+            if not isfile(meta_path := join(backup_path, meta_name)):
+                continue
+            data = load(backup_path)
+            entries = data['files'] if 'files' in data else {k: v for k, v in data['members'].items() if v['type'] == 'file'}
+            return {'size': data['total_bytes'], 'stored': data['stored_bytes'] + os.path.getsize(meta_path), 'files': len(entries),
+                    'checksum': file_utils.hash_file(meta_path),
+                    'file_rows': [(k.replace(os.sep, '/'), v['size'], v['mtime'], None) for k, v in entries.items()]}
+
+        previous_files = previous_files or {}
+        files = []
+        for dir_path, dir_names, file_names in os.walk(backup_path):
+            for name in file_names:
+                full_path = join(dir_path, name)
+                files.append((os.path.relpath(full_path, backup_path).replace(os.sep, '/'), full_path, os.stat(full_path)))
+
+        def get_row(item):
+            rel_path, full_path, stat = item
+            old = previous_files.get(rel_path)
+            # Hardlinked to previous backup, same data so same hash.
+            if stat.st_nlink > 1 and old and old['digest'] and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime_ns:
+                digest = old['digest']
+            else:
+                digest = file_utils.hash_file(full_path)
+                if progress: progress(stat.st_size, 0)
+            if progress: progress(0, 1)
+            return rel_path, stat.st_size, stat.st_mtime_ns, digest
+
+        with ThreadPoolExecutor(max_workers=config.get_config('backup_workers'), initializer=io_throttle.lower_priority) as pool:
+            rows = sorted(pool.map(get_row, files))
+
+        checksum = hashlib.sha256()
+        for rel_path, size, mtime, digest in rows:
+            checksum.update(f'{rel_path} {digest}\n'.encode('utf-8', 'surrogateescape'))
+        return {'size': sum(i[2].st_size for i in files), 'stored': sum(i[2].st_size for i in files if i[2].st_nlink == 1),
+                'files': len(rows), 'checksum': checksum.hexdigest(), 'file_rows': rows}
+
+    def add_new_backup(self, server: str, kind: str, backup_path: str, version: str = None, backup_format: str = None,
+                       progress: Callable = None) -> Union[int, bool]:
+        """
+        Summarizes just made backup and adds it to catalog. Blocking, runs in backup job thread.
+
+        Returns:
+            int, bool: New backup ID, or False if failed or cancelled.
+        """
+
+        try:
+            previous_files = {}
+            if backup_format == 'hardlink' and (previous := self.get_backups(server, kind, 1)):
+                previous_files = self.get_files(previous[0]['id'])
+            summary = self.summarize(backup_path, previous_files, progress)
+        except:
+            lprint(f"ERROR: Could not summarize backup: {backup_path}")
+            traceback.print_exc()
+            return False
+        return self.add_backup(server, kind, backup_path, version=version, backup_format=backup_format, summary=summary)
+
+    def _parse_name(self, name: str, path: str) -> Tuple[float, Union[str, None]]:
+        """Gets creation time and version from backup folder name, e.g. '(2023-08-03 16-29) v(1.19.4) test backup'."""
+
+        try: created = datetime.datetime.strptime(name[1:17], '%Y-%m-%d %H-%M').timestamp()
+        except ValueError: created = os.stat(path).st_mtime
+        version = match.group(1) if (match := re.search(r'v\((.+?)\)', name)) else None
+        return created, version
+
+    def sync(self, server: str, kind: str, backups_path: str, skip_paths: Iterable[str] = ()) -> Tuple[int, int]:
+        """
+        Adds backup folders missing from catalog, and removes entries whose folder is gone.
+        Only one listdir, only folders not in catalog yet are checked. Their size and checksum are left empty.
+
+        Args:
+            server str: Server name.
+            kind str: 'world' or 'server'.
+            backups_path str: world_backups_path or server_backups_path.
+            skip_paths iterable(()): Backups still being made, their job adds them once done.
+
+        Returns:
+            tuple: Number of backups added and removed.
+        """
+
+        if not isdir(backups_path): names = []
+        else: names = [i for i in os.listdir(backups_path) if not i.startswith('.')]  # Skips hidden, e.g. file_utils.trash_dir() leftovers.
+        on_disk = {self._normalize_path(join(backups_path, i)): i for i in names}
+        cataloged = {i['path']: i['id'] for i in self.get_backups(server, kind)}
+        skip_paths = {self._normalize_path(i) for i in skip_paths}
+
+        removed = 0
+        for path, backup_id in cataloged.items():
+            if path not in on_disk and self.remove_backup(backup_id):
+                removed += 1
+
+        added = 0
+        for path, name in on_disk.items():
+            if path in cataloged or path in skip_paths or not isdir(path):
+                continue
+            created, version = self._parse_name(name, path)
+            if self.add_backup(server, kind, path, created, version, self.get_format(path)):
+                added += 1
+
+        if added or removed:
+            lprint(f"INFO: Synced {kind} backups catalog for {server}: {added} added, {removed} removed")
+        return added, removed
+
+
+backup_catalog = Backup_Catalog()
@@ -0,0 +1,207 @@
+"""
+Runs long file jobs (backups, restores) in worker threads, so they don't hold up the bot.
+Each job edits one Discord message with its progress. Only max_io_jobs_per_disk jobs run at once on the same disk,
+others wait in queue. Jobs can be cancelled with ?jobcancel, work functions stop at their next progress() call.
+"""
+
+import os
+import time
+import asyncio
+import threading
+import functools
+import traceback
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Any, List, Callable, AsyncContextManager
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint, utils
+from bot_files.io_throttle import io_throttle
+
+
+class Job_Cancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, job_id: int, name: str):
+        self.id = job_id
+        self.name = name
+        self.state = 'queued'  # queued, running, done, failed, cancelled.
+        self.started = self.finished = None  # time.monotonic()
+        self.bytes_done = self.files_done = 0
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.cancel_wakeup = asyncio.Event()  # Wakes job waiting in queue, so it's cancelled right away.
+
+    def progress(self, num_bytes: int = 0, files: int = 0) -> None:
+        """
+        Called by work functions (from any thread) after each file or block. Waits here if over backup_io_limit.
+
+        Args:
+            num_bytes int(0): Bytes read/written since last call.
+            files int(0): Files done since last call.
+
+        Raises:
+            Job_Cancelled: If job was cancelled.
+        """
+
+        if self.cancel_event.is_set():
+            raise Job_Cancelled(f"Job {self.id} cancelled")
+        with self.lock:
+            self.bytes_done += num_bytes
+            self.files_done += files
+        io_throttle.consume(num_bytes)
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+        self.cancel_wakeup.set()
+
+    def get_elapsed(self) -> float:
+        if not self.started: return 0
+        return (self.finished or time.monotonic()) - self.started
+
+    def get_status(self) -> str:
+        """Status line, e.g. 'Job 3: World backup: test - running 1.2GB, 340 files, 56.1s (21.4MB/s, 6.1 files/s)'."""
+
+        text = f"Job {self.id}: {self.name} - {self.state}"
+        if elapsed := self.get_elapsed():
+            text += f" {utils.format_bytes(self.bytes_done)}, {self.files_done} files, {elapsed:.1f}s" \
+                    f" ({utils.format_bytes(self.bytes_done / elapsed)}/s, {self.files_done / elapsed:.1f} files/s)"
+        return text
+
+
+class Job_Manager:
+    keep_finished = 20
+
+    def __init__(self):
+        self.jobs = {}  # Job ID: Job
+        self.next_id = 1
+        self.disk_semaphores = {}  # st_dev: asyncio.Semaphore
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='slime_job', initializer=io_throttle.lower_priority)
+
+    def _get_disks(self, paths: List[str]) -> List[int]:
+        """Gets device IDs of paths, using nearest existing parent for paths not created yet."""
+
+        disks = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            while not os.path.exists(path) and os.path.dirname(path) != path:
+                path = os.path.dirname(path)
+            try: disks.add(os.stat(path).st_dev)
+            except OSError: continue
+        return sorted(disks)  # Always acquired in same order, so two jobs can't wait on each other.
+
+    def get_jobs(self) -> List[Job]:
+        return list(self.jobs.values())
+
+    def cancel(self, job_id: int) -> Union[Job, bool]:
+        """
+        Cancel queued or running job.
+
+        Args:
+            job_id int: Job ID, from ?jobs.
+
+        Returns:
+            Job, bool: Cancelled job, or False if not found or already finished.
+        """
+
+        if (job := self.jobs.get(job_id)) and job.state in ('queued', 'running'):
+            job.cancel()
+            return job
+        return False
+
+    async def _acquire(self, semaphore: asyncio.Semaphore, job: Job) -> bool:
+        """
+        Waits for semaphore, or until job is cancelled.
+
+        Returns:
+            bool: If semaphore was acquired, release it when done.
+        """
+
+        acquire = asyncio.ensure_future(semaphore.acquire())
+        cancelled = asyncio.ensure_future(job.cancel_wakeup.wait())
+        try:
+            await asyncio.wait((acquire, cancelled), return_when=asyncio.FIRST_COMPLETED)
+        except BaseException:
+            # Semaphore.acquire() gives its turn to the next waiter when cancelled, only need to release if already acquired.
+            if not acquire.cancel(): semaphore.release()
+            raise
+        finally:
+            cancelled.cancel()
+        if acquire.done(): return True
+        acquire.cancel()
+        return False
+
+    async def _update_message(self, job: Job, message: Any) -> None:
+        """Edits job's Discord message with its progress every job_progress_interval seconds."""
+
+        while True:
+            await asyncio.sleep(config.get_config('job_progress_interval'))
+            try: await message.edit(content=f"`{job.get_status()}`")
+            except: pass
+
+    async def run(self, name: str, func: Callable, *args, paths: List[str] = (), send_msg: Callable = None,
+                  context: AsyncContextManager = None, **kwargs) -> Any:
+        """
+        Run function as job in worker thread. Function gets progress=Job.progress keyword argument.
+
+        Args:
+            name str: Shown in ?jobs and progress message.
+            func Callable: Blocking function to run.
+            paths list(()): Paths job reads or writes, used to limit jobs per disk.
+            send_msg Callable(None): Coroutine for sending progress message, e.g. backend.send_msg.
+            context AsyncContextManager(None): Entered once job's turn comes up and held while it runs, e.g. backend.saving_paused_snapshot().
+
+        Returns:
+            Any: Function's return value, False if failed or cancelled.
+        """
+
+        job = Job(self.next_id, name)
+        self.next_id += 1
+        self.jobs[job.id] = job
+        lprint(f"INFO: Job {job.id} queued: {name}")
+
+        message = await send_msg(f"`{job.get_status()}`") if send_msg else None
+        updater = asyncio.create_task(self._update_message(job, message)) if message else None
+        result = False
+        semaphores = [self.disk_semaphores.setdefault(i, asyncio.Semaphore(config.get_config('max_io_jobs_per_disk')))
+                      for i in self._get_disks(paths)]
+        acquired = []
+        try:
+            for semaphore in semaphores:
+                if not await self._acquire(semaphore, job): break
+                acquired.append(semaphore)
+            if job.cancel_event.is_set():
+                raise Job_Cancelled()
+
+            job.state, job.started = 'running', time.monotonic()
+            async with context or contextlib.nullcontext():
+                result = await asyncio.get_event_loop().run_in_executor(self.executor, functools.partial(func, *args, progress=job.progress, **kwargs))
+            # Work functions catch their own errors, so cancel can also show up as a False return.
+            job.state = 'cancelled' if job.cancel_event.is_set() else 'done'
+        except Job_Cancelled:
+            job.state, result = 'cancelled', False
+        except asyncio.CancelledError:
+            job.state = 'cancelled'
+            job.cancel_event.set()  # Worker thread carries on otherwise, stops it at next progress().
+            raise  # Not from ?jobcancel, e.g. bot shutting down.
+        except:
+            job.state, result = 'failed', False
+            traceback.print_exc()
+        finally:
+            for semaphore in acquired:
+                semaphore.release()
+            job.finished = time.monotonic()
+            if updater: updater.cancel()
+
+        if message:
+            try: await message.edit(content=f"`{job.get_status()}`")
+            except: pass
+        lprint(f"INFO: {job.get_status()}")
+
+        # Forgets oldest finished jobs.
+        finished = [i for i in self.jobs.values() if i.finished]
+        for old_job in finished[:-self.keep_finished]:
+            del self.jobs[old_job.id]
+        return result if job.state == 'done' else False
@@ -0,0 +1,245 @@
+"""
+Uploads finished backups to S3 compatible storage (AWS S3, MinIO, Backblaze B2, etc), so they survive losing the server's disk.
+Needs boto3 module and offsite_bucket config. Runs as background job, see backend.replicate_backups().
+
+Bucket layout, under offsite_prefix:
+    <server>/<world or server>/<backup name>/...  Files of backup folder, same as on disk.
+    objects/<ab>/<abcdef...>  Dedup store chunks, named by SHA-256 like backup_store_path. Only uploaded once, so each
+                              dedup backup only uploads chunks no earlier backup had.
+Manifest/index is uploaded last, so a backup folder in the bucket with one is complete.
+Every upload sends its SHA-256 so the storage checks it. Big files are uploaded in parts by offsite_concurrency threads,
+an interrupted upload carries on from parts already in the bucket.
+"""
+
+import os
+import time
+import base64
+import hashlib
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from os.path import join, isdir
+from typing import Union, Dict, List, Tuple, Callable, Any
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint, file_utils
+from bot_files.backup_store import chunk_store
+from bot_files.backup_archive import backup_archive
+from bot_files.backup_catalog import backup_catalog
+from bot_files.backup_jobs import Job_Cancelled
+
+try:
+    import boto3
+    from botocore.config import Config as Boto_Config
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None  # Offsite replication disabled.
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for all parts but the last.
+
+
+def _b64_digest(digest: str) -> str:
+    """SHA-256 hex to base64, format S3 checksums use."""
+
+    return base64.b64encode(bytes.fromhex(digest)).decode()
+
+
+class Backup_Offsite:
+    def is_enabled(self) -> bool:
+        return bool(config.get_config('offsite_bucket'))
+
+    def _get_client(self) -> Any:
+        concurrency = config.get_config('offsite_concurrency')
+        # Empty configs fall back to boto3 defaults, e.g. AWS credentials from environment or ~/.aws.
+        return boto3.client('s3', endpoint_url=config.get_config('offsite_endpoint_url') or None,
+                            region_name=config.get_config('offsite_region') or None,
+                            aws_access_key_id=config.get_config('offsite_access_key') or None,
+                            aws_secret_access_key=config.get_config('offsite_secret_key') or None,
+                            config=Boto_Config(max_pool_connections=concurrency * 2, retries={'max_attempts': 5, 'mode': 'adaptive'}))
+
+    def get_backup_key(self, backup: Dict) -> str:
+        return f"{config.get_config('offsite_prefix').strip('/')}/{backup['server']}/{backup['kind']}/{backup['name']}"
+
+    def get_object_key(self, digest: str) -> str:
+        return f"{config.get_config('offsite_prefix').strip('/')}/objects/{digest[:2]}/{digest}"
+
+    def _is_uploaded(self, client: Any, key: str, size: int, digest: str) -> bool:
+        """Checks if file is already in bucket (from interrupted replication), by size and SHA-256 saved with it."""
+
+        try: head = client.head_object(Bucket=config.get_config('offsite_bucket'), Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'): return False
+            raise
+        return head['ContentLength'] == size and head.get('Metadata', {}).get('sha256') == digest
+
+    def _put_file(self, client: Any, key: str, path: str, digest: str, progress: Callable = None) -> int:
+        """Uploads small file in one request. Storage checks SHA-256 and rejects it if it doesn't match."""
+
+        with open(path, 'rb') as file:
+            data = file.read()
+        if progress: progress(len(data), 0)
+        client.put_object(Bucket=config.get_config('offsite_bucket'), Key=key, Body=data, ChecksumSHA256=_b64_digest(digest),
+                          Metadata={'sha256': digest})
+        return len(data)
+
+    def _find_upload(self, client: Any, key: str) -> Tuple[Union[str, None], Dict[int, Dict]]:
+        """Gets unfinished multipart upload of key and its uploaded parts, so it can be resumed."""
+
+        bucket = config.get_config('offsite_bucket')
+        for upload in client.list_multipart_uploads(Bucket=bucket, Prefix=key).get('Uploads', []):
+            if upload['Key'] != key: continue
+            parts = {}
+            for page in client.get_paginator('list_parts').paginate(Bucket=bucket, Key=key, UploadId=upload['UploadId']):
+                parts.update({i['PartNumber']: i for i in page.get('Parts', [])})
+            return upload['UploadId'], parts
+        return None, {}
+
+    def _put_file_parts(self, client: Any, pool: ThreadPoolExecutor, key: str, path: str, size: int, digest: str,
+                        progress: Callable = None) -> int:
+        """
+        Uploads big file in parts using pool's threads. Parts already uploaded by an interrupted upload with the same
+        data are skipped.
+
+        Returns:
+            int: Bytes uploaded.
+        """
+
+        bucket = config.get_config('offsite_bucket')
+        part_size = max(config.get_config('offsite_part_size'), MIN_PART_SIZE)
+        upload_id, uploaded = self._find_upload(client, key)
+        if not upload_id:
+            upload_id = client.create_multipart_upload(Bucket=bucket, Key=key, ChecksumAlgorithm='SHA256', Metadata={'sha256': digest})['UploadId']
+
+        def put_part(number):
+            with open(path, 'rb') as file:
+                file.seek((number - 1) * part_size)
+                data = file.read(part_size)
+            checksum = base64.b64encode(hashlib.sha256(data).digest()).decode()
+            if (old := uploaded.get(number)) and old['Size'] == len(data):
+                if 'ChecksumSHA256' in old: same = old['ChecksumSHA256'] == checksum
+                else: same = old['ETag'].strip('"') == hashlib.md5(data).hexdigest()  # Some storage doesn't list part checksums, ETag is MD5.
+                if same:
+                    return {'PartNumber': number, 'ETag': old['ETag'], 'ChecksumSHA256': checksum}, 0
+            if progress: progress(len(data), 0)
+            response = client.upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=data,
+                                          ChecksumAlgorithm='SHA256', ChecksumSHA256=checksum)
+            return {'PartNumber': number, 'ETag': response['ETag'], 'ChecksumSHA256': checksum}, len(data)
+
+        results = list(pool.map(put_part, range(1, max(1, -(-size // part_size)) + 1)))
+        client.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': [i[0] for i in results]})
+        return sum(i[1] for i in results)
+
+    def _get_uploads(self, backup: Dict, uploaded_objects: set) -> Tuple[List[Tuple[str, str, int, str]], ...]:
+        """
+        Lists what to upload for backup, each as (bucket key, local path, size, SHA-256).
+
+        Returns:
+            tuple: Dedup chunks not uploaded yet, files of backup folder, and manifest/index (uploaded once everything else is done).
+        """
+
+        src, backup_key = backup['path'], self.get_backup_key(backup)
+        objects, files, last = [], [], []
+
+        if manifest := chunk_store.load_manifest(src):
+            digests = set()
+            for entry in manifest['files'].values():
+                if 'region' in entry:
+                    digests.add(entry['region'])
+                    digests.update(i[1] for i in chunk_store.read_region_table(entry['region']) if i[1])
+                else: digests.update(entry['chunks'])
+            # Chunk files are named by their SHA-256, no need to hash them again.
+            objects = [(self.get_object_key(i), chunk_store.object_path(i), os.path.getsize(chunk_store.object_path(i)), i)
+                       for i in sorted(digests - uploaded_objects)]
+
+        cataloged = backup_catalog.get_files(backup['id'])
+        meta_names = (chunk_store.manifest_name, backup_archive.index_name)
+        for dir_path, dir_names, file_names in os.walk(src):
+            for name in file_names:
+                path = join(dir_path, name)
+                rel_path = os.path.relpath(path, src).replace(os.sep, '/')
+                size = os.path.getsize(path)
+                digest = cataloged[rel_path]['digest'] if rel_path in cataloged and cataloged[rel_path]['digest'] else file_utils.hash_file(path)
+                (last if rel_path in meta_names else files).append((f'{backup_key}/{rel_path}', path, size, digest))
+        return objects, files, last
+
+    def replicate_backup(self, client: Any, pool: ThreadPoolExecutor, backup: Dict, progress: Callable = None) -> Union[int, bool]:
+        """
+        Uploads one backup, skipping files and dedup chunks already in bucket.
+
+        Returns:
+            int, bool: Bytes uploaded, False if failed.
+        """
+
+        start_time = time.time()
+        if not isdir(backup['path']):
+            lprint(f"ERROR: Offsite upload, backup folder missing: {backup['path']}")
+            return False
+
+        part_size = max(config.get_config('offsite_part_size'), MIN_PART_SIZE)
+        max_pending = config.get_config('offsite_concurrency') * 2
+        uploaded_bytes, new_objects = 0, []
+        try:
+            objects, files, last = self._get_uploads(backup, backup_catalog.get_offsite_objects())
+            for group, is_objects in ((objects, True), (files, False), (last, False)):
+                pending = {}  # Future: dedup chunk digest, None for other files.
+                def collect(done):
+                    nonlocal uploaded_bytes
+                    for future in done:
+                        uploaded_bytes += future.result()
+                        if digest := pending.pop(future): new_objects.append(digest)
+                        if progress: progress(0, 1)
+
+                for key, path, size, digest in group:
+                    if progress: progress()  # Stops here if job cancelled.
+                    # Dedup chunks not in catalog's list aren't in bucket, other files might be left from an interrupted upload.
+                    if not is_objects and self._is_uploaded(client, key, size, digest):
+                        if progress: progress(0, 1)
+                        continue
+                    if size > part_size:
+                        # Parts are spread over pool's threads, this thread waits for them.
+                        uploaded_bytes += self._put_file_parts(client, pool, key, path, size, digest, progress)
+                        if is_objects: new_objects.append(digest)
+                        if progress: progress(0, 1)
+                        continue
+                    pending[pool.submit(self._put_file, client, key, path, digest, progress)] = digest if is_objects else None
+                    if len(pending) >= max_pending:
+                        collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+                collect(wait(pending)[0])
+        except Job_Cancelled:
+            raise  # Stops remaining backups too.
+        except Exception:
+            lprint(f"ERROR: Offsite upload failed: {backup['path']}")
+            traceback.print_exc()
+            return False
+        finally:
+            backup_catalog.add_offsite_objects(new_objects)  # Chunks that made it are kept even if backup failed.
+
+        backup_catalog.set_replicated(backup['id'], self.get_backup_key(backup), uploaded_bytes)
+        lprint(f"INFO: Offsite upload: {backup['path']} > {self.get_backup_key(backup)} ({uploaded_bytes} bytes, {time.time() - start_time:.1f}s)")
+        return uploaded_bytes
+
+    def replicate(self, backups: List[Dict], progress: Callable = None) -> int:
+        """
+        Uploads backups one after another, each using offsite_concurrency threads. Blocking, run as job with backend.replicate_backups().
+
+        Args:
+            backups list: Catalog entries, from backup_catalog.get_unreplicated_backups().
+            progress Callable(None): Called with (bytes, files) while uploading, e.g. Job.progress.
+
+        Returns:
+            int: Number of backups uploaded. Failed ones are tried again next time.
+        """
+
+        if not boto3:
+            lprint("ERROR: Offsite upload needs boto3 module: pip install boto3")
+            return 0
+
+        client = self._get_client()
+        count = 0
+        with ThreadPoolExecutor(max_workers=config.get_config('offsite_concurrency'), thread_name_prefix='slime_offsite') as pool:
+            for backup in backups:
+                if self.replicate_backup(client, pool, backup, progress) is not False:
+                    count += 1
+        return count
+
+
+backup_offsite = Backup_Offsite()
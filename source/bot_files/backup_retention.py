@@ -0,0 +1,70 @@
+"""
+Decides which backups to delete, from server's retention configs (grandfather-father-son).
+Keeps newest backup of each of the last retention_hourly hours, retention_daily days and retention_weekly weeks that have a
+backup. Then if kept backups take more than retention_max_bytes, oldest kept ones are dropped until under budget.
+Newest backup is never deleted. Backups are pruned by backend.prune_backups(), run every retention_check_interval.
+"""
+
+import time
+import datetime
+from typing import Dict, List, Callable
+
+
+class Backup_Retention:
+    # Bucket functions, backups with same bucket value are in the same hour, day, or (ISO) week. Uses local time.
+    buckets = {
+        'retention_hourly': lambda t: time.strftime('%Y-%m-%d %H', time.localtime(t)),
+        'retention_daily': lambda t: time.strftime('%Y-%m-%d', time.localtime(t)),
+        'retention_weekly': lambda t: datetime.date.fromtimestamp(t).isocalendar()[:2],
+    }
+
+    def is_enabled(self, server_configs: Dict) -> bool:
+        return any(server_configs.get(i) for i in (*self.buckets, 'retention_max_bytes'))
+
+    def _keep_buckets(self, backups: List[Dict], count: int, get_bucket: Callable) -> List[int]:
+        """Gets IDs of newest backup in each of the newest count buckets. Backups must be sorted newest first."""
+
+        keep, seen = [], set()
+        for backup in backups:
+            if len(seen) >= count: break
+            if (bucket := get_bucket(backup['created'])) not in seen:
+                seen.add(bucket)
+                keep.append(backup['id'])
+        return keep
+
+    def get_expired(self, backups: List[Dict], server_configs: Dict) -> List[Dict]:
+        """
+        Gets backups that aren't kept by server's retention policy.
+
+        Args:
+            backups list: Catalog entries of one server and kind, from backup_catalog.get_backups().
+            server_configs dict: Server's configs, has retention_hourly, retention_daily, retention_weekly, retention_max_bytes.
+
+        Returns:
+            list: Catalog entries to delete, oldest first. Empty if retention is disabled.
+        """
+
+        if not backups or not self.is_enabled(server_configs):
+            return []
+        backups = sorted(backups, key=lambda i: (i['created'], i['id']), reverse=True)
+
+        if any(server_configs.get(i) for i in self.buckets):
+            keep = {backups[0]['id']}
+            for config_name, get_bucket in self.buckets.items():
+                if count := server_configs.get(config_name):
+                    keep.update(self._keep_buckets(backups, count, get_bucket))
+        else: keep = {i['id'] for i in backups}  # Only byte budget set.
+
+        if max_bytes := server_configs.get('retention_max_bytes'):
+            # Uses bytes each backup added on disk. Backups not measured yet (synced from disk) count as 0.
+            kept = [i for i in backups if i['id'] in keep]
+            total = sum(i['stored'] or 0 for i in kept)
+            for backup in reversed(kept[1:]):
+                if total <= max_bytes: break
+                keep.discard(backup['id'])
+                total -= backup['stored'] or 0
+
+        return [i for i in reversed(backups) if i['id'] not in keep]
+
+
+backup_retention = Backup_Retention()
@@ -0,0 +1,335 @@
+"""
+Content addressed backup store, used when server's backup_format is 'dedup' or 'region'.
+Files are split into chunks, each chunk saved once in backup_store_path under its SHA-256 hash. A backup is just a
+manifest.json listing each file's chunks, so unchanged files (and unchanged parts of changed files) take no extra space.
+Files with same size and modified time as in the previous backup aren't read again, their chunk list is reused.
+
+With 'region' format, .mca files are stored per Minecraft chunk instead. Only the region header is read, and chunks with
+the same save timestamp as in the previous backup reuse its stored chunk. Each region file gets a table object
+(timestamp and hash for all 1024 chunks), restore rebuilds the region file from it.
+"""
+
+import os
+import json
+import time
+import struct
+import hashlib
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join, isfile, isdir, dirname
+from typing import Union, Dict, List, Tuple, Callable
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint
+from bot_files.region_files import region_utils
+from bot_files.io_throttle import io_throttle
+
+
+class Chunk_Store:
+    chunk_size = 1024 * 1024
+    manifest_name = 'manifest.json'
+    # Region table entry: chunk save timestamp, SHA-256 of chunk (all zeros if chunk not generated).
+    region_table_entry = struct.Struct('>I32s')
+
+    def object_path(self, digest: str) -> str:
+        return join(config.get_config('backup_store_path'), 'objects', digest[:2], digest)
+
+    def put_object(self, data: bytes) -> Tuple[str, int]:
+        """
+        Saves chunk to store if not already in it.
+
+        Args:
+            data bytes: Chunk data.
+
+        Returns:
+            tuple: Hash of data, and number of bytes written (0 if chunk was already stored).
+        """
+
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if isfile(path):
+            return digest, 0
+
+        os.makedirs(dirname(path), exist_ok=True)
+        # Other workers might be writing the same chunk, each writes its own temp file then renames over.
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+        return digest, len(data)
+
+    def get_object(self, digest: str) -> bytes:
+        with open(self.object_path(digest), 'rb') as file:
+            return file.read()
+
+    def is_dedup_backup(self, backup_path: str) -> bool:
+        return isfile(join(backup_path, self.manifest_name))
+
+    def load_manifest(self, backup_path: str) -> Union[Dict, None]:
+        try:
+            with open(join(backup_path, self.manifest_name)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def find_previous_manifest(self, backups_path: str) -> Union[Dict, None]:
+        """
+        Gets manifest of most recent dedup backup in folder. Backup names start with date so newest sorts last.
+
+        Args:
+            backups_path str: world_backups_path or server_backups_path.
+
+        Returns:
+            dict, None: Manifest or None if no dedup backups.
+        """
+
+        if not isdir(backups_path): return None
+        for name in sorted(os.listdir(backups_path), reverse=True):
+            if manifest := self.load_manifest(join(backups_path, name)):
+                return manifest
+        return None
+
+    def scan_files(self, root: str, folders: List[str]) -> Tuple[List[str], List[Tuple[str, os.stat_result]], List[str]]:
+        """
+        Walks folders and collects all files and folders.
+
+        Args:
+            root str: Server path, file paths in manifest are relative to this.
+            folders list: Folders in root to include, '' for all of root.
+
+        Returns:
+            tuple: Folder paths, (file path, stat) tuples, and folders that didn't exist.
+        """
+
+        dirs, files, missing = [], [], []
+        for folder in folders:
+            folder_path = join(root, folder) if folder else root
+            if not isdir(folder_path):
+                missing.append(folder)
+                continue
+            for dir_path, dir_names, file_names in os.walk(folder_path):
+                rel_dir = os.path.relpath(dir_path, root)
+                if rel_dir != '.': dirs.append(rel_dir)
+                for name in file_names:
+                    try: files.append((os.path.relpath(join(dir_path, name), root), os.stat(join(dir_path, name))))
+                    except OSError: continue  # File deleted while walking.
+        return dirs, files, missing
+
+    def _store_file(self, root: str, rel_path: str) -> Tuple[List[str], int]:
+        """Splits file into chunks and saves them. Returns chunk hashes and new bytes stored."""
+
+        chunks, stored = [], 0
+        with open(join(root, rel_path), 'rb') as file:
+            while data := file.read(self.chunk_size):
+                digest, written = self.put_object(data)
+                chunks.append(digest)
+                stored += written
+        return chunks, stored
+
+    def read_region_table(self, digest: str) -> List[Tuple[int, Union[str, None]]]:
+        """Gets (timestamp, chunk hash) for each chunk in stored region table."""
+
+        data = self.get_object(digest)
+        return [(timestamp, chunk_digest.hex() if any(chunk_digest) else None)
+                for timestamp, chunk_digest in self.region_table_entry.iter_unpack(data)]
+
+    def _store_region(self, root: str, rel_path: str, previous_entry: Dict = None) -> Union[Tuple[str, int], None]:
+        """
+        Stores region file per chunk, only reading chunks saved since previous backup.
+
+        Returns:
+            tuple, None: Region table hash and new bytes stored. None if not a valid region file.
+        """
+
+        previous_table = None
+        if previous_entry and previous_entry.get('region'):
+            try: previous_table = self.read_region_table(previous_entry['region'])
+            except OSError: pass
+
+        table, stored = bytearray(), 0
+        with region_utils.open_region(join(root, rel_path)) as data:
+            if not (header := region_utils.read_header(data)):
+                return None
+            for index, (location, timestamp) in enumerate(zip(*header)):
+                digest = None
+                if location[0]:
+                    # Chunk not saved since last backup, no need to read it.
+                    if previous_table and previous_table[index][1] and previous_table[index][0] == timestamp:
+                        digest = previous_table[index][1]
+                    elif chunk := region_utils.get_chunk(data, location):
+                        digest, written = self.put_object(chunk)
+                        stored += written
+                    else: return None  # Bad location, gets stored as normal file instead.
+                table += self.region_table_entry.pack(timestamp, bytes.fromhex(digest) if digest else bytes(32))
+
+        table_digest, written = self.put_object(bytes(table))
+        return table_digest, stored + written
+
+    def backup(self, root: str, folders: List[str], backup_path: str, previous: Dict = None, region_diff: bool = False,
+               progress: Callable = None) -> Union[Dict, bool]:
+        """
+        Creates new dedup backup. Hashing and storing chunks is split between backup_workers threads.
+
+        Args:
+            root str: Server path.
+            folders list: Folders in root to back up, [''] for whole server folder.
+            backup_path str: New backup folder, manifest.json will be saved in here.
+            previous dict(None): Previous backup's manifest, unchanged files reuse its chunk lists.
+            region_diff bool(False): Store .mca files per Minecraft chunk, see _store_region().
+            progress Callable(None): Called with (bytes read, files) after each file, e.g. Job.progress.
+
+        Returns:
+            dict, bool: New manifest, or False if failed.
+        """
+
+        start_time = time.time()
+        previous_files = previous['files'] if previous else {}
+        dirs, files, missing = self.scan_files(root, folders)
+        manifest = {'format': 'region' if region_diff else 'dedup', 'created': start_time, 'folders': folders, 'missing': missing,
+                    'dirs': dirs, 'files': {}, 'total_bytes': 0, 'stored_bytes': 0}
+
+        def store(item):
+            rel_path, stat = item
+            if progress: progress()  # Stops here if job cancelled.
+            entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'mode': stat.st_mode & 0o7777}
+            old = previous_files.get(rel_path)
+            if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime_ns:
+                entry.update({k: old[k] for k in ('chunks', 'region') if k in old})
+                stored = 0
+            elif region_diff and rel_path.endswith('.mca') and (result := self._store_region(root, rel_path, old)):
+                entry['region'], stored = result
+            else:
+                entry['chunks'], stored = self._store_file(root, rel_path)
+                if progress: progress(stat.st_size, 0)
+            if progress: progress(0, 1)
+            return rel_path, entry, stored
+
+        try:
+            os.makedirs(backup_path)
+            with ThreadPoolExecutor(max_workers=config.get_config('backup_workers'), initializer=io_throttle.lower_priority) as pool:
+                for rel_path, entry, stored in pool.map(store, files):
+                    manifest['files'][rel_path] = entry
+                    manifest['total_bytes'] += entry['size']
+                    manifest['stored_bytes'] += stored
+
+            with open(join(backup_path, self.manifest_name), 'w') as file:
+                json.dump(manifest, file)
+        except:
+            lprint(f"ERROR: Issue creating dedup backup: {root} > {backup_path}")
+            traceback.print_exc()
+            return False
+
+        lprint(f"INFO: Dedup backup: {backup_path} ({len(files)} files, {manifest['stored_bytes']} new bytes of {manifest['total_bytes']}, {time.time() - start_time:.1f}s)")
+        return manifest
+
+    def _restore_file(self, dest_root: str, rel_path: str, entry: Dict) -> None:
+        file_path = join(dest_root, rel_path)
+        os.makedirs(dirname(file_path), exist_ok=True)
+        if 'region' in entry:
+            chunks = {index: (timestamp, self.get_object(digest))
+                      for index, (timestamp, digest) in enumerate(self.read_region_table(entry['region'])) if digest}
+            region_utils.write_region(file_path, chunks)
+        else:
+            with open(file_path, 'wb') as file:
+                for digest in entry['chunks']:
+                    file.write(self.get_object(digest))
+        os.chmod(file_path, entry['mode'])
+        os.utime(file_path, ns=(entry['mtime'], entry['mtime']))
+
+    def restore(self, backup_path: str, dest_root: str, folders: List[str] = None, progress: Callable = None, paths: List[str] = None) -> bool:
+        """
+        Rebuilds files from dedup backup. Does not delete anything already in dest_root.
+
+        Args:
+            backup_path str: Backup folder containing manifest.json.
+            dest_root str: Where to restore to, usually server path.
+            folders list(None): Only restore these top level folders, None for everything in backup.
+            paths list(None): Only restore these files (relative paths, '/' separated), for delta restores. Overrides folders.
+            progress Callable(None): Called with (bytes, files) after each file, e.g. Job.progress.
+
+        Returns:
+            bool: If successful.
+        """
+
+        if not (manifest := self.load_manifest(backup_path)):
+            lprint(f"ERROR: Could not read backup manifest: {backup_path}")
+            return False
+
+        def in_folders(rel_path):
+            return folders is None or rel_path.split(os.sep)[0] in folders
+
+        try:
+            if paths is None:
+                for rel_dir in manifest['dirs']:
+                    if in_folders(rel_dir): os.makedirs(join(dest_root, rel_dir), exist_ok=True)
+                files = [(k, v) for k, v in manifest['files'].items() if in_folders(k)]
+            else:
+                paths = {i.replace('/', os.sep) for i in paths}
+                files = [(k, v) for k, v in manifest['files'].items() if k in paths]
+            def restore_file(item):
+                if progress: progress()
+                self._restore_file(dest_root, *item)
+                if progress: progress(item[1]['size'], 1)
+
+            with ThreadPoolExecutor(max_workers=config.get_config('backup_workers'), initializer=io_throttle.lower_priority) as pool:
+                list(pool.map(restore_file, files))
+        except:
+            lprint(f"ERROR: Issue restoring dedup backup: {backup_path} > {dest_root}")
+            traceback.print_exc()
+            return False
+
+        lprint(f"INFO: Restored dedup backup: {backup_path} > {dest_root}")
+        return True
+
+    def backup_folders(self, backup_path: str) -> List[str]:
+        """Top level folders in dedup backup, like file_utils listdir on a copied backup."""
+
+        if not (manifest := self.load_manifest(backup_path)): return []
+        return sorted({i.split(os.sep)[0] for i in manifest['dirs']})
+
+    def collect_garbage(self, backup_paths: List[str], progress: Callable = None) -> Union[Tuple[int, int], bool]:
+        """
+        Deletes stored chunks no backup uses anymore (mark and sweep). No backups should be running while this runs.
+
+        Args:
+            backup_paths list: Every dedup/region backup of every server, their manifests are what's kept.
+            progress Callable(None): Called with (bytes, files) for each deleted object, e.g. Job.progress.
+
+        Returns:
+            tuple, bool: Number of objects and bytes deleted. False if a manifest couldn't be read (nothing deleted).
+        """
+
+        objects_path = join(config.get_config('backup_store_path'), 'objects')
+        if not isdir(objects_path):
+            return 0, 0
+
+        used = set()
+        for backup_path in backup_paths:
+            if progress: progress()
+            if not (manifest := self.load_manifest(backup_path)):
+                lprint(f"ERROR: Could not read backup manifest, skipping garbage collection: {backup_path}")
+                return False
+            for entry in manifest['files'].values():
+                used.update(entry.get('chunks', []))
+                if 'region' in entry and entry['region'] not in used:
+                    used.add(entry['region'])
+                    try: used.update(i[1] for i in self.read_region_table(entry['region']) if i[1])
+                    except OSError:
+                        lprint(f"ERROR: Missing region table {entry['region']} in {backup_path}")
+
+        deleted = freed = 0
+        for prefix in os.listdir(objects_path):
+            with os.scandir(join(objects_path, prefix)) as entries:
+                for entry in entries:
+                    if entry.name in used: continue
+                    size = entry.stat().st_size
+                    os.remove(entry.path)  # Also removes leftover .tmp files from interrupted backups.
+                    deleted, freed = deleted + 1, freed + size
+                    if progress: progress(size, 1)
+
+        lprint(f"INFO: Backup store garbage collection: {deleted} objects deleted, {freed} bytes freed")
+        return deleted, freed
+
+
+chunk_store = Chunk_Store()
@@ -0,0 +1,208 @@
+"""
+Checks backups are still readable, with ?backupverify or after each backup (backup_verify config).
+Copied backups: every file is hashed again and compared with the SHA-256 in the catalog.
+Dedup backups: every stored chunk a file uses is read and hashed (chunk files are named by their hash).
+Archive backups: every frame is decompressed and compared with the hash in index.json.
+Region files (.mca) in copied and dedup backups are also checked: location table in range, no overlapping chunks, and
+each chunk decompresses. Work is split between backup_workers processes, results are saved in the backup catalog.
+"""
+
+import os
+import time
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os.path import join, isdir, isfile
+from typing import Dict, List, Tuple, Callable
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint, file_utils
+from bot_files.region_files import region_utils
+from bot_files.backup_store import chunk_store
+from bot_files.backup_archive import backup_archive, _decompress, zstandard
+from bot_files.backup_catalog import backup_catalog
+from bot_files.io_throttle import io_throttle
+
+
+def _init_worker() -> None:
+    io_throttle.lower_priority()
+
+
+def _verify_file(path: str, rel_path: str, size: int, digest: str) -> Tuple[int, List[str]]:
+    """
+    Runs in worker process. Checks file of copied backup against its catalog entry.
+
+    Args:
+        path str: Full path of file.
+        rel_path str: Path shown in problems.
+        size int: Expected size, None to not check.
+        digest str: Expected SHA-256, None to not check.
+
+    Returns:
+        tuple: Bytes read, list of problems.
+    """
+
+    problems = []
+    try:
+        file_size = os.path.getsize(path)
+        if size is not None and file_size != size:
+            problems.append(f"{rel_path}: size {file_size}, should be {size}")
+        if digest and file_utils.hash_file(path) != digest:
+            problems.append(f"{rel_path}: hash doesn't match catalog")
+        if path.endswith('.mca'):
+            with region_utils.open_region(path) as data:
+                problems += [f"{rel_path}: {i}" for i in region_utils.check_region(data)]
+    except OSError as e:
+        return 0, [f"{rel_path}: can't read ({e.strerror})"]
+    return file_size, problems
+
+
+def _read_object(digest: str, rel_path: str, problems: List[str]) -> bytes:
+    """Reads stored chunk and checks its hash, adds to problems if missing or changed."""
+
+    try: data = chunk_store.get_object(digest)
+    except OSError:
+        problems.append(f"{rel_path}: stored chunk {digest[:12]} missing")
+        return b''
+    if hashlib.sha256(data).hexdigest() != digest:
+        problems.append(f"{rel_path}: stored chunk {digest[:12]} corrupted")
+    return data
+
+
+def _verify_dedup_file(rel_path: str, entry: Dict) -> Tuple[int, List[str]]:
+    """
+    Runs in worker process. Checks every stored chunk of file in dedup backup.
+
+    Args:
+        rel_path str: File path from manifest.
+        entry dict: File's manifest entry, has 'chunks' or 'region' (stored per Minecraft chunk).
+
+    Returns:
+        tuple: Bytes read, list of problems.
+    """
+
+    problems = []
+    if 'region' in entry:
+        table = _read_object(entry['region'], rel_path, problems)
+        if len(table) != chunk_store.region_table_entry.size * 1024:
+            return len(table), problems + [f"{rel_path}: region table invalid"]
+        read = len(table)
+        for index, (timestamp, digest) in enumerate(chunk_store.read_region_table(entry['region'])):
+            if not digest: continue
+            chunk = _read_object(digest, rel_path, problems)
+            read += len(chunk)
+            if not chunk: continue
+            try: region_utils.decompress_chunk(chunk)
+            except Exception as e:
+                problems.append(f"{rel_path}: chunk {index} doesn't decompress ({e})")
+        return read, problems
+
+    data = b''.join(_read_object(i, rel_path, problems) for i in entry['chunks'])
+    if not problems and len(data) != entry['size']:
+        problems.append(f"{rel_path}: size {len(data)}, should be {entry['size']}")
+    if not problems and rel_path.endswith('.mca'):
+        problems += [f"{rel_path}: {i}" for i in region_utils.check_region(data)]
+    return len(data), problems
+
+
+def _verify_frame(archive_path: str, number: int, frame: List, compression: str) -> Tuple[int, List[str]]:
+    """
+    Runs in worker process. Decompresses archive frame and checks it against index.
+
+    Args:
+        archive_path str: Archive file.
+        number int: Frame number, for problems.
+        frame list: [compressed offset, compressed size, uncompressed offset, uncompressed size, SHA-256] from index.json.
+        compression str: 'zstd' or 'gzip'.
+
+    Returns:
+        tuple: Bytes read, list of problems.
+    """
+
+    offset, length, _, size, digest = frame
+    try:
+        with open(archive_path, 'rb') as file:
+            file.seek(offset)
+            data = _decompress(file.read(length), compression)
+    except Exception as e:
+        return length, [f"frame {number}: doesn't decompress ({e})"]
+    if len(data) != size or hashlib.sha256(data).hexdigest() != digest:
+        return length, [f"frame {number}: data doesn't match index"]
+    return length, []
+
+
+class Backup_Verify:
+    max_problems = 50  # Only first problems are kept, a broken disk could give thousands.
+
+    def _get_tasks(self, backup: Dict, problems: List[str]) -> List[Tuple[Callable, Tuple]]:
+        """Gets worker function and arguments for each file (or archive frame) to check."""
+
+        src = backup['path']
+        for meta_name in (chunk_store.manifest_name, backup_archive.index_name):
+            # Catalog checksum of dedup and archive backups is hash of their manifest/index.
+            if isfile(meta_path := join(src, meta_name)) and backup['checksum'] and file_utils.hash_file(meta_path) != backup['checksum']:
+                problems.append(f"{meta_name}: hash doesn't match catalog")
+
+        if manifest := chunk_store.load_manifest(src):
+            return [(_verify_dedup_file, (rel_path.replace(os.sep, '/'), entry)) for rel_path, entry in manifest['files'].items()]
+        if index := backup_archive.load_index(src):
+            if index['compression'] == 'zstd' and not zstandard:
+                problems.append("need zstandard module to check archive")
+                return []
+            archive_path = join(src, index['archive'])
+            return [(_verify_frame, (archive_path, number, frame, index['compression'])) for number, frame in enumerate(index['frames'])]
+
+        if not (files := backup_catalog.get_files(backup['id'])):
+            # Picked up by catalog sync, not summarized. Can still check region files.
+            for dir_path, dir_names, file_names in os.walk(src):
+                for name in file_names:
+                    files[os.path.relpath(join(dir_path, name), src).replace(os.sep, '/')] = {'size': None, 'digest': None}
+        return [(_verify_file, (join(src, *rel_path.split('/')), rel_path, entry['size'], entry['digest'])) for rel_path, entry in sorted(files.items())]
+
+    def verify(self, backup: Dict, progress: Callable = None) -> Dict:
+        """
+        Checks backup, files are split between backup_workers processes. Blocking, run as job with backend.verify_backup().
+
+        Args:
+            backup dict: Catalog entry, from backup_catalog.get_backup().
+            progress Callable(None): Called with (bytes, files) after each file, e.g. Job.progress.
+
+        Returns:
+            dict: 'ok' bool, 'checked' number of files (or archive frames), 'problems' list (first max_problems), 'seconds'.
+        """
+
+        start_time = time.time()
+        if not isdir(backup['path']):
+            return {'ok': False, 'checked': 0, 'problems': ["backup folder missing"], 'seconds': 0}
+
+        problems = []
+        tasks = self._get_tasks(backup, problems)
+        workers = config.get_config('backup_workers')
+        checked = 0
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            # Only keeps a few tasks in flight, so cancelling doesn't have to wait for everything to finish.
+            pending = deque()
+            def collect():
+                nonlocal checked
+                read, file_problems = pending.popleft().result()
+                problems.extend(file_problems)
+                checked += 1
+                if progress: progress(read, 1)
+
+            try:
+                for func, args in tasks:
+                    pending.append(pool.submit(func, *args))
+                    if len(pending) >= workers * 4: collect()
+                while pending: collect()
+            except BaseException:
+                for future in pending: future.cancel()
+                raise
+
+        result = {'ok': not problems, 'checked': checked, 'problems': problems[:self.max_problems], 'seconds': time.time() - start_time}
+        if problems:
+            lprint(f"WARNING: Backup verify failed: {backup['path']} ({len(problems)} problems, first: {problems[0]})")
+        else: lprint(f"INFO: Backup verified: {backup['path']} ({checked} checked, {result['seconds']:.1f}s)")
+        return result
+
+
+backup_verify = Backup_Verify()
@@ -0,0 +1,187 @@
+"""
+Copies folders with a thread pool, used by file_utils.copy_dir() and link_copy_dir() (backups, restores, server copies).
+Folders are walked with os.scandir and files are copied as they're found, backup_workers at a time.
+
+Each file's data is copied the fastest way the filesystem allows, falling back to the next if not supported:
+    reflink (FICLONE ioctl) - btrfs, xfs, etc. New file shares blocks with the original until either is changed, so it's instant.
+    os.copy_file_range - Kernel copies data without it passing through Python, can also be offloaded by NFS/SMB servers.
+    os.sendfile - Same idea, for older kernels.
+    read/write - Anything else, e.g. Windows.
+Unsupported methods are remembered per source/destination device, so each is only tried once.
+"""
+
+import os
+import time
+import errno
+import shutil
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from os.path import join
+from typing import Dict, Tuple, Callable
+
+from bot_files.slime_config import config
+from bot_files.io_throttle import io_throttle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows.
+
+FICLONE = 0x40049409  # From linux/fs.h, _IOW(0x94, 9, int).
+# Errors meaning copy method isn't supported for these files/filesystems (not that copying failed).
+UNSUPPORTED_ERRORS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY, errno.EOPNOTSUPP, errno.EBADF, errno.EPERM,
+                      getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP)}
+
+
+class Copy_Engine:
+    block_size = 8 * 1024 * 1024  # Bytes per copy_file_range/sendfile/read call, progress is reported after each.
+
+    def __init__(self):
+        self.unsupported = {}  # (source st_dev, destination st_dev): set of copy methods that failed as unsupported.
+
+    def _is_supported(self, devices: Tuple[int, int], method: str) -> bool:
+        return method not in self.unsupported.get(devices, ())
+
+    def _set_unsupported(self, devices: Tuple[int, int], method: str) -> None:
+        self.unsupported.setdefault(devices, set()).add(method)
+
+    def _copy_data(self, src_file, dest_file, size: int, devices: Tuple[int, int], progress: Callable = None) -> str:
+        """
+        Copies file data between open files using fastest supported method.
+
+        Returns:
+            str: Method used, 'reflink', 'copy_file_range', 'sendfile', or 'read'.
+        """
+
+        src_fd, dest_fd = src_file.fileno(), dest_file.fileno()
+        if fcntl and size and self._is_supported(devices, 'reflink'):
+            try:
+                fcntl.ioctl(dest_fd, FICLONE, src_fd)
+                if progress: progress(size, 0)
+                return 'reflink'
+            except OSError as e:
+                if e.errno not in UNSUPPORTED_ERRORS: raise
+                self._set_unsupported(devices, 'reflink')
+
+        for method in ('copy_file_range', 'sendfile'):
+            if not hasattr(os, method) or not self._is_supported(devices, method):
+                continue
+            offset = 0
+            try:
+                while offset < size:
+                    if method == 'copy_file_range':
+                        copied = os.copy_file_range(src_fd, dest_fd, min(self.block_size, size - offset), offset, offset)
+                    else: copied = os.sendfile(dest_fd, src_fd, offset, min(self.block_size, size - offset))
+                    if not copied: break  # File shrank since stat.
+                    offset += copied
+                    if progress: progress(copied, 0)
+            except OSError as e:
+                # Only falls back if nothing was copied yet, otherwise it's a real error.
+                if e.errno not in UNSUPPORTED_ERRORS or offset: raise
+                self._set_unsupported(devices, method)
+                continue
+            return method
+
+        while data := src_file.read(self.block_size):
+            dest_file.write(data)
+            if progress: progress(len(data), 0)
+        return 'read'
+
+    def copy_file(self, src: str, dest: str, src_stat: os.stat_result = None, dest_dev: int = None, progress: Callable = None) -> str:
+        """
+        Copies file data and metadata (permissions, times, like shutil.copy2).
+
+        Args:
+            src str: Source file.
+            dest str: Destination file, overwritten if exists.
+            src_stat os.stat_result(None): Stat of src if already known.
+            dest_dev int(None): st_dev of destination folder if already known.
+            progress Callable(None): Called with (bytes, 0) while copying, e.g. Job.progress.
+
+        Returns:
+            str: Copy method used.
+        """
+
+        src_stat = src_stat or os.stat(src)
+        with open(src, 'rb') as src_file, open(dest, 'wb') as dest_file:
+            devices = (src_stat.st_dev, dest_dev if dest_dev is not None else os.fstat(dest_file.fileno()).st_dev)
+            method = self._copy_data(src_file, dest_file, src_stat.st_size, devices, progress)
+        shutil.copystat(src, dest)
+        return method
+
+    def copy_tree(self, path: str, new_path: str, progress: Callable = None, link_dest: str = None,
+                  should_link: Callable = None) -> Dict:
+        """
+        Copies folder with backup_workers threads. Raises on first error, like shutil.copytree.
+
+        Args:
+            path str: Source folder.
+            new_path str: Destination folder, must not exist yet.
+            progress Callable(None): Called with (bytes, files) from worker threads, e.g. Job.progress.
+            link_dest str(None): Folder with previous copy of path. Files should_link() says are unchanged get hard linked from it.
+            should_link Callable(None): Takes (source path, source stat, link_dest path), returns True to link instead of copy.
+
+        Returns:
+            dict: 'files', 'bytes', 'seconds', 'bytes_per_second', and 'methods' (Counter of copy methods used, and 'link').
+        """
+
+        start_time = time.monotonic()
+        workers = config.get_config('backup_workers')
+        methods, lock = Counter(), threading.Lock()
+        total_bytes = 0
+        copied_dirs = []  # (source, destination), times set after files are in them.
+
+        def copy_one(src, dest, stat, dest_dev, old):
+            nonlocal total_bytes
+            if progress: progress()  # Stops here if job cancelled.
+            if old and should_link and should_link(src, stat, old):
+                try:
+                    os.link(old, dest)
+                    method = 'link'
+                except OSError: method = self.copy_file(src, dest, stat, dest_dev, progress)
+            else: method = self.copy_file(src, dest, stat, dest_dev, progress)
+            with lock:
+                methods[method] += 1
+                if method != 'link': total_bytes += stat.st_size
+            if progress: progress(0, 1)
+
+        os.makedirs(new_path)
+        pending = set()
+        # Limits queued files, so huge folders don't queue every file at once.
+        max_pending = workers * 8
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='slime_copy', initializer=io_throttle.lower_priority) as pool:
+            try:
+                stack = [(path, new_path, link_dest)]
+                while stack:
+                    src_dir, dest_dir, old_dir = stack.pop()
+                    copied_dirs.append((src_dir, dest_dir))
+                    dest_dev = os.stat(dest_dir).st_dev
+                    with os.scandir(src_dir) as entries:
+                        for entry in entries:
+                            src, dest = entry.path, join(dest_dir, entry.name)
+                            old = join(old_dir, entry.name) if old_dir else None
+                            if entry.is_dir():
+                                os.mkdir(dest)
+                                stack.append((src, dest, old))
+                                continue
+                            pending.add(pool.submit(copy_one, src, dest, entry.stat(), dest_dev, old))
+                            if len(pending) >= max_pending:
+                                done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                                for future in done: future.result()
+                done, pending = wait(pending, return_when=FIRST_EXCEPTION)
+                for future in done: future.result()
+            except BaseException:
+                for future in pending: future.cancel()
+                raise
+
+        # Deepest folders first, copying files into a folder changes its modified time.
+        for src_dir, dest_dir in reversed(copied_dirs):
+            shutil.copystat(src_dir, dest_dir)
+
+        seconds = time.monotonic() - start_time
+        return {'files': sum(methods.values()), 'bytes': total_bytes, 'seconds': seconds,
+                'bytes_per_second': total_bytes / seconds if seconds else 0, 'methods': methods}
+
+
+copy_engine = Copy_Engine()
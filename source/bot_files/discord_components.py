@@ -181,7 +181,7 @@ class Comps:
                 ['text', 'Description', 'server_description', 'Add description', data['server_description'], True, True, 500],
                 ['text', 'Server Domain/IP', 'server_address', 'Server domain or IP address', data['server_address'], False, True, 500],
                 ['text', 'Launch Command', 'server_launch_command', 'Runtime Launch Command for .jar file', data['server_launch_command'], True, True, 500],
-                ['text', 'Wait Time (server startup in seconds)', 'startup_wait_time', 'After starting server, bot will wait before fetching server status and other info.', data['startup_wait_time'], False, True, 10]]
+                ['text', 'Wait Time (server startup in seconds)', 'startup_wait_time', 'Min wait for server startup, adapts to recorded startup times.', data['startup_wait_time'], False, True, 10]]
 
 comps = Comps()
 
@@ -0,0 +1,100 @@
+"""
+Limits disk bandwidth of backup, restore and trash jobs so they don't lag the server.
+Jobs report bytes with Job.progress(), which takes them from a token bucket refilled at backup_io_limit MB/s.
+Limit is halved each time the selected server's MSPT (from tick monitor) is over backup_io_mspt_backoff, or its TPS drops
+under 19.5 if it has no mspt command, and recovers gradually once it's back. Job threads and processes also get idle I/O priority and backup_nice CPU niceness (Linux).
+"""
+
+import os
+import sys
+import time
+import ctypes
+import platform
+import threading
+from typing import Dict
+
+from bot_files.slime_config import config
+
+IOPRIO_WHO_PROCESS = 1  # Thread ID also works, I/O priority is per thread on Linux.
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+# ioprio_set syscall number per architecture, Python has no wrapper for it.
+SYS_IOPRIO_SET = {'x86_64': 251, 'aarch64': 30, 'armv7l': 314, 'armv6l': 314, 'i686': 289, 'i386': 289}
+
+
+class IO_Throttle:
+    min_factor = 1 / 16  # Backs off to at most 1/16 of backup_io_limit.
+    min_tps = 19.5  # Lagging under this, if server only has tps command.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = 0.0
+        self.last_refill = time.monotonic()
+        self.factor = 1.0  # Multiplier of backup_io_limit, lowered while server is lagging.
+        self.last_update = 0  # time.monotonic() of last MSPT sample.
+
+    def get_rate(self) -> float:
+        """Current limit in bytes per second, 0 if no limit."""
+
+        if not (limit := config.get_config('backup_io_limit')):
+            return 0
+        # No recent samples (server offline or tick monitor disabled), nothing to back off for.
+        if time.monotonic() - self.last_update > config.get_config('tick_monitor_interval') * 4:
+            self.factor = 1.0
+        return limit * 1024 * 1024 * self.factor
+
+    def consume(self, num_bytes: int) -> None:
+        """
+        Takes bytes from bucket, sleeps if job is ahead of the limit. Called from job threads by Job.progress().
+
+        Args:
+            num_bytes int: Bytes just read or written.
+        """
+
+        if not num_bytes or not (rate := self.get_rate()):
+            return
+        with self.lock:
+            now = time.monotonic()
+            # Bucket holds at most one second of bytes, so idle time doesn't let a big burst through after.
+            self.tokens = min(rate, self.tokens + (now - self.last_refill) * rate) - num_bytes
+            self.last_refill = now
+            wait = -self.tokens / rate if self.tokens < 0 else 0
+        if wait: time.sleep(wait)
+
+    def update(self, values: Dict[str, float]) -> None:
+        """
+        Adjusts limit from tick monitor sample. Halves it if server is lagging, else raises it by 25%.
+
+        Args:
+            values dict: Sample with 'mspt' and/or 'tps'. Lagging is MSPT over backup_io_mspt_backoff, or TPS under min_tps
+                if server has no mspt command (TPS is capped at 20, so it can't tell how close to lagging the server is).
+                Empty if server is offline or gave no values, limit goes back to backup_io_limit.
+        """
+
+        if not (threshold := config.get_config('backup_io_mspt_backoff')):
+            return
+        if (mspt := values.get('mspt')) is not None: lagging = mspt > threshold
+        elif (tps := values.get('tps')) is not None: lagging = tps < self.min_tps
+        else:
+            self.factor = 1.0  # Nothing to back off for.
+            return
+
+        self.last_update = time.monotonic()
+        if lagging: self.factor = max(self.min_factor, self.factor / 2)
+        else: self.factor = min(1.0, self.factor * 1.25)
+
+    def lower_priority(self) -> None:
+        """Gives calling thread idle I/O priority and backup_nice niceness, used as pool initializer. Only on Linux."""
+
+        if not config.get_config('backup_low_priority') or not sys.platform.startswith('linux'):
+            return
+        thread_id = threading.get_native_id()
+        # Niceness is also per thread on Linux. Can only be raised without root, lowering it again fails and is ignored.
+        try: os.setpriority(os.PRIO_PROCESS, thread_id, config.get_config('backup_nice'))
+        except OSError: pass
+        if syscall_number := SYS_IOPRIO_SET.get(platform.machine()):
+            try: ctypes.CDLL(None, use_errno=True).syscall(syscall_number, IOPRIO_WHO_PROCESS, thread_id, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT)
+            except (OSError, AttributeError): pass
+
+
+io_throttle = IO_Throttle()
@@ -0,0 +1,121 @@
+"""
+Fetches JSON metadata like Mojang version manifests and PaperMC build lists, using one long-lived aiohttp session.
+Responses are cached in memory and on disk (metadata_cache_path). Within metadata_cache_ttl cached data is used without any request,
+after that it's revalidated with ETag/If-Modified-Since so unchanged data isn't downloaded again.
+If the site can't be reached the cached data is used, so version checks still work offline.
+"""
+
+import os
+import json
+import time
+import hashlib
+from os.path import join, isfile
+from typing import Union, Any, Dict
+
+import aiohttp
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint
+
+
+class Metadata_Client:
+    def __init__(self):
+        self.session = None
+        self.cache = {}  # url: cache entry dict, same as what's saved to file.
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """
+        Gets shared aiohttp session, creates new one if needed. Needs to be called inside running event loop.
+
+        Returns:
+            aiohttp.ClientSession: Session.
+        """
+
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30))
+        return self.session
+
+    async def close(self) -> None:
+        """Closes shared session."""
+
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+    def _cache_filepath(self, url: str) -> str:
+        return join(config.get_config('metadata_cache_path'), f"{hashlib.sha1(url.encode()).hexdigest()}.json")
+
+    def _load_entry(self, url: str) -> Union[Dict, None]:
+        """Gets cache entry from memory or file."""
+
+        if entry := self.cache.get(url):
+            return entry
+
+        file_path = self._cache_filepath(url)
+        if not isfile(file_path):
+            return None
+        try:
+            with open(file_path) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        self.cache[url] = entry
+        return entry
+
+    def _save_entry(self, url: str, entry: Dict) -> None:
+        """Saves cache entry to memory and file. Writes to temp file first so the file is never half written."""
+
+        self.cache[url] = entry
+        file_path = self._cache_filepath(url)
+        try:
+            os.makedirs(config.get_config('metadata_cache_path'), exist_ok=True)
+            with open(file_path + '.tmp', 'w') as file:
+                json.dump(entry, file)
+            os.replace(file_path + '.tmp', file_path)
+        except OSError:
+            lprint(f"ERROR: Problem writing metadata cache: {file_path}")
+
+    async def get_json(self, url: str, immutable: bool = False) -> Any:
+        """
+        Get JSON data from URL, using cache when possible.
+
+        Args:
+            url str: URL to fetch.
+            immutable bool(False): Data never changes (e.g. a specific version or build), so once cached it's never fetched again.
+
+        Returns:
+            Any: JSON data.
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: If not able to fetch and nothing cached.
+        """
+
+        entry = self._load_entry(url)
+        if entry and (immutable or time.time() - entry['fetched'] < config.get_config('metadata_cache_ttl')):
+            return entry['data']
+
+        # Conditional request, server replies 304 with no body if data hasn't changed.
+        headers = {}
+        if entry and entry.get('etag'): headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'): headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            session = await self.get_session()
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and entry:
+                    entry['fetched'] = time.time()
+                    self._save_entry(url, entry)
+                    return entry['data']
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+                self._save_entry(url, {'url': url, 'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified'),
+                                       'fetched': time.time(), 'data': data})
+                return data
+        except Exception as e:
+            if entry:
+                lprint(f"INFO: Using cached metadata, could not fetch: {url} ({e})")
+                return entry['data']
+            raise
+
+
+metadata_client = Metadata_Client()
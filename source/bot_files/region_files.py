@@ -0,0 +1,210 @@
+"""
+Reading and writing Minecraft region files (.mca).
+First 4 KiB of a region file is the location table, 1024 entries of 3 byte sector offset and 1 byte sector count.
+Next 4 KiB is the timestamp table, 1024 big endian ints of when each chunk was last saved. Chunk data starts at
+sector 2, each chunk is a 4 byte length, 1 byte compression type, then the compressed data.
+"""
+
+import os
+import zlib
+import gzip
+import mmap
+import struct
+from contextlib import contextmanager
+from typing import Union, Dict, List, Tuple, Generator
+
+SECTOR_SIZE = 4096
+HEADER_SIZE = 2 * SECTOR_SIZE
+CHUNKS_PER_REGION = 1024
+# Chunk compression types. Types with 0x80 set are stored in a separate c.x.z.mcc file, only the type byte is in region file.
+COMPRESSION_GZIP, COMPRESSION_ZLIB, COMPRESSION_NONE, COMPRESSION_LZ4 = 1, 2, 3, 4
+EXTERNAL_FLAG = 0x80
+
+
+class Region_Utils:
+    @contextmanager
+    def open_region(self, file_path: str) -> Generator[Union[mmap.mmap, bytes], None, None]:
+        """Memory maps region file so only the parts that are read get loaded. Empty files give b''."""
+
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                yield b''
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def read_header(self, data: Union[mmap.mmap, bytes]) -> Union[Tuple[List[Tuple[int, int]], List[int]], None]:
+        """
+        Reads location and timestamp tables.
+
+        Args:
+            data mmap, bytes: Region file data.
+
+        Returns:
+            tuple, None: List of (sector offset, sector count) and list of timestamps, 1024 each. None if file too small.
+        """
+
+        if len(data) < HEADER_SIZE:
+            return None
+        locations = [(int.from_bytes(data[i * 4:i * 4 + 3], 'big'), data[i * 4 + 3]) for i in range(CHUNKS_PER_REGION)]
+        timestamps = list(struct.unpack(f'>{CHUNKS_PER_REGION}I', data[SECTOR_SIZE:HEADER_SIZE]))
+        return locations, timestamps
+
+    def get_chunk(self, data: Union[mmap.mmap, bytes], location: Tuple[int, int]) -> Union[bytes, None]:
+        """
+        Gets chunk's stored bytes (length, compression type and compressed data, without sector padding).
+
+        Args:
+            data mmap, bytes: Region file data.
+            location tuple: (sector offset, sector count) from read_header().
+
+        Returns:
+            bytes, None: Chunk bytes, None if chunk not generated or location is invalid.
+        """
+
+        offset, count = location
+        if not offset or not count: return None
+        start = offset * SECTOR_SIZE
+        if offset < 2 or start + 5 > len(data):
+            return None
+        length = int.from_bytes(data[start:start + 4], 'big')
+        if length < 1 or start + 4 + length > len(data) or length + 4 > count * SECTOR_SIZE:
+            return None
+        return bytes(data[start:start + 4 + length])
+
+    def write_region(self, file_path: str, chunks: Dict[int, Tuple[int, bytes]]) -> None:
+        """
+        Writes new region file with chunks packed one after another.
+
+        Args:
+            file_path str: Region file to create (overwrites).
+            chunks dict: Chunk index (x & 31 + (z & 31) * 32) as key, (timestamp, chunk bytes from get_chunk()) as value.
+        """
+
+        locations = bytearray(SECTOR_SIZE)
+        timestamps = bytearray(SECTOR_SIZE)
+        sector = 2
+        with open(file_path, 'wb') as file:
+            file.seek(HEADER_SIZE)
+            for index in sorted(chunks):
+                timestamp, chunk = chunks[index]
+                count = -(-len(chunk) // SECTOR_SIZE)
+                if count > 255:
+                    raise ValueError(f"Chunk {index} too large for region file: {len(chunk)} bytes")
+                file.write(chunk + bytes(count * SECTOR_SIZE - len(chunk)))
+                locations[index * 4:index * 4 + 4] = sector.to_bytes(3, 'big') + bytes([count])
+                timestamps[index * 4:index * 4 + 4] = timestamp.to_bytes(4, 'big')
+                sector += count
+            file.seek(0)
+            file.write(locations + timestamps)
+
+    def read_chunks(self, file_path: str) -> Dict[int, Tuple[int, bytes]]:
+        """Gets all chunks in region file, in same format write_region() takes."""
+
+        chunks = {}
+        with self.open_region(file_path) as data:
+            if not (header := self.read_header(data)): return chunks
+            for index, (location, timestamp) in enumerate(zip(*header)):
+                if chunk := self.get_chunk(data, location):
+                    chunks[index] = (timestamp, chunk)
+        return chunks
+
+    def get_chunk_index(self, chunk_x: int, chunk_z: int) -> int:
+        """Index of chunk in its region file's tables."""
+
+        return (chunk_x & 31) + (chunk_z & 31) * 32
+
+    def get_region_name(self, chunk_x: int, chunk_z: int) -> str:
+        """Region file chunk is in, e.g. r.-1.0.mca."""
+
+        return f'r.{chunk_x >> 5}.{chunk_z >> 5}.mca'
+
+    def splice_chunks(self, file_path: Union[str, None], src_path: Union[str, None], indexes: List[int], new_path: str) -> int:
+        """
+        Writes copy of region file with some chunks taken from another copy of it (e.g. from a backup). Chunks are packed
+        again, so location table is rebuilt and no sectors are shared or left unused.
+
+        Args:
+            file_path str, None: Region file to copy, None if it doesn't exist (only src_path's chunks are written).
+            src_path str, None: Region file to take chunks from, None if it doesn't exist (chunks are removed).
+            indexes list: Chunk indexes to take from src_path, from get_chunk_index(). Chunks src_path doesn't have are removed.
+            new_path str: Where to write new region file.
+
+        Returns:
+            int: Number of chunks taken from src_path.
+        """
+
+        chunks = self.read_chunks(file_path) if file_path else {}
+        src_chunks = self.read_chunks(src_path) if src_path else {}
+        taken = 0
+        for index in indexes:
+            chunks.pop(index, None)
+            if index in src_chunks:
+                chunks[index] = src_chunks[index]
+                taken += 1
+        self.write_region(new_path, chunks)
+        return taken
+
+    def decompress_chunk(self, chunk: bytes) -> Union[bytes, None]:
+        """
+        Decompresses chunk's NBT data.
+
+        Args:
+            chunk bytes: From get_chunk().
+
+        Returns:
+            bytes, None: NBT data, None if chunk is stored externally (.mcc) or compressed with LZ4 (needs lz4 module, not checked).
+
+        Raises:
+            ValueError: Unknown compression type. zlib.error, OSError, EOFError if data doesn't decompress.
+        """
+
+        compression = chunk[4]
+        if compression & EXTERNAL_FLAG or compression == COMPRESSION_LZ4:
+            return None
+        if compression == COMPRESSION_ZLIB: return zlib.decompress(chunk[5:])
+        if compression == COMPRESSION_GZIP: return gzip.decompress(chunk[5:])
+        if compression == COMPRESSION_NONE: return chunk[5:]
+        raise ValueError(f"unknown compression type {compression}")
+
+    def check_region(self, data: Union[mmap.mmap, bytes], decompress: bool = True) -> List[str]:
+        """
+        Checks region file for corruption: location table offsets in file, chunks not overlapping, chunk lengths valid,
+        and each chunk decompressing.
+
+        Args:
+            data mmap, bytes: Region file data.
+            decompress bool(True): Also decompress every chunk, slower.
+
+        Returns:
+            list: Problems found, e.g. 'chunk 5: sectors 2-4 past end of file'. Empty if fine.
+        """
+
+        if not len(data):
+            return []  # Server makes empty region files, they're fine.
+        if not (header := self.read_header(data)):
+            return [f"file too small for header ({len(data)} bytes)"]
+
+        problems = []
+        file_sectors = -(-len(data) // SECTOR_SIZE)
+        used = {}  # Sector: chunk index using it.
+        for index, (offset, count) in enumerate(header[0]):
+            if not offset and not count: continue
+            if offset < 2 or not count or offset + count > file_sectors:
+                problems.append(f"chunk {index}: sectors {offset}-{offset + count} outside file ({file_sectors} sectors)")
+                continue
+            if (overlap := next((used[i] for i in range(offset, offset + count) if i in used), None)) is not None:
+                problems.append(f"chunk {index}: sectors overlap chunk {overlap}")
+            used.update(dict.fromkeys(range(offset, offset + count), index))
+
+            if not (chunk := self.get_chunk(data, (offset, count))):
+                problems.append(f"chunk {index}: invalid length")
+                continue
+            if decompress:
+                try: self.decompress_chunk(chunk)
+                except Exception as e:
+                    problems.append(f"chunk {index}: doesn't decompress ({e})")
+        return problems
+
+
+region_utils = Region_Utils()
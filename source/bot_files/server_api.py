@@ -16,31 +16,40 @@ Following functions must be async:
 """
 
 import os
-import json
-import aiohttp
+import shutil
 import asyncio
-import requests
+import hashlib
+import tempfile
 import subprocess
 from collections import deque
-from typing import Union, Any, Callable, Tuple, List
+from os.path import join, isfile
+from typing import Union, Any, Callable, Tuple, List, Dict
 
 import mctools
 
 from bot_files.slime_config import config
-from bot_files.slime_utils import lprint, utils, file_utils
+from bot_files.metadata_client import metadata_client
+from bot_files.slime_utils import lprint, utils, file_utils, proc_utils
 
 
 class Server_Update:
     """
     This class handles finding the latest direct download link for different server types.
     For each server type (vanilla, PaperMC, Bukkit, etc) you need to have a get_X_url() function.
-    These URL getter functions need to find a way to get the latest server (usually .jar) file direct download link.
+    These URL getter functions need to find a way to get the latest server (usually .jar) file direct download link,
+    and the checksum published with it if there is one.
     Which getter function to use is based on if keywords were found in selected server's name and description.
     Structure of url_builder_functions dict:
         Dict keys is a list of keywords to find in name and description of currently selected server.
         Dict values is a callable function used to build direct download URL for latest server.
+    Downloaded jars are verified and kept in jar_cache_path, named by their checksum, so updating multiple servers
+    to the same build only downloads once.
     """
 
+    # Only one download per cached jar at a time, shared between all Server_API instances.
+    download_locks = {}
+    download_chunk_size = 65536
+
     def __init__(self):
         self.url_builder_functions = {
             'vanilla': [self.get_vanilla_url, ['vanillla']],
@@ -48,29 +57,25 @@ class Server_Update:
             'bukkit': [self.get_bukkit_url, ['bukkit']],
         }
         self.vanilla_manifest_url = 'https://launchermeta.mojang.com/mc/game/version_manifest.json'
+        self.papermc_api_url = 'https://papermc.io/api/v2/projects/paper'
 
     async def check_latest_version(self) -> str:
         """
-        Gets latest Minecraft server version number from official website using bs4.
+        Gets latest Minecraft server version number from Mojang version manifest.
 
         Returns:
             str: Latest version number.
         """
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.vanilla_manifest_url) as response:
-                if response.status == 200:
-                    try:
-                        response = await response.json()
-                        return response['latest']['release']
-                    except: pass
-        return 'N/A'
+        try: return (await metadata_client.get_json(self.vanilla_manifest_url))['latest']['release']
+        except: return 'N/A'
 
-    async def server_update(self) -> Union[Tuple[str, str], bool]:
+    async def server_update(self) -> Union[Tuple[str, str], Tuple[bool, bool]]:
         """
+        Downloads latest server jar for selected server (or uses cached one), verifies checksum, and swaps it in as server.jar.
 
         Returns:
-
+            tuple: Download URL and version info, or False, False if failed.
         """
 
         # Picks what url builder function to use based on name and description of selected server.
@@ -78,28 +83,89 @@ class Server_Update:
         if not url_getter:
             return False, False
 
-        download_url, version_info = url_getter()
-        async with aiohttp.ClientSession() as session:
-            async with session.get(download_url) as response:
-                if response.status == 200:
-                    download_data = await response.read()
-                else:
-                    return False
+        try: download_url, version_info, checksum = await url_getter()
+        except:
+            lprint("ERROR: Problem getting server download URL.")
+            return False, False
+        if not download_url:
+            return False, False
+
+        if not (jar_path := await self.download_jar(download_url, checksum)):
+            return False, False
 
         try:  # Sets eula.txt file.
             with open(config.get_config('server_path') + '/eula.txt', 'w+') as f: f.write('eula=true')
         except IOError:
             lprint(f"ERROR: Updating eula.txt file: {config.get_config('server_path')}")
 
-        try:  # Saves file as server.jar.
-            with open(config.get_config('server_path') + '/server.jar', 'wb+') as f: f.write(download_data)
-        except IOError:
+        # Copies to temp file next to server.jar first, so server.jar is never left half written.
+        server_jar = join(config.get_config('server_path'), 'server.jar')
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, shutil.copyfile, jar_path, server_jar + '.tmp')
+            os.replace(server_jar + '.tmp', server_jar)
+        except OSError:
             lprint(f"ERROR: Saving new jar file: {config.get_config('server_path')}")
         else:
             return download_url, version_info
 
         return False, False
 
+    async def download_jar(self, download_url: str, checksum: Union[Tuple[str, str], None]) -> Union[str, bool]:
+        """
+        Streams download to temp file in chunks while hashing it, verifies checksum, then moves it into the jar cache.
+        Returns cached file if already downloaded.
+
+        Args:
+            download_url str: Direct download URL.
+            checksum tuple, None: Hash algorithm and expected hex digest, e.g. ('sha256', '4a7f...'). None if not published.
+
+        Returns:
+            str, bool: Path of verified jar in cache, or False if failed.
+        """
+
+        cache_path = config.get_config('jar_cache_path')
+        algorithm, expected = checksum if checksum else ('sha256', None)
+        jar_path = join(cache_path, f"{algorithm}-{expected.lower()}.jar") if expected else None
+
+        async with self.download_locks.setdefault(jar_path or download_url, asyncio.Lock()):
+            if jar_path and isfile(jar_path):
+                lprint(f"INFO: Using cached server jar: {jar_path}")
+                return jar_path
+
+            try:
+                os.makedirs(cache_path, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=cache_path, suffix='.part')
+            except OSError:
+                lprint(f"ERROR: Could not create jar cache folder: {cache_path}")
+                return False
+
+            file_hash = hashlib.new(algorithm)
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    session = await metadata_client.get_session()
+                    async with session.get(download_url) as response:
+                        if response.status != 200:
+                            raise IOError(f"HTTP status {response.status}")
+                        async for chunk in response.content.iter_chunked(self.download_chunk_size):
+                            file_hash.update(chunk)
+                            file.write(chunk)
+
+                digest = file_hash.hexdigest()
+                if expected and digest != expected.lower():
+                    raise IOError(f"{algorithm} mismatch, expected {expected} got {digest}")
+
+                # Files without a published checksum are still stored by their content hash.
+                jar_path = jar_path or join(cache_path, f"{algorithm}-{digest}.jar")
+                os.replace(temp_path, jar_path)
+            except Exception as e:
+                lprint(f"ERROR: Downloading server jar: {download_url} ({e})")
+                try: os.remove(temp_path)
+                except OSError: pass
+                return False
+
+        lprint(f"INFO: Downloaded server jar: {download_url} > {jar_path}")
+        return jar_path
+
     def get_url_func(self) -> Union[Callable, None]:
         """
         Picks what get_x_url() function to use based on name/description of selected server.
@@ -116,45 +182,47 @@ class Server_Update:
                 return v[0]
         return None
 
-    def get_vanilla_url(self) -> Tuple[str, str]:
+    async def get_vanilla_url(self) -> Tuple[str, str, Tuple[str, str]]:
         """
         Get direct download URL for vanilla Minecraft server.
 
         Returns:
-            Tuple[str]: Tuple of download URL and version info.
+            tuple: Download URL, version info, and ('sha1', checksum) from Mojang manifest.
         """
 
-        download_url = version_info = ''
-        def get_json_data(url): return json.loads(requests.get(url).text)
         # Finds latest release from manifest and gets required data.
-        manifest = get_json_data('https://launchermeta.mojang.com/mc/game/version_manifest.json')
+        manifest = await metadata_client.get_json(self.vanilla_manifest_url)
         for i in manifest['versions']:
-            if i['type'] == 'release':
+            if i['type'] == 'release':  # First release found should be latest.
                 version_info = f"{i['id']} ({i['time']})"
-                download_url = get_json_data(i['url'])['downloads']['server']['url']
-                break  # Breaks loop on firest release found (should be latest).
-        return download_url, version_info
+                # Each version's json doesn't change once released.
+                server_download = (await metadata_client.get_json(i['url'], immutable=True))['downloads']['server']
+                return server_download['url'], version_info, ('sha1', server_download['sha1'])
+
+        return '', '', None
 
-    def get_papermc_url(self) -> Tuple[str, str]:
+    async def get_papermc_url(self) -> Tuple[str, str, Tuple[str, str]]:
         """
         Get direct download URL for latest PaperMC server.
 
         Returns:
-            Tuple[str]: Tuple of download URL and version info.
+            tuple: Download URL, version info, and ('sha256', checksum) from PaperMC API.
         """
 
-        base_url = 'https://papermc.io/api/v2/projects/paper'
+        base_url = self.papermc_api_url
         # Extracts required data for download URL. PaperMC API: https://papermc.io/api/docs/swagger-ui/index.html?configUrl=/api/openapi/swagger-config
-        def get_data(find, url=''): return json.loads(requests.get(f'{base_url}{url}').text)[find]
-        latest_version = get_data('versions')[-1]  # Gets latest Minecraft version (e.g. 1.18.2).
-        latest_build = get_data('builds', f'/versions/{latest_version}')[-1]  # Get PaperMC Paper latest build (277).
-        # Get file name to download (paper-1.18.2-277.jar).
-        latest_jar = version_info = get_data('downloads', f'/versions/{latest_version}/builds/{latest_build}')['application']['name']
+        latest_version = (await metadata_client.get_json(base_url))['versions'][-1]  # Gets latest Minecraft version (e.g. 1.18.2).
+        latest_build = (await metadata_client.get_json(f'{base_url}/versions/{latest_version}'))['builds'][-1]  # Get PaperMC Paper latest build (277).
+        # Get file name to download (paper-1.18.2-277.jar) and its checksum. Build info doesn't change once published.
+        build_data = await metadata_client.get_json(f'{base_url}/versions/{latest_version}/builds/{latest_build}', immutable=True)
+        application = build_data['downloads']['application']
+
+        latest_jar = version_info = application['name']
         # Full download URL: https://papermc.io/api/v2/projects/paper/versions/1.18.2/builds/277/downloads/paper-1.18.2-277.jar
         jar_download_url = f'{base_url}/versions/{latest_version}/builds/{latest_build}/downloads/{latest_jar}'
-        return jar_download_url, version_info
+        return jar_download_url, version_info, ('sha256', application['sha256'])
 
-    def get_bukkit_url(self): pass
+    async def get_bukkit_url(self): return '', '', None
 
 
 class Server_API(Server_Update):
@@ -173,6 +241,7 @@ class Server_API(Server_Update):
         self.last_check_number = ''
         self.last_command_sent = ''
         self.last_command_output = ''
+        self.server_subprocess = None
 
         # Set server launch path depending on config.
         self.launch_path = config.get_config('server_path')
@@ -237,6 +306,41 @@ class Server_API(Server_Update):
 
         return False
 
+    async def get_players_coords(self, players: List[str]) -> Dict[str, str]:
+        """
+        Gets location coordinates for multiple players in one console round trip.
+        Sends a check command as the stopgap, then all the 'data get entity' commands back to back, then reads log once.
+
+        Args:
+            players list: Player names.
+
+        Returns:
+            dict: Lowercase player name as key and 'x, y, z' coordinates as value. Players not found are left out.
+        """
+
+        players = [i.strip() for i in players if i and i.strip()]
+        if not players:
+            return {}
+
+        # Unique number is sent first so reading the log bottom up stops at the start of this batch's output.
+        check_command, unique_number = utils.get_check_command()
+        if not await self.send_command(check_command):
+            return {}
+        for player in players:
+            if not await self.send_command(f"data get entity {player} Pos"):
+                return {}
+
+        # Server might not have logged all the output yet, so gives it a couple more tries.
+        coords = {}
+        for _ in range(3):
+            await asyncio.sleep(config.get_config('command_buffer_time'))
+            if log_data := await self.read_server_log('has the following entity data', lines=len(players), find_all=True, stopgap_str=unique_number):
+                coords = utils.parse_coords_output(log_data)
+            if len(coords) >= len(players):
+                break
+
+        return coords
+
     # ===== Server Files
     async def read_server_log(self, search: str = None, lines: int = 15, extra_lines: int = 0,
                               find_all: bool = False, stopgap_str: str = None,
@@ -309,6 +413,7 @@ class Server_API(Server_Update):
         except: lprint("ERROR: Problem starting server subprocess")
 
         if isinstance(self.server_subprocess, subprocess.Popen):
+            proc_utils.write_pid_file(f"server_{config.server_name}", self.server_subprocess.pid)
             return True
 
         return False
@@ -441,22 +546,38 @@ class Server_API_Rcon(Server_API):
             str, bool: Output from RCON or False if error.
         """
 
+        if (output := self._rcon_command(command)) is not False:
+            self.last_command_output = output
+        return output
+
+    def _rcon_command(self, command: str) -> Union[str, bool]:
+        """
+        Opens RCON connection, sends command, and returns output. Does not touch shared state, so it's safe to run in threads.
+
+        Args:
+            command str: Minecraft server command.
+
+        Returns:
+            str, bool: Output from RCON or False if error.
+        """
+
         rcon_data = f"address: {config.get_config('server_address')}, port: {config.get_config('rcon_port')}, pass: {config.get_config('rcon_pass')}"
         # TODO possibly add persistent connection
         server_rcon_client = mctools.RCONClient(config.get_config('server_address'), port=config.get_config('rcon_port'))
         try:
             server_rcon_client.login(config.get_config('rcon_pass'))  # Connect to server
-            self.last_command_output = server_rcon_client.command(command)  # Send command and get output.
+            output = server_rcon_client.command(command)  # Send command and get output.
         except ConnectionError:
             lprint(f"ERROR: Unable to connect with RCON: {rcon_data}")
-            return False
         except mctools.mclient.RCONAuthenticationError:
             lprint(f"ERROR: RCON Authentication error: {rcon_data}")
         except:
             lprint(f"ERROR: Unknown RCON issue: {rcon_data}")
         else:
             server_rcon_client.stop()  # Disconnect.
-            return self.last_command_output
+            return output
+
+        return False
 
     async def get_command_output(self, keyword: str = None, extra_lines: int = 0, check_number: str = None, all_lines=False) -> Union[List, bool]:
         """
@@ -490,6 +611,29 @@ class Server_API_Rcon(Server_API):
 
         return False
 
+    async def get_players_coords(self, players: List[str]) -> Dict[str, str]:
+        """
+        Gets location coordinates for multiple players. Each RCON command runs in its own connection and thread,
+        with rcon_pool_size config limiting how many run at once.
+
+        Args:
+            players list: Player names.
+
+        Returns:
+            dict: Lowercase player name as key and 'x, y, z' coordinates as value. Players not found are left out.
+        """
+
+        players = [i.strip() for i in players if i and i.strip()]
+        semaphore = asyncio.Semaphore(max(1, config.get_config('rcon_pool_size', 1)))
+        loop = asyncio.get_event_loop()
+
+        async def get_coords(player):
+            async with semaphore:
+                return await loop.run_in_executor(None, self._rcon_command, f"data get entity {player} Pos")
+
+        responses = await asyncio.gather(*[get_coords(i) for i in players])
+        return utils.parse_coords_output([i for i in responses if i])
+
     async def server_start(self):
         return await self.server_subprocess_start()
 
@@ -0,0 +1,368 @@
+"""
+Tracks resource usage of each managed server's process tree: CPU, memory, threads, open files and disk I/O.
+Samples are kept in fixed size array-backed ring buffers, one per server, and are shown with ?perf command.
+Server process is found by PID from the server API (subprocess), PID file, or by matching server_launch_command and launch path.
+
+Tick_Monitor keeps TPS and MSPT samples the same way, shown with ?tps command, and decides when to send lag alerts.
+"""
+
+import math
+import time
+import array
+from typing import Union, Dict, List, Generator
+
+import psutil
+
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint, utils, file_utils, proc_utils
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values list: Values, does not need to be sorted.
+        pct float: Percentile, 0 to 100.
+
+    Returns:
+        float: Value at percentile, 0 if no values.
+    """
+
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+class Ring_Buffer:
+    """
+    Fixed size time series. Each field is stored in its own array.array('d'), oldest samples get overwritten once full.
+    Memory use stays the same no matter how long the bot runs, about 8 bytes per field per sample.
+    """
+
+    def __init__(self, size: int, fields: List[str]):
+        self.size = max(1, size)
+        self.fields = fields
+        self.times = array.array('d', [0.0]) * self.size
+        self.data = {field: array.array('d', [0.0]) * self.size for field in fields}
+        self.index = 0  # Next position to write to.
+        self.count = 0
+
+    def __len__(self): return self.count
+
+    def append(self, timestamp: float, values: Dict[str, float]) -> None:
+        """
+        Add sample, overwrites oldest if full.
+
+        Args:
+            timestamp float: time.time() of sample.
+            values dict: Field name and value. Missing fields are stored as NaN, which stats() skips.
+        """
+
+        self.times[self.index] = timestamp
+        for field in self.fields:
+            self.data[field][self.index] = values.get(field, math.nan)
+        self.index = (self.index + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _positions(self, since: float = None) -> Generator[int, None, None]:
+        """Yields buffer positions newest to oldest. Stops at first sample older than since."""
+
+        for i in range(1, self.count + 1):
+            pos = (self.index - i) % self.size
+            if since is not None and self.times[pos] < since:
+                break
+            yield pos
+
+    def values(self, field: str, since: float = None) -> List[float]:
+        """
+        Get values of a field, oldest first.
+
+        Args:
+            field str: Field name.
+            since float(None): Only samples at or after this timestamp.
+
+        Returns:
+            list: Values.
+        """
+
+        data = self.data[field]
+        return [data[pos] for pos in reversed(list(self._positions(since)))]
+
+    def latest(self) -> Union[Dict[str, float], None]:
+        """
+        Most recent sample.
+
+        Returns:
+            dict, None: Field values and 'time', or None if empty.
+        """
+
+        if not self.count:
+            return None
+        pos = (self.index - 1) % self.size
+        return {'time': self.times[pos], **{field: self.data[field][pos] for field in self.fields}}
+
+    def stats(self, field: str, since: float = None) -> Union[Dict[str, float], None]:
+        """
+        Min, average, max and 95th percentile of a field.
+
+        Args:
+            field str: Field name.
+            since float(None): Only samples at or after this timestamp.
+
+        Returns:
+            dict, None: 'min', 'avg', 'max', 'p95', 'count'. None if no samples.
+        """
+
+        values = [v for v in self.values(field, since) if not math.isnan(v)]  # NaN marks unknown values.
+        if not values:
+            return None
+        return {'min': min(values), 'avg': sum(values) / len(values), 'max': max(values),
+                'p95': percentile(values, 95), 'count': len(values)}
+
+
+class Server_Metrics:
+    fields = ['cpu', 'rss', 'threads', 'open_files', 'read_rate', 'write_rate']
+
+    def __init__(self):
+        self.buffers = {}  # server_name: Ring_Buffer
+        self.procs = {}  # server_name: psutil.Process of server's main process.
+        self.tree_procs = {}  # server_name: {pid: psutil.Process}, reused so cpu_percent() has a previous reading to compare to.
+        self.last_io = {}  # server_name: (timestamp, read_bytes, write_bytes)
+        self.last_scan = 0
+        self.scan_interval = 60  # Seconds between full process scans for servers without known process.
+
+    def get_buffer(self, server_name: str) -> Ring_Buffer:
+        """Gets or creates ring buffer for server."""
+
+        if server_name not in self.buffers:
+            self.buffers[server_name] = Ring_Buffer(config.get_config('metrics_buffer_size'), self.fields)
+        return self.buffers[server_name]
+
+    def update_server_procs(self, server_pids: Dict[str, int]) -> None:
+        """
+        Updates known server processes. Uses PIDs from server API or PID files first, then scans processes for the rest (rate limited).
+
+        Args:
+            server_pids dict: Server name and PID of servers started by the bot.
+        """
+
+        missing = {}
+        for server_name, server_configs in config.servers.items():
+            if server_name == 'example': continue
+
+            proc = self.procs.get(server_name)
+            if proc and proc.is_running():
+                continue
+            self.procs.pop(server_name, None)
+            self.tree_procs.pop(server_name, None)
+            self.last_io.pop(server_name, None)
+
+            if pid := server_pids.get(server_name):
+                proc_utils.write_pid_file(f"server_{server_name}", pid)
+            if proc := proc_utils.get_pid_proc(f"server_{server_name}"):
+                self.procs[server_name] = proc
+            else:
+                missing[server_name] = server_configs
+
+        if missing and time.time() - self.last_scan > self.scan_interval:
+            self.last_scan = time.time()
+            self.procs.update(proc_utils.find_server_procs(missing))
+
+    def _sample_tree(self, server_name: str, proc: psutil.Process) -> Union[Dict[str, float], None]:
+        """
+        Sums resource usage of process and all its children.
+
+        Returns:
+            dict, None: Metric values, None if process is gone.
+        """
+
+        try: tree = [proc] + proc.children(recursive=True)
+        except psutil.Error:
+            return None
+
+        cached = self.tree_procs.get(server_name, {})
+        new_cached = {}
+        cpu = rss = threads = open_files = read_bytes = write_bytes = 0
+        for p in tree:
+            # Process equality also checks create time, so a reused PID won't match.
+            if cached.get(p.pid) == p: p = cached[p.pid]
+            try:
+                with p.oneshot():
+                    cpu += p.cpu_percent()  # First reading for a new process is 0.
+                    rss += p.memory_info().rss
+                    threads += p.num_threads()
+                    try: open_files += len(p.open_files())
+                    except psutil.AccessDenied: pass
+                    try:
+                        io = p.io_counters()
+                        read_bytes += io.read_bytes
+                        write_bytes += io.write_bytes
+                    except (psutil.AccessDenied, AttributeError): pass  # io_counters() not available on macOS.
+            except psutil.Error:
+                continue
+            new_cached[p.pid] = p
+        self.tree_procs[server_name] = new_cached
+
+        # Disk I/O rate in bytes per second since last sample.
+        now = time.time()
+        read_rate = write_rate = 0.0
+        if last_io := self.last_io.get(server_name):
+            elapsed = now - last_io[0]
+            if elapsed > 0:
+                # Counters can go down if a child process exits.
+                read_rate = max(0.0, (read_bytes - last_io[1]) / elapsed)
+                write_rate = max(0.0, (write_bytes - last_io[2]) / elapsed)
+        self.last_io[server_name] = (now, read_bytes, write_bytes)
+
+        return {'cpu': cpu, 'rss': rss, 'threads': threads, 'open_files': open_files, 'read_rate': read_rate, 'write_rate': write_rate}
+
+    def sample(self, server_pids: Dict[str, int] = None) -> None:
+        """
+        Records one sample for each running server. Blocking, run it in an executor.
+
+        Args:
+            server_pids dict(None): Server name and PID of servers started by the bot.
+        """
+
+        try: self.update_server_procs(server_pids or {})
+        except:
+            lprint("ERROR: Problem finding server processes for metrics.")
+            return
+
+        for server_name, proc in list(self.procs.items()):
+            if values := self._sample_tree(server_name, proc):
+                self.get_buffer(server_name).append(time.time(), values)
+            else:
+                self.procs.pop(server_name, None)
+
+    def get_stats(self, server_name: str, window: float) -> Union[Dict[str, Dict[str, float]], None]:
+        """
+        Stats of each metric over the last window seconds.
+
+        Args:
+            server_name str: Server to get stats for.
+            window float: Seconds.
+
+        Returns:
+            dict, None: Metric name and its stats from Ring_Buffer.stats(). None if no samples.
+        """
+
+        if not (buffer := self.buffers.get(server_name)) or not len(buffer):
+            return None
+
+        since = time.time() - window
+        stats = {field: buffer.stats(field, since) for field in self.fields}
+        if not any(stats.values()):
+            return None
+        return stats
+
+
+class Tick_Monitor:
+    fields = ['tps', 'mspt', 'behind_ms']
+    # Servers with 'tps' and 'mspt' commands, checked against server name and description.
+    paper_keywords = ['paper', 'purpur', 'pufferfish']
+
+    def __init__(self):
+        self.buffers = {}  # server_name: Ring_Buffer
+        self.log_positions = {}  # server_name: (inode, offset, timestamp) of server log when last read.
+        self.last_alert = {}  # server_name: timestamp
+
+    def get_buffer(self, server_name: str) -> Ring_Buffer:
+        """Gets or creates ring buffer for server."""
+
+        if server_name not in self.buffers:
+            self.buffers[server_name] = Ring_Buffer(config.get_config('metrics_buffer_size'), self.fields)
+        return self.buffers[server_name]
+
+    def uses_tick_commands(self, server_configs: Dict) -> bool:
+        """If server has Paper's 'tps' and 'mspt' commands, based on server name and description."""
+
+        text = f"{server_configs['server_name']} {server_configs['server_description']}".lower()
+        return any(i in text for i in self.paper_keywords)
+
+    def read_lag_log(self, server_name: str, log_file: str) -> Union[Dict[str, float], None]:
+        """
+        Estimates TPS from "Can't keep up!" lines logged since last call. Works with any server type.
+        E.g. "Can't keep up! Is the server overloaded? Running 2345ms or 46 ticks behind"
+
+        Args:
+            server_name str: Server name.
+            log_file str: Path of server's latest.log.
+
+        Returns:
+            dict, None: 'tps' and 'behind_ms' values. None on first call, which only marks the starting position.
+        """
+
+        now = time.time()
+        if server_name not in self.log_positions:
+            self.log_positions[server_name] = (*file_utils.get_file_position(log_file), now)
+            return None
+
+        inode, offset, last_time = self.log_positions[server_name]
+        lines, position = file_utils.read_new_lines(log_file, (inode, offset))
+        self.log_positions[server_name] = (*position, now)
+
+        behind_ms = behind_ticks = 0
+        for line in lines:
+            if lag := utils.parse_lag_line(line):
+                behind_ms += lag[0]
+                behind_ticks += lag[1]
+
+        # Server should run 20 ticks per second, so every skipped tick over the elapsed time lowers the average.
+        elapsed = max(1.0, now - last_time)
+        return {'tps': max(0.0, 20 - behind_ticks / elapsed), 'behind_ms': float(behind_ms)}
+
+    def record(self, server_name: str, values: Dict[str, float]) -> None:
+        """Adds TPS/MSPT sample for server. Missing values are stored as unknown."""
+
+        self.get_buffer(server_name).append(time.time(), values)
+
+    def check_alert(self, server_name: str, values: Dict[str, float]) -> Union[str, None]:
+        """
+        Checks sample against tps_alert_threshold and mspt_alert_threshold. Only one alert per tick_alert_cooldown.
+
+        Args:
+            server_name str: Server name.
+            values dict: Sample values.
+
+        Returns:
+            str, None: Alert message, or None if no alert needed.
+        """
+
+        problems = []
+        tps, mspt = values.get('tps'), values.get('mspt')
+        if (threshold := config.get_config('tps_alert_threshold')) and tps is not None and tps < threshold:
+            problems.append(f"TPS `{tps:.1f}` (below {threshold})")
+        if (threshold := config.get_config('mspt_alert_threshold')) and mspt is not None and mspt > threshold:
+            problems.append(f"MSPT `{mspt:.1f}` (above {threshold})")
+        if not problems:
+            return None
+
+        if time.time() - self.last_alert.get(server_name, 0) < config.get_config('tick_alert_cooldown'):
+            return None
+        self.last_alert[server_name] = time.time()
+
+        return f":warning: **Lag Alert** `{server_name}`: {', '.join(problems)}. Use `?tps` and `?perf` for more."
+
+    def get_stats(self, server_name: str, window: float) -> Union[Dict[str, Dict[str, float]], None]:
+        """
+        Stats of TPS and MSPT over the last window seconds.
+
+        Returns:
+            dict, None: Field name and its stats from Ring_Buffer.stats(). None if no samples.
+        """
+
+        if not (buffer := self.buffers.get(server_name)) or not len(buffer):
+            return None
+
+        since = time.time() - window
+        stats = {field: buffer.stats(field, since) for field in self.fields}
+        if not any(stats.values()):
+            return None
+        return stats
+
+
+server_metrics = Server_Metrics()
+tick_monitor = Tick_Monitor()
@@ -7,26 +7,50 @@ Project Structure:
             Server_API - slime_api.py, Sending commands and reading log output.
         Comps - discord_components.py, Anything relating to discord component and embeds.
         Bot - slime_bot.py, Discord bot.
+        Server_Metrics - server_metrics.py, Server process resource usage samples in ring buffers.
+        Metadata_Client - metadata_client.py, Cached version manifests/build lists using shared aiohttp session.
+        Address_Resolver - address_resolver.py, Background refreshed public IP and server_address DNS lookup.
+        Chunk_Store - backup_store.py, Content addressed deduplicated backups.
+        Region_Utils - region_files.py, Reading/writing Minecraft .mca region files.
+        Backup_Archive - backup_archive.py, Compressed backup archives with index for partial extraction.
+        Job_Manager - backup_jobs.py, Backup/restore jobs in worker threads with progress, cancel, and per disk limit.
+        Backup_Catalog - backup_catalog.py, SQLite index of backups with stable IDs, sizes, and checksums.
+        Backup_Retention - backup_retention.py, Picks backups to prune by hourly/daily/weekly and size limits.
+        Copy_Engine - copy_engine.py, Multithreaded folder copy using reflink/copy_file_range/sendfile when supported.
         Utils, File_utils - slime_utils.py, Useful utilities like parsing input and formatting outputs, etc.
     Cogs:
         backups.py, Server/world backup management
         player.py, Common player commands and controls like: banning, whitelist, gamemode, etc
         server.py, Server status, start/stop, editing properties, managing different servers.
         world.py, Game related and world relating stuff, like say, chat log, weather, time, etc.
+        performance.py, Server resource usage and performance monitoring.
 """
 
 import os
+import json
+import time
 import asyncio
 import fileinput
+import traceback
 from os.path import join
-from typing import Union, Dict, Tuple, List
+from contextlib import asynccontextmanager
+from typing import Union, Dict, Tuple, List, Callable, AsyncGenerator
 
 from discord.ext.commands import Bot, Context
 import mctools
 
 from bot_files.server_api import Server_API, Server_API_Screen, Server_API_Subprocess, Server_API_Rcon, Server_API_Tmux
 from bot_files.slime_config import config
-from bot_files.slime_utils import lprint, utils, file_utils
+from bot_files.slime_utils import lprint, utils, file_utils, proc_utils
+from bot_files.backup_store import chunk_store
+from bot_files.backup_archive import backup_archive
+from bot_files.backup_catalog import backup_catalog
+from bot_files.backup_retention import backup_retention
+from bot_files.backup_verify import backup_verify
+from bot_files.backup_offsite import backup_offsite
+from bot_files.backup_jobs import Job_Manager
+from bot_files.copy_engine import copy_engine
+from bot_files.region_files import region_utils
 
 class Backend:
     # The order of this dictionary determines the priority of which API to use if multiple are enabled in configs.
@@ -46,6 +70,14 @@ class Backend:
         self.subprocess_servers = {}
         self.discord_channel = None
         self.server_active = False
+        self.jobs = Job_Manager()
+        self.saving_paused = set()  # Servers with saving turned off for a backup snapshot, autosave skips these.
+        self.backups_running = set()  # Paths of backups being made, catalog sync skips them.
+        self.store_idle = None  # asyncio.Event, cleared while backup store garbage collection runs so new backups wait.
+        self.trash_task = None
+        self.trash_requested = False
+        self.offsite_task = None
+        self.offsite_requested = False
 
     # ===== Discord
     async def update_bot_object(self, bot: Bot) -> bool:
@@ -64,6 +96,8 @@ class Backend:
             self.set_discord_channel()
             await self.select_server(config.get_config('selected_server'))
             self.server_api.bot = bot
+            await self.resume_saving()
+            self.empty_trash()  # Finishes deleting anything left in trash from before bot restarted.
             return True
 
         return False
@@ -142,6 +176,7 @@ class Backend:
 
         if config.switch_server_configs(server_name) is False:
             return False
+        self.sync_backup_catalog()
 
         # In cases of wanting to use subprocess to run Minecraft server and have the ability to switch servers to control.
         # This needs its own object so you can switch between them without killing the Minecraft server subprocess.
@@ -169,6 +204,18 @@ class Backend:
         lprint(f"INFO: Selected Server: {server_name}")
         return True
 
+    def get_server_pids(self) -> Dict[str, int]:
+        """
+        Gets PIDs of servers the bot started as a subprocess.
+
+        Returns:
+            dict: Server name and PID.
+        """
+
+        server_apis = dict(self.subprocess_servers)
+        if self.server_api: server_apis.setdefault(config.server_name, self.server_api)
+        return {name: api.server_subprocess.pid for name, api in server_apis.items() if getattr(api, 'server_subprocess', None)}
+
     # Send command to server console.
     async def send_command(self, command: str) -> bool:
         """
@@ -265,11 +312,15 @@ class Backend:
             lprint("ERROR: Server port issue.")
             return False
 
-        return await asyncio.wait_for(self._ping_query(), timeout=1)
+        # PINGClient blocks, so it runs in executor. Its own timeout stops the thread soon after wait_for gives up.
+        try: return await asyncio.wait_for(asyncio.get_event_loop().run_in_executor(None, self._ping_query), timeout=1)
+        except asyncio.TimeoutError: return False
+
+    def _ping_query(self) -> Union[Dict, bool]:
+        """Blocking status ping, run in executor."""
 
-    async def _ping_query(self):
         try:
-            ping = mctools.PINGClient(config.get_config('server_address'), config.get_config('server_port'))
+            ping = mctools.PINGClient(config.get_config('server_address'), config.get_config('server_port'), timeout=1)
             stats = ping.get_stats()
             ping.stop()
         except:
@@ -277,17 +328,185 @@ class Backend:
         else:
             return stats
 
+    # ===== Server start/stop
+    def get_log_position(self) -> Tuple[int, int]:
+        """
+        Current position of server log. Pass to wait_for_server_start() or wait_for_server_stop() so only lines logged afterwards are checked.
+
+        Returns:
+            tuple: Inode and size of latest.log.
+        """
+
+        return file_utils.get_file_position(config.get_config('server_log_filepath'))
+
+    async def _wait_for_signal(self, keywords: List[str], log_position: Tuple[int, int], timeout: float, check_func: Callable) -> bool:
+        """
+        Polls server log for new lines containing any of the keywords, and check_func, until either one succeeds or timeout.
+
+        Args:
+            keywords list: Log line keywords to look for.
+            log_position tuple: Only lines logged after this position are checked.
+            timeout float: Max seconds to wait.
+            check_func Callable: Async function, returns True if signal received some other way (ping, process exit, etc).
+
+        Returns:
+            bool: If signal received before timeout.
+        """
+
+        log_file = config.get_config('server_log_filepath')
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if config.get_config('server_files_access'):
+                lines, log_position = file_utils.read_new_lines(log_file, log_position)
+                if any(k in line for line in lines for k in keywords):
+                    return True
+            if await check_func():
+                return True
+            await asyncio.sleep(1)
+
+        return False
+
+    def _server_pingable(self) -> bool:
+        """Blocking check if server answers a status ping, run in executor."""
+
+        try:
+            ping = mctools.PINGClient(config.get_config('server_address'), config.get_config('server_port'), timeout=1)
+            ping.get_stats()
+            ping.stop()
+        except: return False
+        return True
+
+    async def server_pingable(self) -> bool:
+        """
+        Check if server answers a status ping, without blocking the bot.
+
+        Returns:
+            bool: If server replied.
+        """
+
+        if not config.get_config('server_address') or not config.get_config('server_port'):
+            return False
+
+        return await asyncio.get_event_loop().run_in_executor(None, self._server_pingable)
+
+    async def wait_for_server_start(self, log_position: Tuple[int, int], started_at: float) -> Union[float, bool]:
+        """
+        Waits until server logs 'Done (X.XXXs)! For help' line or replies to a ping. Records startup time.
+
+        Args:
+            log_position tuple: Log position from before server was launched, from get_log_position().
+            started_at float: time.monotonic() from before server was launched.
+
+        Returns:
+            float, bool: Seconds server took to start, or False if timed out.
+        """
+
+        if await self._wait_for_signal([')! For help'], log_position, self.get_startup_timeout(), self.server_pingable):
+            startup_time = round(time.monotonic() - started_at, 1)
+            self.record_startup_time(startup_time)
+            self._set_saving_paused(config.server_name, False)  # Restarted server always has saving on.
+            await self.clear_restore_trash()  # Restored files are good, files they replaced aren't needed for ?restoreundo anymore.
+            lprint(f"INFO: Server started in {startup_time}s")
+            # Writes PID file if server was started with Tmux/Screen, so later lookups don't need to scan processes.
+            if config.get_config('server_files_access'):
+                await asyncio.get_event_loop().run_in_executor(None, proc_utils.get_server_proc, config.server_name)
+            return startup_time
+
+        return False
+
+    async def wait_for_server_stop(self, log_position: Tuple[int, int]) -> bool:
+        """
+        Waits until server process exits or server logs that all dimensions are saved.
+        If there's no log access or process to check, waits until server stops replying to pings.
+
+        Args:
+            log_position tuple: Log position from before stop command was sent, from get_log_position().
+
+        Returns:
+            bool: If server stopped before shutdown_timeout.
+        """
+
+        async def check_stopped():
+            if server_subprocess := self.server_api.server_subprocess:
+                return server_subprocess.poll() is not None
+            # Port closes before world is saved, so only use ping if log can't be read.
+            if not config.get_config('server_files_access'):
+                return not await self.server_pingable()
+            return False
+
+        keywords = ['All dimensions are saved']
+        if await self._wait_for_signal(keywords, log_position, config.get_config('shutdown_timeout'), check_stopped):
+            return True
+
+        lprint("ERROR: Timed out waiting for server to stop.")
+        return False
+
+    def get_startup_history(self, server_name: str = None) -> List[Dict]:
+        """
+        Gets recorded startup times.
+
+        Args:
+            server_name str(None): Server to get times for, defaults to selected server.
+
+        Returns:
+            list: Dicts with 'server', 'seconds', 'date' keys, oldest first.
+        """
+
+        server_name = server_name or config.server_name
+        file_path = config.get_config('startup_history_filepath')
+        if not os.path.isfile(file_path):
+            return []
+
+        return [i for i in file_utils.read_json(file_path) or [] if i.get('server') == server_name]
+
+    def record_startup_time(self, seconds: float, keep: int = 20) -> bool:
+        """
+        Saves startup time for selected server. Only keeps the most recent ones for each server.
+
+        Args:
+            seconds float: How long server took to start.
+            keep int(20): Number of records to keep per server.
+
+        Returns:
+            bool: If saved to file.
+        """
+
+        file_path = config.get_config('startup_history_filepath')
+        history = (file_utils.read_json(file_path) or []) if os.path.isfile(file_path) else []
+        history.append({'server': config.server_name, 'seconds': seconds, 'date': utils.get_datetime()})
+
+        server_history = [i for i in history if i.get('server') == config.server_name]
+        history = [i for i in history if i.get('server') != config.server_name] + server_history[-keep:]
+        return file_utils.write_json(file_path, history)
+
+    def get_startup_timeout(self) -> float:
+        """
+        How long to wait for server to start. Twice the longest recent startup, at least startup_wait_time,
+        and at most startup_timeout. Uses startup_timeout if there's no recorded startup times.
+
+        Returns:
+            float: Seconds.
+        """
+
+        max_timeout = config.get_config('startup_timeout')
+        if recent := [i['seconds'] for i in self.get_startup_history()[-10:]]:
+            return min(max_timeout, max(config.get_config('startup_wait_time'), max(recent) * 2))
+        return max_timeout
+
     # ===== Get data
-    async def get_players(self) -> Union[Tuple[List[str], str], bool]:
+    async def get_players(self, version: str = None) -> Union[Tuple[List[str], str], bool]:
         """
         Extracts wanted data from output of 'list' command.
 
+        Args:
+            version str(None): Server version if already fetched, so it's not looked up again.
+
         Returns:
             Player data, bool: Returns player names and associating text, or False.
         """
 
         # Converts server version to usable int. Extracts number after initial '1.', e.g. '1.12.2' > 12
-        version = await self.get_server_version()  # Needs version to know how to parse output.
+        version = version or await self.get_server_version()  # Needs version to know how to parse output.
         response = await self.send_command("list")
 
         if not response:
@@ -305,14 +524,38 @@ class Backend:
     async def get_coords(self, player: str = '') -> Union[str, bool]:
         """Gets player's location coordinates."""
 
-        if not await backend.send_command(f"data get entity {player} Pos"):
-            return False
-            #log_data = self.read_server_log('entity data', stopgap_str=response[1])
-        # ['', '14:38:26] ', 'Server thread/INFO]: R3diculous has the following entity data: ', '-64.0d, 65.0d, 16.0d]\n']
-        # Removes 'd' and newline character to get player coordinate. '-64.0 65.0 16.0d'
-        if log_data := await self.get_command_output('data get entity'):
-            location = log_data.split('[')[-1][:-3].replace('d', '')
-            return location
+        coords = await self.get_players_coords([player])
+        return coords.get(player.strip().lower(), False)
+
+    async def get_players_coords(self, players: List[str]) -> Dict[str, str]:
+        """
+        Gets location coordinates for multiple players at once, instead of one command round trip per player.
+
+        Args:
+            players list: Player names.
+
+        Returns:
+            dict: Lowercase player name as key and 'x, y, z' coordinates as value. Players not found are left out.
+        """
+
+        return await self.server_api.get_players_coords(players)
+
+    async def get_tick_times(self) -> Dict[str, float]:
+        """
+        Gets TPS and MSPT using PaperMC's 'tps' and 'mspt' commands.
+
+        Returns:
+            dict: 'tps' and 'mspt' values, only the ones that were found.
+        """
+
+        values = {}
+        if await self.send_command('tps'):
+            if (tps := utils.parse_tps_output(await self.get_command_output('TPS from last'))) is not None:
+                values['tps'] = tps
+        if await self.send_command('mspt'):
+            if (mspt := utils.parse_mspt_output(await self.get_command_output('Server tick times', 2))) is not None:
+                values['mspt'] = mspt
+        return values
 
     async def get_motd(self) -> str:
         """
@@ -467,8 +710,9 @@ class Backend:
         if server_name not in config.servers:
             return False
 
-        if not file_utils.delete_dir(config.servers[server_name]['server_path']):
+        if not file_utils.trash_dir(config.servers[server_name]['server_path']):
             return False
+        self.empty_trash()
 
         server_data = config.servers.pop(server_name)
         config.update_configs_file()
@@ -524,9 +768,122 @@ class Backend:
         return False
 
     # ===== Backup/Restore
+    def _backup_files(self, mode: str, new_backup_path: str, server_configs: Dict, progress: Callable = None) -> Union[bool, None]:
+        """
+        Does the actual work for new_backup(), runs as job in worker thread.
+
+        Args:
+            mode str: 'world' or 'server'.
+            new_backup_path str: Folder for new backup.
+            server_configs dict: Selected server's configs from when backup was started, in case user switches server while it runs.
+            progress Callable(None): Job.progress.
+
+        Returns:
+            bool, None: If successful, None if some world folders failed.
+        """
+
+        backup_format = server_configs['backup_format']
+        region_diff = backup_format == 'region'
+        server_path = server_configs['server_path']
+        backups_path = server_configs['server_backups_path' if 'server' in mode else 'world_backups_path']
+        # Whole server folder, or all folders in world_folders. I.e. world, world_nether, world_the_end
+        folders = [''] if 'server' in mode else server_configs['world_folders']
+
+        if backup_format in ('dedup', 'region'):
+            previous = chunk_store.find_previous_manifest(backups_path)
+            if not (manifest := chunk_store.backup(server_path, folders, new_backup_path, previous, region_diff, progress)):
+                return False
+            return None if manifest['missing'] else True
+
+        if backup_format == 'archive':
+            if not (index := backup_archive.create(server_path, folders, new_backup_path, server_configs['backup_compression_level'], progress)):
+                return False
+            return None if index['missing'] else True
+
+        if 'server' in mode:
+            if backup_format == 'hardlink':
+                # Links from newest server backup that's a folder copy (has server.properties), not a dedup manifest.
+                link_dest = file_utils.get_latest_dir(backups_path, 'server.properties')
+                return file_utils.link_copy_dir(server_path, new_backup_path, link_dest, server_configs['backup_hardlink_check_hash'], progress)
+            return file_utils.copy_dir(server_path, new_backup_path, progress)
+
+        flag = True
+        for folder in folders:
+            source_path = join(server_path, folder)
+            if backup_format == 'hardlink':
+                if link_dest := file_utils.get_latest_dir(backups_path, folder):
+                    link_dest = join(link_dest, folder)
+                copied = file_utils.link_copy_dir(source_path, join(new_backup_path, folder), link_dest, server_configs['backup_hardlink_check_hash'], progress)
+            else: copied = file_utils.copy_dir(source_path, join(new_backup_path, folder), progress)
+            if not copied:
+                flag = None  # Even if failed, it'll try to backup the others.
+        return flag
+
+    def _set_saving_paused(self, server_name: str, paused: bool) -> None:
+        """Records servers the bot turned saving off for in saving_paused_filepath, so it's not forgotten if bot stops mid backup."""
+
+        file_path = config.get_config('saving_paused_filepath')
+        servers = (file_utils.read_json(file_path) or []) if os.path.isfile(file_path) else []
+        if paused == (server_name in servers): return
+        file_utils.write_json(file_path, servers + [server_name] if paused else [i for i in servers if i != server_name])
+
+    async def resume_saving(self) -> bool:
+        """
+        Sends save-on if selected server still has saving off from a backup that never finished, e.g. bot crashed or was killed.
+
+        Returns:
+            bool: If saving had to be turned back on.
+        """
+
+        file_path = config.get_config('saving_paused_filepath')
+        if not os.path.isfile(file_path) or config.server_name not in (file_utils.read_json(file_path) or []):
+            return False
+
+        if await self.send_command('save-on'):
+            self._set_saving_paused(config.server_name, False)
+            lprint("INFO: Turned saving back on, was left off by unfinished backup")
+            return True
+        return False
+
+    @asynccontextmanager
+    async def saving_paused_snapshot(self) -> AsyncGenerator[None, None]:
+        """
+        Keeps world files still while backup copies them. Sends save-off, then save-all flush, and waits for server to log
+        'Saved the game'. On exit sends save-on, also if backup failed or was cancelled.
+        If server isn't reachable nothing is writing the files, so it skips straight to the backup.
+
+        Raises:
+            TimeoutError: Server didn't confirm save within save_world_timeout, backup should not go ahead.
+        """
+
+        server_name = config.server_name
+        log_position = self.get_log_position()
+        if not await self.send_command('save-off'):
+            yield
+            return
+
+        self.saving_paused.add(server_name)
+        self._set_saving_paused(server_name, True)
+        try:
+            async def log_unreadable():
+                return not config.get_config('server_files_access')
+
+            await self.send_command('save-all flush')
+            if not await self._wait_for_signal(['Saved the game'], log_position, config.get_config('save_world_timeout'), log_unreadable):
+                lprint("ERROR: Timed out waiting for server to save world.")
+                raise TimeoutError(f"Server did not log 'Saved the game' within {config.get_config('save_world_timeout')}s")
+            yield
+        finally:
+            self.saving_paused.discard(server_name)
+            if await self.send_command('save-on'):
+                self._set_saving_paused(server_name, False)
+            else: lprint("ERROR: Could not send save-on, will try again when bot restarts.")
+
     async def new_backup(self, new_name, mode: str) -> Union[str, bool, None]:
         """
         Create a new world or server backup, by copying all folders with 'world_' in its name.
+        Runs as a job, see ?jobs. Server saving is paused while files are copied, see saving_paused_snapshot(), then
+        backup is added to catalog in a second job with saving back on.
 
         Args:
             new_name str: Name of new copy. Final name will have date and time prefixed.
@@ -542,64 +899,712 @@ class Backend:
         new_name = f"({utils.get_datetime()}) {version_text}{new_name}"
         # E.g. (2023-08-03 16-29) v(1.19.4) test backup
 
-        # Copies whole server folder.
-        if 'server' in mode:
-            new_backup_path = join(config.get_config('server_backups_path'), new_name.strip())
-            source_path = config.get_config('server_path')
-            if file_utils.copy_dir(source_path, new_backup_path) is False:
+        server_configs = dict(config.server_configs)
+        backups_path = server_configs['server_backups_path' if 'server' in mode else 'world_backups_path']
+        new_backup_path = join(backups_path, new_name.strip())
+
+        # Dedup backups reuse stored chunks, so they can't run while unused chunks are being deleted.
+        store_idle = self._get_store_idle()
+        while not store_idle.is_set():
+            await store_idle.wait()
+        self.backups_running.add(new_backup_path)
+        try:
+            result = await self.jobs.run(f"{'Server' if 'server' in mode else 'World'} backup: {new_name}", self._backup_files, mode, new_backup_path,
+                                         server_configs, paths=[server_configs['server_path'], backups_path], send_msg=self.send_msg,
+                                         context=self.saving_paused_snapshot())
+            # Summarizing hashes backup's files again, no need to keep saving paused for it.
+            if result is not False and not await self.jobs.run(f"Catalog backup: {new_name}", backup_catalog.add_new_backup, server_configs['server_name'],
+                                                               mode, new_backup_path, version or None, server_configs['backup_format'],
+                                                               paths=[backups_path], send_msg=self.send_msg):
+                result = False
+        finally: self.backups_running.discard(new_backup_path)
+        if result is False:
+            # Removes unfinished backup, so it can't be picked for restore.
+            if os.path.isdir(new_backup_path) and file_utils.trash_dir(new_backup_path): self.empty_trash()
+            return False
+        if result is None:
+            return None
+
+        if server_configs['backup_verify']:
+            asyncio.ensure_future(self._verify_new_backup(server_configs['server_name'], mode, new_backup_path))
+        self.replicate_backups()
+        return new_name
+
+    def _verify_backup_job(self, backup: Dict, progress: Callable = None) -> Dict:
+        """Job for verify_backup(), checks backup then saves result in catalog."""
+
+        result = backup_verify.verify(backup, progress)
+        backup_catalog.add_verification(backup['id'], result)
+        return result
+
+    async def verify_backup(self, backup: Dict) -> Union[Dict, bool]:
+        """
+        Checks backup is readable and matches catalog, see backup_verify.py. Runs as job, see ?jobs.
+
+        Args:
+            backup dict: Catalog entry, from backup_catalog.get_backup().
+
+        Returns:
+            dict, bool: 'ok', 'checked', 'problems', 'seconds' from backup_verify.verify(). False if job failed or cancelled.
+        """
+
+        return await self.jobs.run(f"Verify backup: {backup['name']}", self._verify_backup_job, backup, paths=[backup['path']], send_msg=self.send_msg)
+
+    async def _verify_new_backup(self, server_name: str, kind: str, backup_path: str) -> None:
+        """Verifies just made backup in background (backup_verify config), sends alert if it's broken."""
+
+        backups = backup_catalog.get_backups(server_name, kind, 1)
+        if not backups or backups[0]['name'] != os.path.basename(backup_path):
+            return
+        result = await self.verify_backup(backups[0])
+        if result and not result['ok']:
+            await self.send_msg(f":warning: **Backup Verify Failed:** ID {backups[0]['id']} `{backups[0]['name']}`, {len(result['problems'])} problems. "
+                                f"Use `?backupverify {backups[0]['id']}` for details.")
+
+    def sync_backup_catalog(self, server_name: str = None) -> bool:
+        """
+        Updates backup catalog with server's world and server backup folders, see Backup_Catalog.sync().
+
+        Args:
+            server_name str(None): Server to sync, defaults to selected server.
+
+        Returns:
+            bool: If synced, False if error or no server file access.
+        """
+
+        server_configs = config.servers[server_name] if server_name else config.server_configs
+        if not server_configs['server_files_access']: return False
+        try:
+            backup_catalog.sync(server_configs['server_name'], 'world', server_configs['world_backups_path'], self.backups_running)
+            backup_catalog.sync(server_configs['server_name'], 'server', server_configs['server_backups_path'], self.backups_running)
+        except:
+            lprint("ERROR: Could not sync backup catalog.")
+            traceback.print_exc()
+            return False
+        return True
+
+    def delete_backup(self, backup: Dict) -> bool:
+        """
+        Deletes backup folder (moves to trash, use empty_trash() after) and removes it from catalog.
+
+        Args:
+            backup dict: Catalog entry, from backup_catalog.get_backup().
+
+        Returns:
+            bool: If successful.
+        """
+
+        if os.path.isdir(backup['path']) and not file_utils.trash_dir(backup['path']):
+            return False
+        return backup_catalog.remove_backup(backup['id'])
+
+    def empty_trash(self) -> None:
+        """Starts job that deletes everything in trash (see file_utils.trash_dir()), or has running one go again after."""
+
+        self.trash_requested = True
+        if self.trash_task is None or self.trash_task.done():
+            self.trash_task = asyncio.ensure_future(self._empty_trash_loop())
+
+    async def _empty_trash_loop(self) -> None:
+        while self.trash_requested:
+            self.trash_requested = False
+            await self.jobs.run("Empty trash", file_utils.empty_trash)
+
+    def replicate_backups(self) -> None:
+        """
+        Starts background job uploading backups not in offsite storage yet (see backup_offsite.py), or has running one go
+        again after. Doesn't count toward max_io_jobs_per_disk, so new backups don't wait for it.
+        """
+
+        if not backup_offsite.is_enabled(): return
+        self.offsite_requested = True
+        if self.offsite_task is None or self.offsite_task.done():
+            self.offsite_task = asyncio.ensure_future(self._replicate_loop())
+
+    async def _replicate_loop(self) -> None:
+        while self.offsite_requested:
+            self.offsite_requested = False
+            if backups := backup_catalog.get_unreplicated_backups():
+                await self.jobs.run(f"Offsite upload: {len(backups)} backups", backup_offsite.replicate, backups)
+
+    def _get_store_idle(self) -> asyncio.Event:
+        if self.store_idle is None:
+            self.store_idle = asyncio.Event()
+            self.store_idle.set()
+        return self.store_idle
+
+    def get_expired_backups(self) -> List[Dict]:
+        """
+        Gets backups of all servers that their retention policy doesn't keep, see backup_retention.py.
+
+        Returns:
+            list: Catalog entries.
+        """
+
+        expired = []
+        for server_name, server_configs in config.servers.items():
+            if not backup_retention.is_enabled(server_configs) or not self.sync_backup_catalog(server_name):
+                continue
+            for kind in ('world', 'server'):
+                expired += backup_retention.get_expired(backup_catalog.get_backups(server_name, kind), server_configs)
+        return expired
+
+    def _delete_backups(self, backups: List[Dict], progress: Callable = None) -> int:
+        """Job for prune_backups(), deletes backups one at a time. Returns number deleted."""
+
+        deleted = 0
+        for backup in backups:
+            if progress: progress()  # Stops here if job cancelled.
+            if self.delete_backup(backup):
+                deleted += 1
+                lprint(f"INFO: Pruned {backup['kind']} backup of {backup['server']}: {backup['name']}")
+            if progress: progress(backup['stored'] or 0, 1)
+        return deleted
+
+    async def prune_backups(self) -> Union[int, bool]:
+        """
+        Deletes backups expired by each server's retention policy, then deletes dedup chunks no longer used.
+        Deleting runs as a job, so bot isn't held up. Skipped if backups are running, next check tries again.
+
+        Returns:
+            int, bool: Number of backups deleted, False if skipped or failed.
+        """
+
+        if self.backups_running:
+            lprint("INFO: Backups running, skipping backup pruning.")
+            return False
+
+        if not (expired := self.get_expired_backups()):
+            return 0
+
+        deleted = await self.jobs.run(f"Prune {len(expired)} backups", self._delete_backups, expired, paths=[i['path'] for i in expired])
+        self.empty_trash()
+        if deleted and any(i['format'] in ('dedup', 'region') for i in expired):
+            await self.collect_store_garbage()
+        return deleted
+
+    async def collect_store_garbage(self) -> Union[Tuple[int, int], bool]:
+        """
+        Deletes chunks in backup_store_path that no dedup/region backup uses anymore. Runs as a job.
+        Skipped if backups are running, new backups wait until it's done.
+
+        Returns:
+            tuple, bool: Number of objects and bytes deleted, False if skipped or failed.
+        """
+
+        if self.backups_running:
+            lprint("INFO: Backups running, skipping backup store garbage collection.")
+            return False
+
+        store_idle = self._get_store_idle()
+        store_idle.clear()
+        try:
+            # Every server's backups need to be in catalog, or their chunks would be deleted.
+            for server_name, server_configs in config.servers.items():
+                if server_configs['server_files_access'] and not self.sync_backup_catalog(server_name):
+                    return False
+            backup_paths = [i['path'] for i in backup_catalog.get_backups_by_format(['dedup', 'region'])]
+            return await self.jobs.run("Backup store cleanup", chunk_store.collect_garbage, backup_paths,
+                                       paths=[config.get_config('backup_store_path')])
+        finally: store_idle.set()
+
+    def get_restore_paths(self, server_path: str = None) -> Tuple[str, str, str]:
+        """
+        Restore folders next to server folder (same disk, so they can be swapped in with a rename).
+
+        Returns:
+            tuple: Staging folder, old files folder (for ?restoreundo), and info file path.
+        """
+
+        server_path = os.path.normpath(server_path or config.get_config('server_path'))
+        return f"{server_path}.restore_stage", f"{server_path}.restore_old", f"{server_path}.restore_old.json"
+
+    def _clear_restore_paths(self, server_path: str) -> bool:
+        """Trashes leftovers from a failed restore, or old files of previous restore that wasn't started yet."""
+
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        for path in (stage_path, old_path):
+            if os.path.isdir(path) and not file_utils.trash_dir(path): return False
+        if os.path.isfile(info_path): os.remove(info_path)
+        return True
+
+    def _get_backup_folders(self, src: str) -> List[str]:
+        """Top level folders in backup, for world restores."""
+
+        if chunk_store.is_dedup_backup(src): return chunk_store.backup_folders(src)
+        if backup_archive.is_archive_backup(src): return backup_archive.backup_folders(src)
+        return [i for i in os.listdir(src) if os.path.isdir(join(src, i))]
+
+    def _get_backup_files(self, src: str, folders: List[str] = None) -> Dict[str, Union[int, None]]:
+        """Gets files a restore of backup should create, relative path as key and size as value (None if size can change, like rebuilt region files)."""
+
+        if manifest := chunk_store.load_manifest(src):
+            files = {k.replace(os.sep, '/'): None if 'region' in v else v['size'] for k, v in manifest['files'].items()}
+        elif index := backup_archive.load_index(src):
+            files = {k: v['size'] for k, v in index['members'].items() if v['type'] == 'file'}
+        else:
+            files = {}
+            for dir_path, dir_names, file_names in os.walk(src):
+                for name in file_names:
+                    files[os.path.relpath(join(dir_path, name), src).replace(os.sep, '/')] = os.path.getsize(join(dir_path, name))
+        return {k: v for k, v in files.items() if folders is None or k.split('/')[0] in folders}
+
+    def _verify_stage(self, src: str, stage_path: str, folders: List[str] = None) -> bool:
+        """Checks staged restore has every file in backup, with the same size."""
+
+        for rel_path, size in self._get_backup_files(src, folders).items():
+            try: staged_size = os.path.getsize(join(stage_path, *rel_path.split('/')))
+            except OSError:
+                lprint(f"ERROR: Staged restore missing file: {rel_path}")
+                return False
+            if size is not None and staged_size != size:
+                lprint(f"ERROR: Staged restore file size mismatch: {rel_path} ({staged_size} != {size})")
                 return False
+        return True
 
-        # Copies all folders containing 'world' in name. I.e. world, world_nether, world_the_end
-        elif 'world' in mode:
-            flag = False
-            new_backup_path = join(config.get_config('world_backups_path'), new_name.strip())
-            for folder in config.get_config('world_folders'):
-                if not file_utils.copy_dir(join(config.get_config('server_path'), folder), join(new_backup_path, folder)):
-                    flag = True  # Even if failed, it'll try to backup the others.
+    def _stage_files(self, src: str, mode: str, server_path: str, progress: Callable = None) -> Union[List[str], bool]:
+        """
+        Job for stage_restore(), restores backup into staging folder and verifies it. Live server files aren't touched.
 
-            if flag:
-                return None
+        Returns:
+            list, bool: Folders staged (world mode), [''] for whole server folder. False if failed.
+        """
 
-        return new_name
+        stage_path = self.get_restore_paths(server_path)[0]
+        if not self._clear_restore_paths(server_path):
+            return False
+
+        dedup = chunk_store.is_dedup_backup(src)
+        archive = backup_archive.is_archive_backup(src)
+        if 'world' in mode:
+            folders = self._get_backup_folders(src)
+            os.makedirs(stage_path)
+            for folder in folders:
+                if dedup: restored = chunk_store.restore(src, stage_path, [folder], progress)
+                elif archive: restored = backup_archive.extract(src, stage_path, [folder], progress)
+                else: restored = file_utils.copy_dir(join(src, folder), join(stage_path, folder), progress)
+                if not restored: return False
+        else:
+            folders = None
+            if dedup: restored = chunk_store.restore(src, stage_path, progress=progress)
+            elif archive: restored = backup_archive.extract(src, stage_path, progress=progress)
+            else: restored = file_utils.copy_dir(src, stage_path, progress)
+            if not restored: return False
+
+        if not self._verify_stage(src, stage_path, folders):
+            return False
+        return folders or ['']
 
-    async def restore_backup(self, src, mode) -> Union[bool, None]:
+    async def stage_restore(self, src: str, mode: str) -> Union[List[str], bool]:
         """
-        Restores world or server backup.
-        NOTE: Overwrites existing files.
+        First half of restore, can run while server is still up. Restores backup into staging folder next to server folder
+        and checks it's complete. Runs as a job, see ?jobs. Finish restore with swap_restore() after server is stopped.
 
         Args:
-            src str: Full path of backup containing world folders to copy to server.
-            mode str: Backup world folders or entire server folder.
+            src str: Full path of backup.
+            mode str: 'world' or 'server'.
 
         Returns:
-            bool, None: Returns boolean of (all) operation was successful. None if some operations encountered error.
+            list, bool: Folders staged ([''] for whole server folder), pass to swap_restore(). False if failed, server files untouched.
         """
 
         server_path = config.get_config('server_path')
+        stage_path = self.get_restore_paths(server_path)[0]
+        folders = await self.jobs.run(f"{'Server' if 'server' in mode else 'World'} restore: {os.path.basename(src)}", self._stage_files,
+                                      src, mode, server_path, paths=[server_path, src], send_msg=self.send_msg)
+        if not folders:
+            if os.path.isdir(stage_path): file_utils.trash_dir(stage_path)
+            self.empty_trash()
+            return False
+        self.empty_trash()  # Previous restore's leftovers.
+        return folders
 
-        if 'world' in mode:
-            flag = True
-            for folder in os.listdir(src):
-                full_path_server = f"{server_path}//{folder}"
-                full_path_backup = f"{src}//{folder}"
-                # Deletes folder in server directory if exist before copying.
-                if file_utils.test_dir(full_path_server):
-                    if not file_utils.delete_dir(full_path_server):
-                        flag = None
-                        continue
-                if not file_utils.copy_dir(full_path_backup, full_path_server):
-                    flag = None
-                    continue
-
-            return flag
+    def _swap_folders(self, swaps: List[Tuple[Union[str, None], str, str]]) -> bool:
+        """
+        Moves live folders (or files) out of the way and staged ones in, using renames. Undoes already done swaps if one fails.
 
-        if 'server' in mode:
-            if file_utils.delete_dir(server_path):
-                if file_utils.copy_dir(src, server_path):
-                    return True
+        Args:
+            swaps list: (new folder, live folder, where to move live folder) tuples. New folder None to only move live one away.
 
-        return False
+        Returns:
+            bool: If all swapped.
+        """
+
+        done = []
+        try:
+            for new_path, live_path, old_path in swaps:
+                moved_live = False
+                if os.path.exists(live_path):
+                    os.makedirs(os.path.dirname(old_path), exist_ok=True)
+                    os.rename(live_path, old_path)
+                    moved_live = True
+                try:
+                    if new_path:
+                        os.makedirs(os.path.dirname(live_path), exist_ok=True)
+                        os.rename(new_path, live_path)
+                except:
+                    if moved_live: os.rename(old_path, live_path)
+                    raise
+                done.append((new_path, live_path, old_path, moved_live))
+        except:
+            lprint("ERROR: Could not swap restored folders, undoing.")
+            traceback.print_exc()
+            for new_path, live_path, old_path, moved_live in reversed(done):
+                if new_path: os.rename(live_path, new_path)
+                if moved_live: os.rename(old_path, live_path)
+            return False
+        return True
+
+    async def swap_restore(self, src: str, mode: str, folders: List[str]) -> bool:
+        """
+        Second half of restore. Swaps staged folders in with renames, so it only takes a moment.
+        Replaced files are kept for ?restoreundo until server next starts.
+
+        Args:
+            src str: Backup path, for info file.
+            mode str: 'world' or 'server'.
+            folders list: From stage_restore().
+
+        Returns:
+            bool: If swapped, False if server still running or rename failed (live files left as they were).
+        """
+
+        if await self.server_status():
+            lprint("ERROR: Server still running, not swapping in restore.")
+            return False
+
+        server_path = os.path.normpath(config.get_config('server_path'))
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        if folders == ['']:
+            swaps = [(stage_path, server_path, old_path)]
+        else: swaps = [(join(stage_path, i), join(server_path, i), join(old_path, i)) for i in folders]
+
+        if not self._swap_folders(swaps):
+            return False
+        if os.path.isdir(stage_path): file_utils.delete_dir(stage_path)  # Only empty folders left in it.
+        file_utils.write_json(info_path, {'mode': mode, 'folders': folders, 'backup': src, 'date': utils.get_datetime()})
+        lprint(f"INFO: Restored {mode} from {src}, replaced files kept in {old_path}")
+        return True
+
+    def _get_backup_entries(self, backup: Dict) -> Dict[str, Dict]:
+        """
+        Gets files in backup for delta restore, with what they should look like once restored.
+
+        Returns:
+            dict: Relative path ('/' separated) as key, dict with 'size' (None if file is rebuilt so size can differ, like
+                'region' format region files), 'mtime' (ns), 'digest' (SHA-256, None if not known) as value.
+        """
+
+        src = backup['path']
+        if manifest := chunk_store.load_manifest(src):
+            return {k.replace(os.sep, '/'): {'size': None if 'region' in v else v['size'], 'mtime': v['mtime'], 'digest': None}
+                    for k, v in manifest['files'].items()}
+        if index := backup_archive.load_index(src):
+            return {k: {'size': v['size'], 'mtime': v['mtime'], 'digest': None} for k, v in index['members'].items() if v['type'] == 'file'}
+
+        # Copied backups, catalog has hash of each file if it's been summarized.
+        cataloged = backup_catalog.get_files(backup['id'])
+        entries = {}
+        for dir_path, dir_names, file_names in os.walk(src):
+            for name in file_names:
+                stat = os.stat(join(dir_path, name))
+                rel_path = os.path.relpath(join(dir_path, name), src).replace(os.sep, '/')
+                old = cataloged.get(rel_path)
+                digest = old['digest'] if old and old['size'] == stat.st_size and old['mtime'] == stat.st_mtime_ns else None
+                entries[rel_path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'digest': digest}
+        return entries
+
+    def _is_restored_file(self, path: str, stat: os.stat_result, entry: Dict, check_hash: bool = False) -> bool:
+        """Checks if live file already matches backup's file, so delta restore can skip it."""
+
+        if entry['size'] is not None and stat.st_size != entry['size']: return False
+        if stat.st_mtime_ns != entry['mtime']: return False
+        if check_hash and entry['digest']:
+            return file_utils.hash_file(path) == entry['digest']
+        return True
+
+    def _restore_backup_paths(self, src: str, dest_root: str, paths: List[str], progress: Callable = None) -> bool:
+        """Restores some files of backup (relative paths, '/' separated) into dest_root, any backup format."""
+
+        os.makedirs(dest_root, exist_ok=True)
+        if chunk_store.is_dedup_backup(src): return chunk_store.restore(src, dest_root, progress=progress, paths=paths)
+        if backup_archive.is_archive_backup(src): return backup_archive.extract(src, dest_root, progress=progress, paths=paths)
+        try:
+            for rel_path in paths:
+                os.makedirs(os.path.dirname(dest := join(dest_root, *rel_path.split('/'))), exist_ok=True)
+                copy_engine.copy_file(join(src, *rel_path.split('/')), dest, progress=progress)
+                if progress: progress(0, 1)
+        except:
+            lprint(f"ERROR: Issue restoring files from backup: {src} > {dest_root}")
+            traceback.print_exc()
+            return False
+        return True
+
+    def _delta_restore_files(self, backup: Dict, server_path: str, progress: Callable = None) -> Union[Dict, bool]:
+        """
+        Job for delta_restore(). Compares live files with backup, restores only changed and missing ones into staging folder,
+        then swaps them in and moves extra files (not in backup) out. Replaced and extra files are kept for ?restoreundo.
+
+        Returns:
+            dict, bool: 'checked', 'restored', 'removed' file counts, 'files' (restored paths) and 'added' (restored paths that
+                didn't exist before), or False if failed (live files left as they were).
+        """
+
+        src = backup['path']
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        if not self._clear_restore_paths(server_path):
+            return False
+
+        entries = self._get_backup_entries(backup)
+        folders = self._get_backup_folders(src) if backup['kind'] == 'world' else ['']
+        check_hash = config.get_config('restore_delta_check_hash')
+
+        live = {}
+        for folder in folders:
+            for dir_path, dir_names, file_names in os.walk(join(server_path, folder) if folder else server_path):
+                for name in file_names:
+                    live[os.path.relpath(join(dir_path, name), server_path).replace(os.sep, '/')] = os.stat(join(dir_path, name))
+
+        changed = []
+        for rel_path, entry in entries.items():
+            if progress: progress()  # Stops here if job cancelled.
+            stat = live.get(rel_path)
+            if stat is None or not self._is_restored_file(join(server_path, *rel_path.split('/')), stat, entry, check_hash):
+                changed.append(rel_path)
+        extra = [i for i in live if i not in entries]
+
+        os.makedirs(old_path)
+        if changed and not self._restore_backup_paths(src, stage_path, changed, progress):
+            return False
+
+        def get_paths(rel_path):
+            parts = rel_path.split('/')
+            return join(stage_path, *parts), join(server_path, *parts), join(old_path, *parts)
+
+        swaps = [get_paths(i) for i in changed] + [(None, *get_paths(i)[1:]) for i in extra]
+        if not self._swap_folders(swaps):
+            return False
+        if os.path.isdir(stage_path): file_utils.delete_dir(stage_path)  # Only empty folders left in it.
+        return {'checked': len(entries), 'restored': len(changed), 'removed': len(extra), 'files': changed,
+                'added': [i for i in changed if i not in live]}
+
+    async def delta_restore(self, backup: Dict) -> Union[Dict, bool]:
+        """
+        Restores only files that differ from backup (by size and modified time, see restore_delta_check_hash config) and
+        removes files backup doesn't have. Much faster than a full restore when little has changed, e.g. rolling back grief.
+        Server must be stopped. Replaced files are kept for ?restoreundo until server next starts.
+
+        Args:
+            backup dict: Catalog entry, from backup_catalog.get_backup().
+
+        Returns:
+            dict, bool: 'checked', 'restored', 'removed' file counts. False if failed or server running.
+        """
+
+        if await self.server_status():
+            lprint("ERROR: Server still running, not doing delta restore.")
+            return False
+
+        server_path = os.path.normpath(config.get_config('server_path'))
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        result = await self.jobs.run(f"{backup['kind'].capitalize()} delta restore: {backup['name']}", self._delta_restore_files,
+                                     backup, server_path, paths=[server_path, backup['path']], send_msg=self.send_msg)
+        if not result:
+            if os.path.isdir(stage_path): file_utils.trash_dir(stage_path)
+            self.empty_trash()
+            return False
+
+        file_utils.write_json(info_path, {'mode': backup['kind'], 'folders': [], 'backup': backup['path'], 'date': utils.get_datetime(),
+                                          'delta': {'files': result['files'], 'added': result['added']}})
+        self.empty_trash()
+        lprint(f"INFO: Delta restored {backup['kind']} from {backup['path']}: {result['restored']} of {result['checked']} files restored, {result['removed']} removed")
+        return result
+
+    def get_dimension_path(self, dimension: str, backup_files: List[str] = ()) -> Union[str, None]:
+        """
+        Gets dimension's folder, relative to server path. Checks both vanilla (world/DIM-1) and Bukkit style (world_nether/DIM-1) layouts.
+
+        Args:
+            dimension str: 'overworld', 'nether', 'end', or namespaced ID for datapack dimensions (e.g. 'mypack:mining').
+            backup_files list(()): Relative paths of backup's files, folder is also found if only backup has it.
+
+        Returns:
+            str, None: Folder ('/' separated) containing region/, entities/, poi/. None if not found.
+        """
+
+        world_folders = config.get_config('world_folders')
+        dimension = dimension.lower().replace('minecraft:', '')
+        if dimension in ('overworld', 'world'): candidates = world_folders[:1]
+        elif dimension in ('nether', 'the_nether'): candidates = [f'{i}/DIM-1' for i in world_folders]
+        elif dimension in ('end', 'the_end'): candidates = [f'{i}/DIM1' for i in world_folders]
+        elif ':' in dimension: candidates = [f"{world_folders[0]}/dimensions/{dimension.replace(':', '/')}"]
+        else: return None
+
+        server_path = config.get_config('server_path')
+        for folder in candidates:
+            if os.path.isdir(join(server_path, *folder.split('/'), 'region')) or any(i.startswith(f'{folder}/region/') for i in backup_files):
+                return folder
+        return None
+
+    def _chunk_restore_files(self, backup: Dict, server_path: str, dimension: str, chunks: List[Tuple[int, int]],
+                             progress: Callable = None) -> Union[Dict, bool]:
+        """
+        Job for chunk_restore(). Writes spliced region files into staging folder, then swaps them in. Replaced files are
+        kept for ?restoreundo, same as delta restore.
+
+        Returns:
+            dict, bool: 'chunks' (taken from backup), 'removed' (chunks backup doesn't have), 'dimension' folder, 'files' and
+                'added' (paths of swapped in files, ones that didn't exist before). False if failed (live files left as they were).
+        """
+
+        src = backup['path']
+        entries = self._get_backup_entries(backup)
+        if not (dimension_path := self.get_dimension_path(dimension, list(entries))):
+            lprint(f"ERROR: Dimension not found: {dimension}")
+            return False
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        if not self._clear_restore_paths(server_path):
+            return False
+        new_path, backup_path = join(stage_path, 'new'), join(stage_path, 'backup')
+
+        regions = {}  # Region file name: chunk indexes in it.
+        for chunk_x, chunk_z in chunks:
+            regions.setdefault(region_utils.get_region_name(chunk_x, chunk_z), []).append(region_utils.get_chunk_index(chunk_x, chunk_z))
+        # Block, entity, and point of interest data are each in their own region files, with the same layout.
+        region_paths = {f'{dimension_path}/{folder}/{name}': indexes for folder in ('region', 'entities', 'poi') for name, indexes in regions.items()}
+        # Chunks too big for region file are saved as c.x.z.mcc next to it.
+        external_paths = [f'{dimension_path}/{folder}/c.{x}.{z}.mcc' for folder in ('region', 'entities', 'poi') for x, z in chunks]
+
+        def live_file(rel_path):
+            return join(server_path, *rel_path.split('/'))
+
+        needed = [i for i in (*region_paths, *external_paths) if i in entries]
+        if needed:
+            if chunk_store.is_dedup_backup(src) or backup_archive.is_archive_backup(src):
+                if not self._restore_backup_paths(src, backup_path, needed, progress): return False
+            else: backup_path = src
+
+        os.makedirs(old_path)
+        taken = removed = 0
+        files, added = [], []
+        for rel_path, indexes in region_paths.items():
+            if progress: progress()  # Stops here if job cancelled.
+            live_path = live_file(rel_path) if os.path.isfile(live_file(rel_path)) else None
+            src_path = join(backup_path, *rel_path.split('/')) if rel_path in entries else None
+            if not live_path and not src_path: continue
+            if live_path:
+                with region_utils.open_region(live_path) as data:
+                    header = region_utils.read_header(data)
+                    live_count = sum(1 for i in indexes if header and header[0][i][0])
+            else: live_count = 0
+            os.makedirs(os.path.dirname(dest := join(new_path, *rel_path.split('/'))), exist_ok=True)
+            count = region_utils.splice_chunks(live_path, src_path, indexes, dest)
+            taken += count
+            removed += max(live_count - count, 0)
+            files.append(rel_path)
+            if not live_path: added.append(rel_path)
+            if progress: progress(os.path.getsize(dest), 1)
+
+        for rel_path in external_paths:
+            if rel_path in entries:
+                os.makedirs(os.path.dirname(dest := join(new_path, *rel_path.split('/'))), exist_ok=True)
+                copy_engine.copy_file(join(backup_path, *rel_path.split('/')), dest)
+                files.append(rel_path)
+                if not os.path.isfile(live_file(rel_path)): added.append(rel_path)
+            elif os.path.isfile(live_file(rel_path)): files.append(rel_path)
+
+        swaps = [(join(new_path, *i.split('/')) if os.path.isfile(join(new_path, *i.split('/'))) else None,
+                  live_file(i), join(old_path, *i.split('/'))) for i in files]
+        if not self._swap_folders(swaps):
+            return False
+        return {'chunks': taken, 'removed': removed, 'dimension': dimension_path, 'files': files, 'added': added}
+
+    async def chunk_restore(self, backup: Dict, dimension: str, x1: int, z1: int, x2: int, z2: int) -> Union[Dict, bool]:
+        """
+        Rolls back only chunks in area to how they are in backup, rest of the world isn't touched. Chunks the backup doesn't
+        have are removed, so they generate again. Server must be stopped, loaded chunks would be saved over the restored ones.
+        Replaced region files are kept for ?restoreundo until server next starts.
+
+        Args:
+            backup dict: Catalog entry, from backup_catalog.get_backup().
+            dimension str: 'overworld', 'nether', 'end', or datapack dimension ID, see get_dimension_path().
+            x1, z1, x2, z2 int: Block coordinates of opposite corners of area. Whole chunk columns are restored.
+
+        Returns:
+            dict, bool: 'chunks' restored and 'removed' counts, 'dimension' folder. False if failed, server running, or dimension not found.
+        """
+
+        if await self.server_status():
+            lprint("ERROR: Server still running, not doing chunk restore.")
+            return False
+
+        server_path = os.path.normpath(config.get_config('server_path'))
+        chunks = [(x, z) for x in range(min(x1, x2) >> 4, (max(x1, x2) >> 4) + 1) for z in range(min(z1, z2) >> 4, (max(z1, z2) >> 4) + 1)]
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        result = await self.jobs.run(f"Chunk restore: {len(chunks)} chunks from {backup['name']}", self._chunk_restore_files, backup, server_path,
+                                     dimension, chunks, paths=[server_path, backup['path']], send_msg=self.send_msg)
+        if os.path.isdir(stage_path): file_utils.trash_dir(stage_path)
+        self.empty_trash()
+        if not result:
+            return False
+
+        file_utils.write_json(info_path, {'mode': 'world', 'folders': [], 'backup': backup['path'], 'date': utils.get_datetime(),
+                                          'delta': {'files': result['files'], 'added': result['added']}})
+        lprint(f"INFO: Chunk restored {result['dimension']} {x1} {z1} to {x2} {z2} from {backup['path']}: {result['chunks']} chunks restored, {result['removed']} removed")
+        return result
+
+    def get_restore_undo_info(self) -> Union[Dict, None]:
+        """Gets info of last restore if it can still be undone, i.e. server hasn't been started since."""
+
+        stage_path, old_path, info_path = self.get_restore_paths()
+        if not os.path.isfile(info_path) or not os.path.isdir(old_path):
+            return None
+        try:
+            with open(info_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    async def undo_restore(self) -> bool:
+        """
+        Puts back files replaced by last restore. Server must be stopped.
+
+        Returns:
+            bool: If successful.
+        """
+
+        if not (info := self.get_restore_undo_info()) or await self.server_status():
+            return False
+
+        server_path = os.path.normpath(config.get_config('server_path'))
+        stage_path, old_path, info_path = self.get_restore_paths(server_path)
+        # Restored files go to staging folder to be deleted, old ones go back.
+        if 'delta' in info:
+            swaps = []
+            for dir_path, dir_names, file_names in os.walk(old_path):
+                for name in file_names:
+                    rel_path = os.path.relpath(join(dir_path, name), old_path)
+                    swaps.append((join(dir_path, name), join(server_path, rel_path), join(stage_path, rel_path)))
+            # Files that didn't exist before restore.
+            swaps += [(None, join(server_path, *i.split('/')), join(stage_path, *i.split('/'))) for i in info['delta']['added']]
+        elif info['folders'] == ['']:
+            swaps = [(old_path, server_path, stage_path)]
+        else: swaps = [(join(old_path, i), join(server_path, i), join(stage_path, i)) for i in info['folders'] if os.path.exists(join(old_path, i))]
+
+        if not self._swap_folders(swaps):
+            return False
+        os.remove(info_path)
+        if os.path.isdir(stage_path): file_utils.trash_dir(stage_path)
+        await self.clear_restore_trash()
+        lprint(f"INFO: Undid restore of {info['backup']}")
+        return True
 
+    async def clear_restore_trash(self) -> None:
+        """Deletes files replaced by last restore in background, called when server starts since they're not needed for ?restoreundo anymore."""
 
+        stage_path, old_path, info_path = self.get_restore_paths()
+        if os.path.isfile(info_path): os.remove(info_path)
+        if os.path.isdir(old_path) and file_utils.trash_dir(old_path):
+            self.empty_trash()
 
 backend = Backend()
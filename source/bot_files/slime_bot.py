@@ -9,13 +9,20 @@ from bot_files.slime_backend import backend
 from bot_files.slime_config import config
 from bot_files.slime_utils import lprint
 from bot_files.discord_components import comps
+from bot_files.metadata_client import metadata_client
 from run_bot import __version__
 
 intents = Intents.default()  # Default: discord.Intents.default()
 intents.message_content = True  # Default: True
 # Make sure command_prefix doesn't conflict with other bots.
 help_cmd = commands.DefaultHelpCommand(show_parameter_descriptions=False)
-bot = commands.Bot(command_prefix=config.get_config('command_prefix'), case_insensitive=config.get_config('case_insensitive'), intents=intents, help_command=help_cmd)
+
+class Slime_Bot(commands.Bot):
+    async def close(self) -> None:
+        await metadata_client.close()  # Shared aiohttp session, aiohttp warns about it on exit otherwise.
+        await super().close()
+
+bot = Slime_Bot(command_prefix=config.get_config('command_prefix'), case_insensitive=config.get_config('case_insensitive'), intents=intents, help_command=help_cmd)
 
 @bot.event
 async def on_ready():
@@ -67,6 +67,19 @@ class Config():
             # NOTE: Need to set 'enable-query=true' in server.properties for this to work. Tip: '?property enable-query true'
             'players_custom_status': True,
             'custom_status_interval': 1,
+            # Records CPU, memory, threads, open files and disk I/O of each server's process every X seconds, for ?perf command.
+            # Keeps last metrics_buffer_size samples per server, 17280 samples at 5s is 24h.
+            'enable_metrics_sampler': True,
+            'metrics_sample_interval': 5,
+            'metrics_buffer_size': 17280,
+            # Records TPS and MSPT of selected server every X seconds, for ?tps command. Uses 'tps' and 'mspt' commands on PaperMC,
+            # and "Can't keep up!" log lines for other servers. Sends alert to channel_id if TPS drops below or MSPT goes above threshold.
+            # Set threshold to 0 to disable that alert. Only one alert every tick_alert_cooldown seconds.
+            'enable_tick_monitor': True,
+            'tick_monitor_interval': 30,
+            'tps_alert_threshold': 15,
+            'mspt_alert_threshold': 50,
+            'tick_alert_cooldown': 600,
             # If unable to use server address to get ping latency.
             'use_custom_ping_address': False,
             'custom_ping_address': '1.1.1.1',
@@ -85,8 +98,63 @@ class Config():
             'bot_source_path': self.bot_source_path,
             'mc_path': self.mc_path,
             'servers_path': f'{self.mc_path}//servers',
+            # Downloaded server jars, named by checksum. Used by ?serverupdate so the same build is only downloaded once.
+            'jar_cache_path': f'{self.mc_path}//jar_cache',
+            # Cached version manifests and PaperMC build lists. Used without checking for updates for metadata_cache_ttl seconds,
+            # after that it's revalidated (only downloaded again if changed). Also used if sites can't be reached.
+            'metadata_cache_path': f'{self.mc_path}//metadata_cache',
+            'metadata_cache_ttl': 600,
+            # Public IP and server_address DNS lookup are refreshed in background at this interval (seconds). ?ip and ?status use cached values.
+            'address_refresh_interval': 600,
+            'public_ip_url': 'https://jsonip.com',  # Needs to reply with JSON containing 'ip' key.
+            # Seconds each ?status field (status, version, MoTD, ping, players) gets before it's shown as N/A.
+            'status_field_timeout': 4,
+            # Chunks for 'dedup' backup_format, shared by all servers so identical files are only stored once.
+            'backup_store_path': f'{self.mc_path}//backup_store',
+            # SQLite index of all servers' backups. Gives each backup an ID that doesn't change, and records size, files and checksums.
+            'backup_catalog_filepath': f'{self.mc_path}//backup_catalog.db',
+            # Seconds between checking servers' retention policies and pruning old backups.
+            'retention_check_interval': 3600,
+            # Deleted backups, worlds and servers are moved here (instant), then deleted in background at up to trash_delete_rate files per second.
+            'trash_path': f'{self.mc_path}//trash',
+            'trash_delete_rate': 2000,
+            # Backup, restore and trash jobs are limited to this many MB/s of disk reads/writes, 0 for no limit.
+            # Limit is halved each time selected server's MSPT (needs enable_tick_monitor) is over backup_io_mspt_backoff (or TPS under 19.5 without mspt command), 0 to not adapt.
+            'backup_io_limit': 0,
+            'backup_io_mspt_backoff': 45,
+            # Job threads only use disk when nothing else is (idle I/O priority), and get this CPU nice value. Linux only.
+            'backup_low_priority': True,
+            'backup_nice': 10,
+            # Uploads backups to S3 compatible storage (AWS S3, MinIO, Backblaze B2, etc) in background, needs boto3 module. Empty bucket to disable.
+            # Endpoint URL for non AWS storage, e.g. 'http://localhost:9000' for MinIO. Empty keys use boto3's defaults (environment, ~/.aws).
+            'offsite_endpoint_url': '',
+            'offsite_bucket': '',
+            'offsite_prefix': 'slime_backups',
+            'offsite_region': '',
+            'offsite_access_key': '',
+            'offsite_secret_key': '',
+            # Uploads at once. Files bigger than offsite_part_size (min 5MiB) are uploaded in parts.
+            'offsite_concurrency': 4,
+            'offsite_part_size': 16 * 1024 * 1024,
+            # Checks for backups not uploaded yet (e.g. failed or made while bot was off) every X seconds. New backups start uploading right away.
+            'offsite_check_interval': 1800,
+            # Threads used for hashing/copying files in backups and restores.
+            'backup_workers': 4,
+            # Backups and restores run as jobs (?jobs). Max jobs at once using the same disk, others wait in queue.
+            'max_io_jobs_per_disk': 1,
+            # Seconds between edits of a job's progress message.
+            'job_progress_interval': 5,
+            # 'archive' backup_format, archive is compressed in independent frames of this many bytes (uncompressed).
+            # Smaller frames make extracting single files faster, bigger ones compress a bit better.
+            'archive_frame_size': 16 * 1024 * 1024,
             'user_config_filepath': f'{self.bot_source_path}//user_config.json',
             'bot_log_filepath': f'{self.bot_source_path}//slime_bot.log',
+            # PID files of bot and servers it starts, so their processes can be found without scanning every process.
+            'pid_files_path': f'{self.bot_source_path}//pids',
+            # Recorded server startup durations, used by ?serverstarttimes and to adjust startup timeout.
+            'startup_history_filepath': f'{self.bot_source_path}//startup_history.json',
+            # Servers that had saving turned off for a backup, so bot can send save-on if it stopped before backup finished.
+            'saving_paused_filepath': f'{self.bot_source_path}//saving_paused.json',
 
             # Use cmd commands. E.g. 'start' command when starting a server only if platform.systems() == 'Windows'.
             'windows_compatibility': True if platform.system() == 'Windows' else False,
@@ -117,6 +185,8 @@ class Config():
                 'server_use_rcon': False,
                 'rcon_pass': 'pass',
                 'rcon_port': 25575,
+                # Max RCON connections open at once for bulk commands, like getting every online player's location.
+                'rcon_pool_size': 8,
 
                 # Use tmux to run/command Miencraft server.
                 'server_use_tmux': False,
@@ -137,10 +207,16 @@ class Config():
                 # Set a custom path where to launch server. Set to None to use default.
                 'server_launch_path': None,
 
-                # Second to wait before checking status for ?serverstart. e.g. PaperMC ~10s (w/ decent hardware), Vanilla ~20, Valhesia Volatile ~40-50s.
+                # ?serverstart finishes when server logs 'Done (X.XXXs)! For help' line or replies to a ping.
+                # Min seconds to wait for startup before giving up, actual wait adapts to recorded startup times. e.g. PaperMC ~10s (w/ decent hardware), Vanilla ~20, Valhesia Volatile ~40-50s.
                 'startup_wait_time': 30,
-                # How much time to give server after using 'save-all' command.
-                'save_world_wait_time': 3,
+                # Max seconds to wait for server startup. Also used if there's no recorded startup times yet.
+                'startup_timeout': 300,
+                # ?serverstop finishes when server process exits or server logs that all dimensions are saved.
+                'shutdown_timeout': 60,
+                # Backups send save-off and save-all flush, then wait for server to log 'Saved the game' before copying files.
+                # Max seconds to wait for that, backup is cancelled if server doesn't confirm. save-on is sent after either way.
+                'save_world_timeout': 60,
 
                 # Only send command after sending unique number to console to check status.
                 'check_before_command': True,
@@ -167,6 +243,29 @@ class Config():
                 'server_log_filepath': f'{self.mc_path}//servers//SELECTED_SERVER//logs//latest.log',
                 'server_properties_filepath': f'{self.mc_path}//servers//SELECTED_SERVER//server.properties',
                 'world_folders': ['world', 'world_nether', 'world_the_end'],
+                # 'copy' - Backup is full copy of folders.
+                # 'dedup' - Files saved in chunks by hash in backup_store_path, backup is just a manifest. Unchanged files take no extra space.
+                # 'region' - Same as dedup, but region files (.mca) are stored per Minecraft chunk, only chunks saved since last backup are read and stored.
+                # 'hardlink' - Same folder layout as copy, but files unchanged since previous backup are hard linked to it instead of copied.
+                # 'archive' - Compressed backup.tar.zst (or .tar.gz if zstandard module not installed), with index so single folders can be extracted quickly.
+                'backup_format': 'copy',
+                # For 'hardlink' format, compare file contents instead of size and modified time to decide if file changed. Slower.
+                'backup_hardlink_check_hash': False,
+                # For 'archive' format. zstd 1-22 (3 is good balance), gzip 1-9.
+                'backup_compression_level': 3,
+                # For ?worlddeltarestore, also compare hashes of files that have same size and modified time as backup.
+                # Only 'copy' and 'hardlink' backups have whole file hashes, others always compare size and modified time. Slower.
+                'restore_delta_check_hash': False,
+                # Checks each new backup can be read back right after it's made (same as ?backupverify), sends alert if not.
+                'backup_verify': False,
+                # Retention policy, checked every retention_check_interval (bot config). Backups it doesn't keep are deleted in background.
+                # Keeps newest backup of each of the last X hours/days/weeks that have a backup, 0 to not use that rule. All 0 to keep everything.
+                # World and server backups are counted separately. Newest backup is always kept.
+                'retention_hourly': 0,
+                'retention_daily': 0,
+                'retention_weekly': 0,
+                # Max bytes world backups (and server backups) can take up, oldest kept backups are deleted first. 0 for no limit.
+                'retention_max_bytes': 0,
 
                 # For '?links' command. Shows useful websites.
                 'useful_websites': {
@@ -176,7 +275,7 @@ class Config():
                     'Minecraft /gamerule Commands': 'https://minecraft.wiki/w/Commands/gamerule',
                 },
 
-                # Will be updated by get_public_ip() function in backend_functions.py on bot startup.
+                # Updated by address_resolver.py in background, only saved when IP changes.
                 'server_ip': 'localhost',
             }
         }
@@ -7,34 +7,38 @@ import io
 import os
 import csv
 import json
+import errno
 import math
 import time
 import socket
 import shutil
+import hashlib
 import random
 import asyncio
 import inspect
 import datetime
-import requests
+import threading
 import traceback
 
 from os import listdir
 from os.path import isdir, isfile, join, exists
 
-from typing import Union, Any, Tuple, List, Dict, Generator
+from typing import Union, Any, Tuple, List, Dict, Generator, Callable
 
 from bot_files.slime_config import config
-
-if config.get_config('use_pyenv'):
-    try:
-        import psutil, requests
-    except Exception as e:
+from bot_files.copy_engine import copy_engine
+
+try:
+    import psutil
+except Exception as e:
+    # If using pyenv, run_bot.py may be running with system python before relaunching with venv python.
+    psutil = None
+    if not config.get_config('use_pyenv'):
         print("ERROR: Missing modules")
         print(e)
-    else: import psutil, requests
 
 slime_proc = slime_pid = None  # If using nohup to run bot in background.
-slime_proc_name, slime_proc_cmdline = 'python3',  'slime_bot.py'  # Needed to find correct process if multiple python process exists.
+slime_proc_name, slime_proc_cmdline = 'python',  '_startbot'  # Needed to find correct process if multiple python process exists.
 
 def lprint(arg1: Union[Any, str], arg2:str = None) -> None:
     """
@@ -65,6 +69,9 @@ def lprint(arg1: Union[Any, str], arg2:str = None) -> None:
 
 
 class File_Utils:
+    external_trash_file = '.external_trash.json'  # In trash_path, lists trashed folders that are somewhere else.
+    trash_lock = threading.Lock()
+
     def test_file(self, file_path: str, check_writable: bool = False) -> bool:
         """
         Test if a file exists, if it's readable, and if it's writable.
@@ -177,6 +184,53 @@ class File_Utils:
                         yield _lines[index]
                         lines_yielded += 1
 
+    def get_file_position(self, file_path: str) -> Tuple[int, int]:
+        """
+        Gets inode and size of file, used with read_new_lines() to only read lines added afterwards.
+
+        Args:
+            file_path str: File to check.
+
+        Returns:
+            tuple: Inode and size of file. (0, 0) if file doesn't exist.
+        """
+
+        try: stat = os.stat(file_path)
+        except OSError: return 0, 0
+        return stat.st_ino, stat.st_size
+
+    def read_new_lines(self, file_path: str, position: Tuple[int, int]) -> Tuple[List[str], Tuple[int, int]]:
+        """
+        Reads lines appended to file since position. Starts from top if the file was rotated or truncated,
+        e.g. server creates a new latest.log on startup.
+
+        Args:
+            file_path str: File to read.
+            position tuple: Inode and byte offset from get_file_position() or last read_new_lines() call.
+
+        Returns:
+            tuple: New complete lines, and position to use for next call.
+        """
+
+        inode, offset = position
+        current_inode, size = self.get_file_position(file_path)
+        if not current_inode:
+            return [], position
+        if current_inode != inode or size < offset:
+            offset = 0
+
+        try:
+            with open(file_path, 'rb') as file:
+                file.seek(offset)
+                data = file.read()
+        except OSError:
+            return [], position
+
+        # Leaves incomplete last line to be read next time.
+        data = data[:data.rfind(b'\n') + 1]
+        lines = data.decode('utf-8', errors='ignore').splitlines()
+        return lines, (current_inode, offset + len(data))
+
     def read_json(self, file_path: str) -> Union[List[Dict[str, Any]], bool]:
         """
         Returns list of data from .json files.
@@ -260,30 +314,6 @@ class File_Utils:
 
         return True
 
-    def get_from_index(self, path: str, index: int, mode: str) -> Union[str, bool]:
-        """
-        Get server or world backup folder name from passed in index number
-
-        Args:
-            path str: Path to search through.
-            index int: Select specific folder/file by index, get index from commands like ?worldbackupslist, ?serverbackupslist
-            mode str: Only get files or folders.
-
-        Returns:
-                str: Path of selected.
-        """
-
-        items = ['placeholder']  # Listed items in Discord (select menus, embeds) start at 1 (for user convients). But python is 0, soooo, yeah. need this.
-        for i in reversed(sorted(listdir(path))):
-            if 'f' in mode and isfile(join(path, i)):
-                items.append(i)
-            elif 'd' in mode and isdir(join(path, i)):
-                items.append(i)
-            else: continue
-        try:
-            return f'{path}/{items[index]}'
-        except: return False
-
     # TODO Test (everything)
     def enum_dirs_for_discord(self, path: str, mode: str):
         """
@@ -313,10 +343,6 @@ class File_Utils:
                 if 's' in mode:
                     if item not in config.servers: continue
                     component_data[-1] = config.servers[item]['server_description']
-                # For world/server backup mode in control panel, need to be return the index of selected.
-                if 'b' in mode:
-                    component_data[1] = index
-
                 return_list.append(component_data)  # Last 2 list items is for new_selection.
                 index += 1
             else: continue
@@ -341,6 +367,93 @@ class File_Utils:
 
         return True
 
+    def _get_external_trash(self) -> List[str]:
+        """Trashed folders that couldn't be moved to trash_path (on different filesystem), renamed in place instead."""
+
+        file_path = join(config.get_config('trash_path'), self.external_trash_file)
+        try:
+            with open(file_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def _set_external_trash(self, paths: List[str]) -> None:
+        os.makedirs(config.get_config('trash_path'), exist_ok=True)
+        with open(join(config.get_config('trash_path'), self.external_trash_file), 'w') as file:
+            json.dump(paths, file)
+
+    def trash_dir(self, path: str) -> Union[str, bool]:
+        """
+        Moves folder to trash with a rename, so it's gone right away. Trash is emptied in background with empty_trash().
+        Folders on a different filesystem than trash_path are renamed to a hidden name next to where they are instead.
+
+        Args:
+            path str: Folder to delete.
+
+        Returns:
+            str, bool: Where folder is now, False if failed.
+        """
+
+        name = f"{time.time_ns()}_{os.path.basename(os.path.normpath(path))}"
+        trash_path = join(config.get_config('trash_path'), name)
+        try:
+            os.makedirs(config.get_config('trash_path'), exist_ok=True)
+            try: os.rename(path, trash_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV: raise
+                trash_path = join(os.path.dirname(os.path.normpath(path)), f".{name}.trash")
+                with self.trash_lock:
+                    self._set_external_trash(self._get_external_trash() + [trash_path])
+                os.rename(path, trash_path)
+        except:
+            lprint(f"ERROR: Issue moving folder to trash: {path}")
+            traceback.print_exc()
+            return False
+        return trash_path
+
+    def empty_trash(self, progress: Callable = None) -> int:
+        """
+        Deletes everything in trash, one file at a time at up to trash_delete_rate files per second so it doesn't hog the disk.
+        Blocking, run as job with backend.empty_trash().
+
+        Args:
+            progress Callable(None): Called with (bytes, files) after each file, e.g. Job.progress.
+
+        Returns:
+            int: Files deleted.
+        """
+
+        trash_root = config.get_config('trash_path')
+        paths = [join(trash_root, i) for i in os.listdir(trash_root) if i != self.external_trash_file] if isdir(trash_root) else []
+        external = self._get_external_trash()
+        rate = config.get_config('trash_delete_rate')
+        deleted, start_time = 0, time.monotonic()
+
+        for path in paths + external:
+            if isdir(path) and not os.path.islink(path):
+                for dir_path, dir_names, file_names in os.walk(path, topdown=False):
+                    for name in file_names + [i for i in dir_names if os.path.islink(join(dir_path, i))]:
+                        file_path = join(dir_path, name)
+                        size = os.lstat(file_path).st_size
+                        os.unlink(file_path)
+                        deleted += 1
+                        if progress: progress(size, 1)
+                        # Paces deletes to rate per second.
+                        if rate and (ahead := deleted / rate - (time.monotonic() - start_time)) > 0:
+                            time.sleep(ahead)
+                    for name in dir_names:
+                        if not os.path.islink(join(dir_path, name)): os.rmdir(join(dir_path, name))
+                os.rmdir(path)
+            elif os.path.lexists(path): os.unlink(path)
+
+            if path in external:
+                with self.trash_lock:
+                    self._set_external_trash([i for i in self._get_external_trash() if i != path])
+
+        if paths or external:
+            lprint(f"INFO: Emptied trash, {len(paths) + len(external)} folders ({deleted} files)")
+        return deleted
+
     def new_dir(self, path: str) -> Union[bool, None]:
         """
         Create a new world or server backup, by copying and renaming folder.
@@ -364,13 +477,14 @@ class File_Utils:
         lprint(f"INFO: New folder: {path}")
         return True
 
-    def copy_dir(self, path: str, new_path: str) -> bool:
+    def copy_dir(self, path: str, new_path: str, progress: Callable = None) -> bool:
         """
-        Copy directory to path.
+        Copy directory to path, using multiple threads and fastest copy method filesystem supports (see copy_engine.py).
 
         Args:
             path str: Source path.
             new_path str: Destination path.
+            progress Callable(None): Called with (bytes, files) after each file, e.g. Job.progress.
 
         Returns:
             bool: If successful.
@@ -381,17 +495,89 @@ class File_Utils:
             return False
 
         try:
-            shutil.copytree(path, new_path)
+            stats = copy_engine.copy_tree(path, new_path, progress)
         except:
             lprint(f"ERROR: Issue copying folder: {path} > {new_path}")
             traceback.print_exc()
             return False
-        lprint(f"INFO: Copied folder: {path} > {new_path}")
+        lprint(f"INFO: Copied folder: {path} > {new_path} {self._format_copy_stats(stats)}")
         return True
 
+    def _format_copy_stats(self, stats: Dict) -> str:
+        """E.g. '(1520 files, 1.2GB, 3.1s, 396.8MB/s, reflink: 1520)'."""
+
+        methods = ', '.join(f"{k}: {v}" for k, v in stats['methods'].most_common())
+        return f"({stats['files']} files, {utils.format_bytes(stats['bytes'])}, {stats['seconds']:.1f}s, " \
+               f"{utils.format_bytes(stats['bytes_per_second'])}/s{', ' + methods if methods else ''})"
+
+    def hash_file(self, file_path: str) -> str:
+        """Get SHA-256 hex digest of file, read in 1 MiB blocks."""
+
+        file_hash = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            while data := file.read(1024 * 1024):
+                file_hash.update(data)
+        return file_hash.hexdigest()
+
+    def link_copy_dir(self, path: str, new_path: str, link_dest: str = None, check_hash: bool = False, progress: Callable = None) -> bool:
+        """
+        Copy directory, but files unchanged since link_dest are hard linked instead of copied (like rsync --link-dest).
+        Linked files share disk space with link_dest, so should only be used for backups that won't be edited.
+
+        Args:
+            path str: Source path.
+            new_path str: Destination path.
+            link_dest str(None): Previous copy of path to link unchanged files from. Copies everything if None or doesn't exist.
+            check_hash bool(False): Compare file contents instead of size and modified time.
+            progress Callable(None): Called with (bytes copied, files) after each file, e.g. Job.progress.
+
+        Returns:
+            bool: If successful.
+        """
+
+        if not self.test_dir(path):
+            lprint(f"ERROR: Could not copy folder, does not exist: {path}")
+            return False
+        if not link_dest or not isdir(link_dest):
+            return self.copy_dir(path, new_path, progress)
+
+        def should_link(src, src_stat, old):
+            try: old_stat = os.stat(old)
+            except OSError: return False  # Not in link_dest, copies instead.
+            return src_stat.st_size == old_stat.st_size and \
+                (self.hash_file(src) == self.hash_file(old) if check_hash else src_stat.st_mtime_ns == old_stat.st_mtime_ns)
+
+        try:
+            # Files that can't be linked (e.g. different filesystem) are copied instead.
+            stats = copy_engine.copy_tree(path, new_path, progress, link_dest, should_link)
+        except:
+            lprint(f"ERROR: Issue copying folder: {path} > {new_path}")
+            traceback.print_exc()
+            return False
+        lprint(f"INFO: Copied folder: {path} > {new_path} {self._format_copy_stats(stats)}, linked from {link_dest}")
+        return True
+
+    def get_latest_dir(self, path: str, contains: str = '') -> Union[str, None]:
+        """
+        Get newest backup folder (names start with date), optionally only ones containing a certain file or folder.
+
+        Args:
+            path str: world_backups_path or server_backups_path.
+            contains str(''): File or folder that has to be in it.
+
+        Returns:
+            str, None: Path of backup folder.
+        """
+
+        if not isdir(path): return None
+        for name in sorted(listdir(path), reverse=True):
+            if exists(join(path, name, contains)):
+                return join(path, name)
+        return None
+
     def move_dir(self, path: str, new_path: str) -> bool:
         """
-        Copies then delete original.
+        Move directory. Renames if on same filesystem, else copies then deletes original.
 
         Args:
             path: Directory to move.
@@ -401,9 +587,17 @@ class File_Utils:
             bool: If successfully copied and deleted original.
         """
 
-        if not self.copy_dir(path, new_path) and not self.delete_dir(path):
-            return False
-        return True
+        # Same filesystem, just a rename.
+        try:
+            os.rename(path, new_path)
+            return True
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                lprint(f"ERROR: Issue moving folder: {path} > {new_path}")
+                traceback.print_exc()
+                return False
+
+        return self.copy_dir(path, new_path) and self.delete_dir(path)
 
     def setup_directories(self) -> None:
         """Create necessary directories, servers, world_backups, server_backups."""
@@ -417,27 +611,156 @@ class File_Utils:
 
 
 class Proc_Utils:
+    """
+    Finds bot and server processes. The bot and servers it starts write PID files (with process create time),
+    so lookups don't need to scan every process on the host. Process handles are cached, psutil's is_running()
+    also compares create time so a reused PID won't be mistaken for the original process.
+    """
+
+    def __init__(self):
+        self.procs = {}  # PID file name: psutil.Process
+
+    def _pid_filepath(self, name: str) -> str:
+        return join(config.get_config('pid_files_path'), f"{name}.pid")
+
+    def write_pid_file(self, name: str, pid: int) -> bool:
+        """
+        Write PID file with process create time, and cache process handle.
+
+        Args:
+            name str: Name of PID file, e.g. 'slime_bot', 'server_papermc'.
+            pid int: Process ID.
+
+        Returns:
+            bool: If successful.
+        """
+
+        try:
+            proc = psutil.Process(pid)
+            os.makedirs(config.get_config('pid_files_path'), exist_ok=True)
+            with open(self._pid_filepath(name), 'w') as file:
+                json.dump({'pid': pid, 'create_time': proc.create_time()}, file)
+        except (psutil.Error, OSError):
+            lprint(f"ERROR: Problem writing PID file: {name}")
+            return False
+
+        self.procs[name] = proc
+        return True
+
+    def get_pid_proc(self, name: str) -> Union[Any, None]:
+        """
+        Get process from cache or PID file. Checks create time so a reused PID is not returned.
+
+        Args:
+            name str: Name of PID file.
+
+        Returns:
+            psutil.Process, None: Process if still running.
+        """
+
+        if (proc := self.procs.get(name)) and proc.is_running():
+            return proc
+        self.procs.pop(name, None)
+
+        if not isfile(file_path := self._pid_filepath(name)):
+            return None
+        try:
+            with open(file_path) as file:
+                data = json.load(file)
+            proc = psutil.Process(data['pid'])
+            if abs(proc.create_time() - data['create_time']) > 1:
+                return None  # PID was reused by another process.
+        except (OSError, ValueError, KeyError, TypeError, psutil.Error):
+            return None
+
+        self.procs[name] = proc
+        return proc
+
     def get_proc(self, proc_name, proc_cmdline=None):
-        """Returns a process by matching name and argument."""
+        """
+        Returns a process by matching name and argument. Scans all processes, use get_pid_proc() when possible.
+        Only gets cmdline of processes with matching name.
+        """
 
-        for proc in psutil.process_iter():
-            if proc.name() == proc_name:
-                # Narrow down process by its arguments. E.g. python3 could have multiple processes.
-                if proc_cmdline:
+        for proc in psutil.process_iter(attrs=['name']):
+            if proc_name not in (proc.info['name'] or '') or proc.pid == os.getpid():
+                continue
+            # Narrow down process by its arguments. E.g. python3 could have multiple processes.
+            if proc_cmdline:
+                try:
                     if any(proc_cmdline in i for i in proc.cmdline()):
                         return proc
-                else: return proc
+                except psutil.Error: continue
+            else: return proc
+
+    def get_slime_proc(self):
+        """Get bot process, from PID file or by scanning processes."""
+
+        if proc := self.get_pid_proc('slime_bot'):
+            return proc
+        if proc := self.get_proc(slime_proc_name, slime_proc_cmdline):
+            self.write_pid_file('slime_bot', proc.pid)
+        return proc
+
+    def find_server_procs(self, servers: Dict[str, Dict]) -> Dict[str, Any]:
+        """
+        Scans processes once for all given servers, and writes PID files for the ones found.
+        Matches java processes by server_launch_command and working directory, since servers often share the same launch command.
+
+        Args:
+            servers dict: Server name and its configs.
+
+        Returns:
+            dict: Server name and psutil.Process.
+        """
+
+        def normalize_path(path): return os.path.normpath(re.sub(r'/+', '/', str(path)))
+
+        targets = {}
+        for server_name, server_configs in servers.items():
+            launch_args = server_configs['server_launch_command'].split()[1:]  # Skips executable, could be a full path.
+            launch_path = normalize_path(server_configs['server_launch_path'] or server_configs['server_path'])
+            targets[server_name] = (launch_args, launch_path)
+
+        found = {}
+        for proc in psutil.process_iter(attrs=['name']):
+            if 'java' not in (proc.info['name'] or '').lower():
+                continue
+            try: cmdline, cwd = proc.cmdline(), normalize_path(proc.cwd())
+            except psutil.Error: continue
+            for server_name, (launch_args, launch_path) in targets.items():
+                if server_name not in found and cmdline[1:] == launch_args and cwd == launch_path:
+                    found[server_name] = proc
+                    self.write_pid_file(f"server_{server_name}", proc.pid)
+
+        return found
+
+    def get_server_proc(self, server_name: str) -> Union[Any, None]:
+        """
+        Get server's process, from PID file or by scanning processes.
+
+        Args:
+            server_name str: Server name.
+
+        Returns:
+            psutil.Process, None: Server process if running.
+        """
+
+        if proc := self.get_pid_proc(f"server_{server_name}"):
+            return proc
+        if server_configs := config.servers.get(server_name):
+            return self.find_server_procs({server_name: server_configs}).get(server_name)
 
     def status_slime_proc(self):
         """Get bot process name and pid."""
 
-        if proc := self.get_proc(slime_proc_name, slime_proc_cmdline):
+        if proc := self.get_slime_proc():
             lprint(f"INFO: Process info: {proc.name()}, {proc.pid}")
 
     def kill_slime_proc(self):
         """Kills bot process."""
 
-        if proc := self.get_proc(slime_proc_name, slime_proc_cmdline):
+        if proc := self.get_slime_proc():
             proc.kill()
             lprint("INFO: Bot process killed")
         else:
@@ -556,6 +879,85 @@ class Utils:
             except:
                 return False
 
+    def parse_coords_output(self, output: List[str]) -> Dict[str, str]:
+        """
+        Extracts player names and coordinates from 'data get entity <player> Pos' output lines.
+        E.g. '[14:38:26] [Server thread/INFO]: R3diculous has the following entity data: [-64.0d, 65.0d, 16.0d]'
+
+        Args:
+            output list: Command output lines.
+
+        Returns:
+            dict: Lowercase player name as key and coordinates as value, e.g. {'r3diculous': '-64.0, 65.0, 16.0'}.
+        """
+
+        coords = {}
+        for line in output:
+            if match := re.search(r'(\S+) has the following entity data: \[([^\]]*)\]', self.remove_ansi(str(line))):
+                player = match.group(1).lower()
+                # Keeps first match, log is read bottom up so that's the most recent one.
+                if player not in coords:
+                    coords[player] = match.group(2).replace('d', '').strip()
+        return coords
+
+    def parse_tps_output(self, output: List[str]) -> Union[float, None]:
+        """
+        Extracts 1 minute TPS from Paper's 'tps' command output.
+        E.g. '[Server thread/INFO]: TPS from last 1m, 5m, 15m: 19.8, *20.0, 20.0'
+
+        Args:
+            output list: Command output lines.
+
+        Returns:
+            float, None: TPS, or None if not found.
+        """
+
+        text = re.sub(r'§.', '', self.remove_ansi(' '.join(str(i) for i in output or [])))
+        if match := re.search(r'TPS from last [^:]*:\s*\*?([\d.]+)', text):
+            return float(match.group(1))
+        return None
+
+    def parse_mspt_output(self, output: List[str]) -> Union[float, None]:
+        """
+        Extracts average tick time of last 5s from Paper's 'mspt' command output.
+        E.g. 'Server tick times (avg/min/max) from last 5s, 10s, 1m:' then '◴ 1.2/0.9/3.4, 1.3/0.8/4.0, 1.5/0.8/10.2'
+        Lines can be in any order, read_server_log() returns them newest first.
+
+        >>> utils.parse_mspt_output(['◴ 1.2/0.9/3.4, 1.3/0.8/4.0, 1.5/0.8/10.2', 'Server tick times (avg/min/max) from last 5s, 10s, 1m:'])
+        1.2
+
+        Args:
+            output list: Command output lines.
+
+        Returns:
+            float, None: Average MSPT, or None if not found.
+        """
+
+        for line in (output or []):
+            for text in str(line).splitlines():
+                text = re.sub(r'§.', '', self.remove_ansi(text))
+                if 'Server tick times' in text: continue
+                # Decimals only, so dates in log prefixes (e.g. 01/02/2024) don't match.
+                if match := re.search(r'(\d+\.\d+)/(\d+\.\d+)/(\d+\.\d+)', text):
+                    return float(match.group(1))
+        return None
+
+    def parse_lag_line(self, line: str) -> Union[Tuple[int, int], None]:
+        """
+        Extracts lag from server's "Can't keep up!" log line.
+        E.g. "Can't keep up! Is the server overloaded? Running 2345ms or 46 ticks behind"
+
+        Args:
+            line str: Log line.
+
+        Returns:
+            tuple, None: Milliseconds and ticks behind, or None if not a lag line.
+        """
+
+        if match := re.search(r"Can't keep up!.*?Running (\d+)ms or (\d+) ticks behind", line):
+            return int(match.group(1)), int(match.group(2))
+        return None
+
     def parse_version_output(self, output: str) -> Union[str, bool]:
         """
 
@@ -665,6 +1067,40 @@ class Utils:
 
         return datetime.datetime.now().strftime('%Y-%m-%d %H-%M')
 
+    def parse_time_window(self, text: str, default: int = 3600) -> int:
+        """
+        Converts time window like '30s', '5m', '1h', '7d' into seconds. Number without a unit is minutes.
+
+        Args:
+            text str: Time window.
+            default int(3600): Returned if text can't be parsed.
+
+        Returns:
+            int: Seconds.
+        """
+
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+        if match := re.fullmatch(r'(\d+)\s*([smhd]?)', str(text).strip().lower()):
+            return int(match.group(1)) * units[match.group(2) or 'm']
+        return default
+
+    def format_bytes(self, num_bytes: float) -> str:
+        """
+        Formats byte count into human readable size, e.g. 1536 > '1.5KB'.
+
+        Args:
+            num_bytes float: Number of bytes.
+
+        Returns:
+            str: Formatted size.
+        """
+
+        for unit in ['B', 'KB', 'MB', 'GB']:
+            if abs(num_bytes) < 1024:
+                return f"{num_bytes:.1f}{unit}"
+            num_bytes /= 1024
+        return f"{num_bytes:.1f}TB"
+
     def remove_ansi(self, text: str) -> str:
         """
         Removes ANSI escape characters.
@@ -698,19 +1134,23 @@ class Utils:
                 result += ' ' * indent + f'{key}: {value}\n'
         return result
 
-    def get_public_ip(self) -> Union[str, None]:
+    async def run_with_timeout(self, awaitable, timeout: float, default: Any = None) -> Any:
         """
-        Returns your public IP address.
+        Awaits with a deadline, for when a slow or failing result shouldn't hold up everything else.
+
+        Args:
+            awaitable: Coroutine or task. Wrap shared tasks in asyncio.shield() so a timeout doesn't cancel them.
+            timeout float: Seconds to wait.
+            default Any(None): Returned if timed out or errored.
 
         Returns:
-            str, bool: IP address if fetched, else False.
+            Any: Result or default.
         """
 
         try:
-            server_ip = json.loads(requests.get('http://jsonip.com').text)['ip']
-            config.set_config('server_ip', server_ip)
-        except: return None
-        return server_ip
+            return await asyncio.wait_for(awaitable, timeout)
+        except Exception:
+            return default
 
     async def ping_address(self, address: str) -> Union[str, bool]:
         """
@@ -1,17 +1,57 @@
+import os
 import asyncio
 from os.path import join
+from typing import Union, Dict, List
 
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 
 from bot_files.slime_backend import backend
 from bot_files.slime_config import config
 from bot_files.slime_utils import lprint, file_utils, utils
 from bot_files.discord_components import comps
+from bot_files.backup_catalog import backup_catalog
+from bot_files.backup_retention import backup_retention
+from bot_files.backup_offsite import backup_offsite
 
 
 start_button = [['Start Server', 'serverstart', '\U0001F680']]
 
+async def get_catalog_backup(backup_id, kind: str, usage: str) -> Union[Dict, None]:
+    """
+    Gets selected server's backup from catalog, sends usage or error message if not found.
+
+    Args:
+        backup_id: ID from ?worldbackups or ?serverbackups, or 'bmode' to use control panel selection.
+        kind str: 'world' or 'server', None for either.
+        usage str: Message to send if ID isn't a number.
+
+    Returns:
+        dict, None: Catalog entry.
+    """
+
+    if backup_id == 'bmode':  # If this command triggered from a bmode.
+        backup_id = comps.get_data('second_selected')
+    try: backup_id = int(backup_id)
+    except:
+        await backend.send_msg(usage)
+        return None
+
+    if not (backup := backup_catalog.get_backup(backup_id, config.server_name, kind)):
+        await backend.send_msg(f"**Error:** No {kind + ' ' if kind else ''}backup with ID {backup_id} for `{config.server_name}`.")
+    return backup
+
+def backups_embed(backups: List[Dict], title: str) -> discord.Embed:
+    """Embed listing backups with ID, name, size if known, and if last ?backupverify passed."""
+
+    embed = discord.Embed(title=title)
+    for backup in backups:
+        size = f" ({utils.format_bytes(backup['size'])}, {backup['files']} files)" if backup['size'] is not None else ''
+        if verification := backup_catalog.get_verification(backup['id']):
+            size += ' \u2705' if verification['ok'] else ' \u274C'
+        embed.add_field(name=f"ID {backup['id']}{size}", value=f"`{backup['name']}`", inline=False)
+    return embed
+
 class World_Backups(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -31,17 +71,14 @@ class World_Backups(commands.Cog):
             ?saves 15
         """
 
-        worlds = file_utils.enum_dirs_for_discord(config.get_config('world_backups_path'), 'd')
+        worlds = backup_catalog.get_backups(config.server_name, 'world', amount)
         lprint(ctx, f"Fetched {amount} world saves")
-        if worlds is False:
+        if not worlds:
             await backend.send_msg("No world backups found.")
             return
 
-        embed = discord.Embed(title='World Backups :floppy_disk:')
-        for backup in worlds[-amount:]:
-            embed.add_field(name=backup[3], value=f"`{backup[0]}`", inline=False)
-        await backend.send_msg(embed=embed)
-        await backend.send_msg("Use `?worldrestore <index>` to restore world save.")
+        await backend.send_msg(embed=backups_embed(worlds, 'World Backups :floppy_disk:'))
+        await backend.send_msg("Use `?worldrestore <id>` to restore world save.")
         await backend.send_msg("**WARNING:** Restore will overwrite current world. Make a backup using `?backup <codename>`.")
 
     @commands.command(aliases=['backupworld', 'newworldbackup', 'worldbackupnew', 'wbn'])
@@ -65,10 +102,6 @@ class World_Backups(commands.Cog):
         await backend.send_msg("***Creating World Backup...*** :new::floppy_disk:")
         lprint(ctx, f"INFO: Creating world backup: {name}")
 
-        # Gives server some time to save world.
-        await backend.send_command(f"save-all")
-        await asyncio.sleep(config.get_config('save_world_wait_time'))
-
         if new_backup := await backend.new_backup(name, mode='world'):
             await backend.send_msg(f"**New World Backup:** `{new_backup}`")
             await ctx.invoke(self.bot.get_command('worldbackupslist'))
@@ -90,12 +123,12 @@ class World_Backups(commands.Cog):
         await ctx.invoke(self.bot.get_command('worldbackup'), '')
 
     @commands.command(aliases=['restoreworld', 'worldbackuprestore', 'wbr'])
-    async def worldrestore(self, ctx, index='', now=''):
+    async def worldrestore(self, ctx, backup_id='', now=''):
         """
         Restore a world backup.
 
         Args:
-            index: Get index with ?worldbackups command.
+            backup_id: Get ID with ?worldbackups command.
             now optional: Skip 15s wait to stop server. E.g. ?restore 0 now
 
         Usage:
@@ -105,60 +138,130 @@ class World_Backups(commands.Cog):
         Note: This will not make a backup beforehand, suggest doing so with ?backup command.
         """
 
-        if index == 'bmode':  # If this command triggered from a bmode.
-            index = comps.get_data('second_selected')
-        try: index = int(index)
-        except:
-            await backend.send_msg("Usage: `?worldrestore <index> [now]`\nExample: `?worldrestore 0 now`")
+        if not (backup := await get_catalog_backup(backup_id, 'world', "Usage: `?worldrestore <id> [now]`\nExample: `?worldrestore 12 now`")):
             return
-        if not index: return
 
-        fetched_restore = file_utils.get_from_index(config.get_config('world_backups_path'), index, 'd')
+        fetched_restore = backup['path']
         await backend.send_msg("***Restoring World...*** :floppy_disk::leftwards_arrow_with_hook:")
         lprint(ctx, f"INFO: Restoring world from backup: {fetched_restore}")
+        # Backup is copied next to server folder while server is still running, current world is untouched if this fails.
+        if not (folders := await backend.stage_restore(fetched_restore, 'world')):
+            await backend.send_msg(f"**Error:** Issue restoring world, current world not changed: {fetched_restore}")
+            lprint(ctx, "ERROR: World restore: " + fetched_restore)
+            return
+
         if await backend.send_command(f"say ---WARNING--- Initiating jump to save point in 5s! : {fetched_restore}"):
             await asyncio.sleep(5)
             await ctx.invoke(self.bot.get_command('serverstop'), now=now)
 
-        response = await backend.restore_backup(fetched_restore, 'world')
-        if response is None:
-            await backend.send_msg(f"**Error:** Some world folders were restored, but some were not. Check bot log for more.")
-        elif not response:
-            await backend.send_msg(f"**Error:** Issue restoring world: {fetched_restore}")
-            lprint(ctx, "ERROR: World restore: " + fetched_restore)
+        if not await backend.swap_restore(fetched_restore, 'world', folders):
+            await backend.send_msg(f"**Error:** Could not swap in restored world (is server stopped?), current world not changed: {fetched_restore}")
+            lprint(ctx, "ERROR: World restore swap: " + fetched_restore)
             return
 
         await backend.send_msg(f"**Restored World:** `{fetched_restore}`")
+        await backend.send_msg("Use `?restoreundo` to put back previous world, only until server is started.")
         lprint(ctx, "World restored: " + fetched_restore)
         await asyncio.sleep(5)
         await backend.send_msg("Start server with `?start` or click bmode", view=comps.new_buttons(start_button))
 
+    @commands.command(aliases=['deltarestore', 'worldrestoredelta', 'wdr'])
+    async def worlddeltarestore(self, ctx, backup_id='', now=''):
+        """
+        Restore world backup, but only files that changed since backup. Files backup doesn't have are removed.
+        Much faster than ?worldrestore when only part of the world changed, e.g. rolling back grief.
+
+        Args:
+            backup_id: Get ID with ?worldbackups command.
+            now optional: Skip 15s wait to stop server.
+
+        Usage:
+            ?worlddeltarestore 3
+            ?wdr 5 now
+        """
+
+        if not (backup := await get_catalog_backup(backup_id, 'world', "Usage: `?worlddeltarestore <id> [now]`\nExample: `?wdr 12 now`")):
+            return
+
+        fetched_restore = backup['path']
+        lprint(ctx, f"INFO: Delta restoring world from backup: {fetched_restore}")
+        # Files are compared with backup after server stops, so nothing changes in between.
+        if await backend.send_command(f"say ---WARNING--- Initiating jump to save point in 5s! : {fetched_restore}"):
+            await asyncio.sleep(5)
+            await ctx.invoke(self.bot.get_command('serverstop'), now=now)
+
+        await backend.send_msg("***Restoring Changed World Files...*** :floppy_disk::leftwards_arrow_with_hook:")
+        if not (result := await backend.delta_restore(backup)):
+            await backend.send_msg(f"**Error:** Issue restoring world (is server stopped?), current world not changed: {fetched_restore}")
+            lprint(ctx, "ERROR: World delta restore: " + fetched_restore)
+            return
+
+        await backend.send_msg(f"**Restored World:** `{fetched_restore}`\n{result['restored']} of {result['checked']} files restored, {result['removed']} removed.")
+        await backend.send_msg("Use `?restoreundo` to put back previous world, only until server is started.")
+        lprint(ctx, "World delta restored: " + fetched_restore)
+        await backend.send_msg("Start server with `?start` or click bmode", view=comps.new_buttons(start_button))
+
+    @commands.command(aliases=['chunkrollback', 'arearestore', 'wcr'])
+    async def chunkrestore(self, ctx, backup_id='', dimension='', x1='', z1='', x2='', z2='', now=''):
+        """
+        Roll back only an area of the world to how it is in a backup, e.g. to undo grief. Rest of the world isn't changed.
+
+        Args:
+            backup_id: Get ID with ?worldbackups command.
+            dimension: overworld, nether, end, or datapack dimension ID.
+            x1 z1 x2 z2: Block coordinates of two opposite corners of area. Whole chunks (all heights) are restored.
+            now optional: Skip 15s wait to stop server.
+
+        Usage:
+            ?chunkrestore 12 overworld -120 300 -40 410
+            ?wcr 5 nether 0 0 64 64 now
+        """
+
+        usage = "Usage: `?chunkrestore <id> <dimension> <x1> <z1> <x2> <z2> [now]`\nExample: `?chunkrestore 12 overworld -120 300 -40 410`"
+        if not (backup := await get_catalog_backup(backup_id, 'world', usage)):
+            return
+        try: coords = [int(i) for i in (x1, z1, x2, z2)]
+        except ValueError:
+            await backend.send_msg(usage)
+            return
+
+        fetched_restore = backup['path']
+        lprint(ctx, f"INFO: Chunk restoring {dimension} {coords} from backup: {fetched_restore}")
+        # Server has to be stopped, it would save loaded chunks over the restored ones.
+        if await backend.send_command(f"say ---WARNING--- Rolling back area {x1} {z1} to {x2} {z2} in 5s! : {fetched_restore}"):
+            await asyncio.sleep(5)
+            await ctx.invoke(self.bot.get_command('serverstop'), now=now)
+
+        if not (result := await backend.chunk_restore(backup, dimension, *coords)):
+            await backend.send_msg(f"**Error:** Issue restoring chunks (is server stopped? dimension right?), world not changed: {fetched_restore}")
+            lprint(ctx, "ERROR: Chunk restore: " + fetched_restore)
+            return
+
+        await backend.send_msg(f"**Restored Chunks:** {result['chunks']} in `{result['dimension']}` from `{fetched_restore}`"
+                               + (f", {result['removed']} not in backup removed." if result['removed'] else ''))
+        await backend.send_msg("Use `?restoreundo` to put back previous chunks, only until server is started.")
+        lprint(ctx, "Chunks restored: " + fetched_restore)
+        await backend.send_msg("Start server with `?start` or click bmode", view=comps.new_buttons(start_button))
+
     @commands.command(aliases=['deleteworld', 'wbd'])
-    async def worldbackupdelete(self, ctx, index=''):
+    async def worldbackupdelete(self, ctx, backup_id=''):
         """
         Delete a world backup.
 
         Args:
-            index: Index number of the backup to delete. Get number with ?worldbackups command.
+            backup_id: ID of the backup to delete. Get ID with ?worldbackups command.
 
         Usage:
-            ?delete 0
+            ?delete 12
         """
 
-        if index == 'bmode':
-            index = comps.get_data('second_selected')
-        try: index = int(index)
-        except:
-            await backend.send_msg("Usage: `?worldbackupdelete <index>`\nExample: `?wbd 1`")
+        if not (backup := await get_catalog_backup(backup_id, 'world', "Usage: `?worldbackupdelete <id>`\nExample: `?wbd 12`")):
             return
 
-        to_delete = file_utils.get_from_index(config.get_config('world_backups_path'), index, 'd')
+        to_delete = backup['name']
         lprint(ctx, f"INFO: Deleting world backup {to_delete}")
-        if not to_delete:
-            await backend.send_msg("No backup was selected.")
-            return
-
-        if file_utils.delete_dir(to_delete):
+        if backend.delete_backup(backup):
+            backend.empty_trash()
             await backend.send_msg(f"**World Backup Deleted:** `{to_delete}`")
             lprint(ctx, "INFO: Deleted world backup: " + to_delete)
         else:
@@ -195,10 +298,12 @@ class World_Backups(commands.Cog):
         await backend.send_msg("**NOTE:** Next launch may take longer.")
         lprint(ctx, f"INFO: Resetting world")
 
-        if file_utils.delete_dir(join(config.get_config('server_path'), 'world')) is False:
+        # Moved to trash so this is instant, deleted in background.
+        if file_utils.trash_dir(join(config.get_config('server_path'), 'world')) is False:
             await backend.send_msg("Error trying to reset world.")
             lprint(ctx, "ERROR: Issue deleting world folder.")
         else:
+            backend.empty_trash()
             await backend.send_msg("**Finished.**")
             await backend.send_msg("You can now start the server with `?start`.")
             lprint(ctx, "World Reset")
@@ -220,18 +325,15 @@ class Server_Backups(commands.Cog):
             ?serversaves 15
         """
 
-        servers = file_utils.enum_dirs_for_discord(config.get_config('server_backups_path'), 'd')
-        lprint(ctx, f"Fetched {amount} world backups")
-        if servers is False:
+        servers = backup_catalog.get_backups(config.server_name, 'server', amount)
+        lprint(ctx, f"Fetched {amount} server backups")
+        if not servers:
             await backend.send_msg("No server backups found.")
             return
 
-        embed = discord.Embed(title='Server Backups :floppy_disk:')
-        for save in servers[-amount:]:
-            embed.add_field(name=save[3], value=f"`{save[0]}`", inline=False)
-        await backend.send_msg(embed=embed)
+        await backend.send_msg(embed=backups_embed(servers, 'Server Backups :floppy_disk:'))
 
-        await backend.send_msg("Use `?serverrestore <index>` to restore server.")
+        await backend.send_msg("Use `?serverrestore <id>` to restore server.")
         await backend.send_msg("**WARNING:** Restore will overwrite current server. Create backup using `?serverbackup <codename>`.")
 
     @commands.command(aliases=['backupserver', 'newserverbackup', 'serverbackupnew', 'sbn'])
@@ -253,7 +355,6 @@ class Server_Backups(commands.Cog):
         name = utils.format_args(name)
         lprint(ctx, f"Creating new server backup {name}")
         await backend.send_msg(f"***Creating Server Backup...*** :new::floppy_disk:")
-        if await backend.send_command(f"save-all"): await asyncio.sleep(3)
 
         if new_backup := await backend.new_backup(name, mode='server'):
             await backend.send_msg(f"**New Server Backup:** `{new_backup}`")
@@ -276,72 +377,92 @@ class Server_Backups(commands.Cog):
         await ctx.invoke(self.bot.get_command('serverbackup'), '')
 
     @commands.command(aliases=['restoreserver', 'serverbackuprestore', 'restoreserverbackup', 'sbr'])
-    async def serverrestore(self, ctx, index='', now=''):
+    async def serverrestore(self, ctx, backup_id='', now=''):
         """
         Restore server backup.
 
         Args:
-            index: Number of the backup to restore. Get number from ?serversaves command.
+            backup_id: ID of the backup to restore. Get ID from ?serversaves command.
             now optional: Stop server without 15s wait.
 
         Usage:
-            ?serverrestore 0
-            ?sbr 1 now
+            ?serverrestore 4
+            ?sbr 4 now
         """
 
-        if index == 'bmode':
-            index = comps.get_data('second_selected')
-        try: index = int(index)
-        except:
-            await backend.send_msg("Usage: `?serverrestore <index> [now]`\nExample: `?serverrestore 2 now`")
+        if not (backup := await get_catalog_backup(backup_id, 'server', "Usage: `?serverrestore <id> [now]`\nExample: `?serverrestore 4 now`")):
             return
-        if not index: return
 
-        fetched_restore = file_utils.get_from_index(config.get_config('server_backups_path'), index, 'd')
+        fetched_restore = backup['path']
         lprint(ctx, f"Restoring server from backup: {fetched_restore}")
         await backend.send_msg(f"***Restoring Server...*** :floppy_disk::leftwards_arrow_with_hook:")
+        if not (folders := await backend.stage_restore(fetched_restore, 'server')):
+            await backend.send_msg("**ERROR:** Could not restore server! Current server files not changed.")
+            lprint(ctx, "ERROR: Server restore: " + fetched_restore)
+            return
 
         if await backend.send_command(f"say ---WARNING--- Initiating jump to save point in 5s! : {fetched_restore}"):
             await asyncio.sleep(5)
             await ctx.invoke(self.bot.get_command('serverstop'), now=now)
 
-        try: await backend.restore_backup(fetched_restore, 'server')
-        except:
-            await backend.send_msg("**ERROR:** Could not restore server!")
-            lprint(ctx, "ERROR: Server restore: " + fetched_restore)
+        if not await backend.swap_restore(fetched_restore, 'server', folders):
+            await backend.send_msg("**ERROR:** Could not swap in restored server (is server stopped?). Current server files not changed.")
+            lprint(ctx, "ERROR: Server restore swap: " + fetched_restore)
             return
 
         await backend.send_msg(f"**Server Restored:** `{fetched_restore}`")
+        await backend.send_msg("Use `?restoreundo` to put back previous server files, only until server is started.")
         await backend.send_msg("Start server with `?start` or click bmode", view=comps.new_buttons(start_button))
         lprint(ctx, "Server restored: " + fetched_restore)
 
+    @commands.command(aliases=['undorestore', 'restoreback'])
+    async def restoreundo(self, ctx, now=''):
+        """
+        Undo last world or server restore, puts back the files it replaced. Only works until server is started.
+
+        Args:
+            now optional: Stop server without 15s wait.
+
+        Usage:
+            ?restoreundo
+        """
+
+        if not (info := backend.get_restore_undo_info()):
+            await backend.send_msg("No restore to undo. Replaced files are deleted once server starts.")
+            return
+
+        lprint(ctx, f"Undoing restore of {info['backup']}")
+        if await backend.send_command("say ---WARNING--- Undoing restore in 5s!"):
+            await asyncio.sleep(5)
+            await ctx.invoke(self.bot.get_command('serverstop'), now=now)
+
+        if await backend.undo_restore():
+            await backend.send_msg(f"**Undid {info['mode']} restore:** `{os.path.basename(info['backup'])}`")
+            await backend.send_msg("Start server with `?start` or click bmode", view=comps.new_buttons(start_button))
+        else:
+            await backend.send_msg("**ERROR:** Could not undo restore (is server stopped?).")
+            lprint(ctx, "ERROR: Undo restore: " + info['backup'])
+
     @commands.command(aliases=['deleteserverrestore', 'serverdeletebackup', 'serverrestoredelete', 'sbd'])
-    async def serverbackupdelete(self, ctx, index=''):
+    async def serverbackupdelete(self, ctx, backup_id=''):
         """
         Delete a server backup.
 
         Args:
-            index: Index of server save, get with ?serversaves command.
+            backup_id: ID of server backup, get with ?serversaves command.
 
         Usage:
-            ?serverbackupdelete 0
+            ?serverbackupdelete 4
             ?sbd 5
         """
 
-        if index == 'bmode':  # If this command triggered from a bmode.
-            index = comps.get_data('second_selected')
-        try: index = int(index)
-        except:
-            await backend.send_msg("Usage: `?serverbackupdelete <index>`\nExample: `?sbd 3`")
+        if not (backup := await get_catalog_backup(backup_id, 'server', "Usage: `?serverbackupdelete <id>`\nExample: `?sbd 4`")):
             return
 
-        to_delete = file_utils.get_from_index(config.get_config('server_backups_path'), index, 'd')
+        to_delete = backup['name']
         lprint(ctx, f"Deleting server backup: {to_delete}")
-        if not to_delete:
-            await backend.send_msg("No backup was selected.")
-            return
-
-        if file_utils.delete_dir(to_delete):
+        if backend.delete_backup(backup):
+            backend.empty_trash()
             await backend.send_msg(f"**Server Backup Deleted:** `{to_delete}`")
             lprint(ctx, "Deleted server backup: " + to_delete)
         else:
@@ -351,6 +472,168 @@ class Server_Backups(commands.Cog):
         if comps.get_data('server_panel_components'):
             await ctx.invoke(self.bot.get_command('_update_control_panel'), 'server_backups')  # Updates panel if open
 
+
+class Backup_Jobs(commands.Cog):
+    def __init__(self, bot): self.bot = bot
+
+    @commands.command(aliases=['joblist', 'backupjobs', 'showjobs'])
+    async def jobs(self, ctx):
+        """Shows running, queued, and recently finished backup/restore jobs."""
+
+        if not (jobs := backend.jobs.get_jobs()):
+            await backend.send_msg("No jobs.")
+            return
+
+        await backend.send_msg('```' + '\n'.join(i.get_status() for i in jobs[-15:]) + '```')
+        await backend.send_msg("Use `?jobcancel <id>` to cancel a job.")
+        lprint(ctx, "Fetched jobs")
+
+    @commands.command(aliases=['canceljob', 'jobstop', 'stopjob', 'jc'])
+    async def jobcancel(self, ctx, job_id=''):
+        """
+        Cancel queued or running job.
+
+        Args:
+            job_id: Job number from ?jobs.
+
+        Usage:
+            ?jobcancel 3
+
+        Note: Cancelled backups are deleted. Cancelling a restore leaves current world and server files as they were.
+        """
+
+        try: job_id = int(job_id)
+        except:
+            await backend.send_msg("Usage: `?jobcancel <id>`\nExample: `?jobcancel 3`")
+            return
+
+        if job := backend.jobs.cancel(job_id):
+            await backend.send_msg(f"**Cancelling:** `{job.get_status()}`")
+            lprint(ctx, f"Cancelling job: {job.name}")
+        else: await backend.send_msg(f"**Error:** No queued or running job with ID {job_id}.")
+
+
+class Backup_Retention(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.prune_task.start()
+
+    @tasks.loop(seconds=config.get_config('retention_check_interval'))
+    async def prune_task(self):
+        """Deletes backups expired by servers' retention policies, see retention_hourly, etc configs."""
+
+        await self.bot.wait_until_ready()
+        if any(backup_retention.is_enabled(i) for i in config.servers.values()):
+            await backend.prune_backups()
+
+    @commands.command(aliases=['backupretention', 'prunebackups', 'retention'])
+    async def backupprune(self, ctx, preview=''):
+        """
+        Deletes backups not kept by retention policy now, instead of waiting for next scheduled check.
+
+        Args:
+            preview optional: Only show what would be deleted.
+
+        Usage:
+            ?backupprune preview
+            ?backupprune
+        """
+
+        sc = config.server_configs
+        await backend.send_msg(f"**Retention:** hourly `{sc['retention_hourly']}`, daily `{sc['retention_daily']}`, weekly `{sc['retention_weekly']}`, "
+                               f"max `{utils.format_bytes(sc['retention_max_bytes']) if sc['retention_max_bytes'] else 'no limit'}`")
+
+        if not (expired := backend.get_expired_backups()):
+            await backend.send_msg("No backups to prune.")
+            return
+        names = '\n'.join(f"{i['server']} {i['kind']} {i['id']}: {i['name']}" for i in expired[:25])
+        await backend.send_msg(f"**Expired backups:** ({len(expired)})\n```{names}```")
+        if preview: return
+
+        if backend.backups_running:
+            await backend.send_msg("Backups running, try again once they're done.")
+            return
+
+        lprint(ctx, f"Pruning {len(expired)} backups")
+        deleted = await backend.prune_backups()
+        await backend.send_msg(f"**Pruned:** {deleted or 0} backups deleted.")
+
+
+class Backup_Verify(commands.Cog):
+    def __init__(self, bot): self.bot = bot
+
+    @commands.command(aliases=['verifybackup', 'checkbackup', 'bv'])
+    async def backupverify(self, ctx, backup_id=''):
+        """
+        Check a world or server backup can be restored: files match their hashes in catalog, and region files aren't corrupted.
+
+        Args:
+            backup_id: ID from ?worldbackups or ?serverbackups.
+
+        Usage:
+            ?backupverify 12
+        """
+
+        if not (backup := await get_catalog_backup(backup_id, None, "Usage: `?backupverify <id>`\nExample: `?backupverify 12`")):
+            return
+
+        lprint(ctx, f"Verifying backup: {backup['path']}")
+        if not (result := await backend.verify_backup(backup)):
+            await backend.send_msg(f"**Error:** Could not verify backup: `{backup['name']}`")
+            return
+
+        if result['ok']:
+            await backend.send_msg(f"**Backup OK:** ID {backup['id']} `{backup['name']}`, {result['checked']} checked in {result['seconds']:.1f}s.")
+        else:
+            problems = '\n'.join(result['problems'][:10])
+            await backend.send_msg(f"**Backup Verify Failed:** ID {backup['id']} `{backup['name']}`\n```{problems}```")
+        lprint(ctx, f"Verified backup: {backup['path']} ({'ok' if result['ok'] else 'failed'})")
+
+
+class Backup_Offsite(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        if backup_offsite.is_enabled():
+            self.offsite_task.start()
+            lprint(f"Offsite upload task started (bucket: {config.get_config('offsite_bucket')})")
+
+    @tasks.loop(seconds=config.get_config('offsite_check_interval'))
+    async def offsite_task(self):
+        """Uploads backups that aren't in offsite storage yet, e.g. ones that failed or were made while bot was off."""
+
+        await self.bot.wait_until_ready()
+        backend.replicate_backups()
+
+    @commands.command(aliases=['offsitestatus', 'offsiteupload', 'replicate'])
+    async def offsite(self, ctx, now=''):
+        """
+        Shows backups not uploaded to offsite storage (offsite_bucket config) yet.
+
+        Args:
+            now optional: Start uploading them now, instead of waiting for next check.
+
+        Usage:
+            ?offsite
+            ?offsite now
+        """
+
+        if not backup_offsite.is_enabled():
+            await backend.send_msg("Offsite uploads are disabled, set `offsite_bucket` in bot config (needs `boto3` module).")
+            return
+
+        pending = backup_catalog.get_unreplicated_backups()
+        names = '\n'.join(f"{i['server']} {i['kind']} {i['id']}: {i['name']}" for i in pending[:25])
+        await backend.send_msg(f"**Not uploaded yet:** {len(pending)} backups" + (f"\n```{names}```" if pending else ''))
+        if now and pending:
+            backend.replicate_backups()
+            await backend.send_msg("Uploading in background, see `?jobs`.")
+        lprint(ctx, "Fetched offsite status")
+
+
 async def setup(bot):
     await bot.add_cog(World_Backups(bot))
     await bot.add_cog(Server_Backups(bot))
+    await bot.add_cog(Backup_Jobs(bot))
+    await bot.add_cog(Backup_Retention(bot))
+    await bot.add_cog(Backup_Verify(bot))
+    await bot.add_cog(Backup_Offsite(bot))
@@ -10,6 +10,8 @@ from bot_files.slime_backend import backend
 from run_bot import __version__, __date__, __author__, config
 from bot_files.slime_utils import lprint, file_utils, utils
 from bot_files.discord_components import comps, buttons_dict
+from bot_files.address_resolver import address_resolver
+from bot_files.backup_catalog import backup_catalog
 
 
 class Slime_Bot_Commands(commands.Cog):
@@ -83,6 +85,7 @@ class Slime_Bot_Commands(commands.Cog):
         """Restart this bot."""
 
         await backend.send_msg("**Bot Halted**")
+        await self.bot.close()  # Closes Discord connection and shared sessions, see Slime_Bot.close().
         sys.exit(1)
 
     @commands.command(aliases=['blog'])
@@ -125,28 +128,28 @@ class Slime_Bot_Commands(commands.Cog):
         """Shows help page with embed format, using reactions to navigate pages."""
 
         current_command, embed_page, contents = 0, 1, []
-        pages, current_page, page_limit = 8, 1, 10
+        current_page, page_limit = 1, 10
 
         def new_embed(page):
             return discord.Embed(title=f'Help Page {page}/{pages} :question:')
 
-        embed = new_embed(embed_page)
         commands = file_utils.read_csv(f"{config.bot_source_path}//bot_files//command_info.csv")
         if not commands:
             lprint(ctx, "ERROR: Issue reading command help file.")
             backend.send_msg("**ERROR:** Issue fetching help pages. You can also use `?help`.")
             return
+        commands = [i for i in commands if i]
+        pages = -(-len(commands) // page_limit)  # Rounds up.
+        embed = new_embed(embed_page)
         lprint(ctx, "Fetched help page")
         for command in commands:
-            if not command: continue
-
             embed.add_field(name=command[0], value=f"{command[1]}\n{', '.join(command[2:])}", inline=False)
             current_command += 1
             if not current_command % page_limit:
                 embed_page += 1
                 contents.append(embed)
                 embed = new_embed(embed_page)
-        contents.append(embed)
+        if len(embed.fields): contents.append(embed)
 
         # getting the message object for editing and reacting
         message = await backend.send_msg(embed=contents[0])
@@ -188,10 +191,9 @@ class Slime_Bot_Commands(commands.Cog):
             ?address
         """
 
-        await backend.send_msg(f"Server Address: ||`{utils.get_public_ip()}:{config.get_config('server_port')}`||")
-        try: ping = f"({float(await backend.server_ping())}ms)"
-        except: ping = ''
-        await backend.send_msg(f"Alternative Address: ||`{config.get_config('server_address')}`|| {ping}")
+        await backend.send_msg(f"Server Address: ||`{address_resolver.get_public_ip()}:{config.get_config('server_port')}`||")
+        resolved = f" ({', '.join(ips)})" if (ips := address_resolver.get_address_ips()) else ''
+        await backend.send_msg(f"Alternative Address: ||`{config.get_config('server_address')}`{resolved}||")
         lprint(ctx, 'Fetched server address')
 
     @commands.command(aliases=['websites', 'showlinks', 'usefullinks', 'sites', 'urls'])
@@ -394,13 +396,13 @@ class Discord_Components_Funcs(commands.Cog):
             params = ["**Servers**", 'second_selected', 'Select Server']
 
         elif mode == 'world_backups':
-            select_options, total_pages = utils.group_items(file_utils.enum_dirs_for_discord(config.get_config('world_backups_path'), 'db'))
+            select_options, total_pages = utils.group_items([[i['name'], i['id'], False, f"ID {i['id']}"] for i in backup_catalog.get_backups(config.server_name, 'world')])
             if not select_options: select_options = [[['No world backups', '_', True]]]
             buttons2 = [['Restore', 'worldbackuprestore bmode', '\U000021A9'], ['Delete', 'worldbackupdelete bmode', '\U0001F5D1'], ['Backup World', 'worldbackupdate', '\U0001F195']]
             params = ["**World Backups**", 'second_selected', 'Select World Backup']
 
         elif mode == 'server_backups':
-            select_options, total_pages = utils.group_items(file_utils.enum_dirs_for_discord(config.get_config('server_backups_path'), 'db'))
+            select_options, total_pages = utils.group_items([[i['name'], i['id'], False, f"ID {i['id']}"] for i in backup_catalog.get_backups(config.server_name, 'server')])
             if not select_options: select_options = [[['No server backups', '_', True]]]
             buttons2 = [['Restore', 'serverrestore bmode', '\U000021A9'], ['Delete', 'serverbackupdelete bmode', '\U0001F5D1'], ['Backup Server', 'serverbackupdate', '\U0001F195']]
             params = ["**Server Backups**", 'second_selected', 'Select Server Backup']
@@ -0,0 +1,135 @@
+import math
+import asyncio
+
+from discord.ext import commands, tasks
+
+from bot_files.slime_backend import backend
+from bot_files.slime_config import config
+from bot_files.slime_utils import lprint, utils
+from bot_files.server_metrics import server_metrics, tick_monitor
+from bot_files.io_throttle import io_throttle
+from bot_files.discord_components import comps
+
+
+# ========== Performance: server process resource usage, TPS/MSPT monitoring.
+class Performance(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+        if config.get_config('enable_metrics_sampler'):
+            self.metrics_sampler_task.start()
+            lprint(f"Metrics sampler task started (interval: {config.get_config('metrics_sample_interval')}s)")
+        if config.get_config('enable_tick_monitor'):
+            self.tick_monitor_task.start()
+            lprint(f"Tick monitor task started (interval: {config.get_config('tick_monitor_interval')}s)")
+
+    @tasks.loop(seconds=config.get_config('metrics_sample_interval'))
+    async def metrics_sampler_task(self):
+        """Records CPU, memory, threads, open files, and disk I/O of each running server's process tree."""
+
+        await self.bot.wait_until_ready()
+        # psutil calls are blocking, process scans can take a bit on busy hosts.
+        await asyncio.get_event_loop().run_in_executor(None, server_metrics.sample, backend.get_server_pids())
+
+    @tasks.loop(seconds=config.get_config('tick_monitor_interval'))
+    async def tick_monitor_task(self):
+        """Records TPS and MSPT of selected server, sends alert to channel if past thresholds."""
+
+        await self.bot.wait_until_ready()
+        server_name = config.server_name
+
+        values = {}
+        if tick_monitor.uses_tick_commands(config.server_configs):
+            values = await backend.get_tick_times()
+
+        # Falls back to "Can't keep up!" log lines. Skipped if server is offline, since no lag lines would look like perfect TPS.
+        if 'tps' not in values and config.get_config('server_files_access'):
+            log_values = tick_monitor.read_lag_log(server_name, config.get_config('server_log_filepath'))
+            if log_values and await backend.server_pingable():
+                values = {**log_values, **values}
+
+        io_throttle.update(values)  # Backup jobs back off while server is lagging.
+        if not values:
+            return
+
+        tick_monitor.record(server_name, values)
+        if alert := tick_monitor.check_alert(server_name, values):
+            await backend.send_msg(alert)
+            lprint(f"WARNING: Lag alert: {server_name} {values}")
+
+    @commands.command(aliases=['performance', 'resources', 'serverperf', 'usage'])
+    async def perf(self, ctx, window='1h', *server_name):
+        """
+        Show server process resource usage: min/avg/max/p95 over a time window.
+
+        Args:
+            window optional default(1h): Time window, e.g. 30s, 5m, 1h, 1d. Number without unit is minutes.
+            server_name optional: Server to show, defaults to selected server.
+
+        Usage:
+            ?perf
+            ?perf 5m
+            ?perf 1d papermc
+        """
+
+        server_name = utils.format_args(server_name) or config.server_name
+        seconds = utils.parse_time_window(window)
+
+        if not config.get_config('enable_metrics_sampler'):
+            await backend.send_msg("Metrics sampler is disabled. Set `enable_metrics_sampler` to true in configs.")
+            return
+        if not (stats := server_metrics.get_stats(server_name, seconds)):
+            await backend.send_msg(f"No metrics for `{server_name}` yet. Server process may not be running or wasn't found.")
+            return
+
+        # Metric name, display name, value formatter.
+        metrics = [['cpu', 'CPU', lambda v: f"{v:.1f}%"], ['rss', 'Memory (RSS)', utils.format_bytes],
+                   ['threads', 'Threads', lambda v: f"{v:.0f}"], ['open_files', 'Open Files', lambda v: f"{v:.0f}"],
+                   ['read_rate', 'Disk Read', lambda v: f"{utils.format_bytes(v)}/s"], ['write_rate', 'Disk Write', lambda v: f"{utils.format_bytes(v)}/s"]]
+        fields = []
+        for key, name, fmt in metrics:
+            if data := stats.get(key):
+                fields.append([name, f"Min: `{fmt(data['min'])}` | Avg: `{fmt(data['avg'])}`\nMax: `{fmt(data['max'])}` | P95: `{fmt(data['p95'])}`", True])
+
+        samples = max(i['count'] for i in stats.values() if i)
+        fields.append(['Samples', f"{samples} over last {window} (every {config.get_config('metrics_sample_interval')}s)", False])
+        await backend.send_msg(embed=comps.new_embed(fields, f"Performance - {server_name} :bar_chart:"))
+        lprint(ctx, f"Fetched performance metrics: {server_name} {window}")
+
+    @commands.command(aliases=['mspt', 'ticks', 'lag', 'servertps'])
+    async def tps(self, ctx, window='15m'):
+        """
+        Show server TPS (ticks per second) and MSPT (milliseconds per tick) over a time window.
+
+        Args:
+            window optional default(15m): Time window, e.g. 5m, 1h, 1d. Number without unit is minutes.
+
+        Usage:
+            ?tps
+            ?tps 1h
+
+        Note: MSPT is only available with PaperMC 'mspt' command. Other servers use "Can't keep up!" log lines to estimate TPS.
+        """
+
+        server_name = config.server_name
+        if not config.get_config('enable_tick_monitor'):
+            await backend.send_msg("Tick monitor is disabled. Set `enable_tick_monitor` to true in configs.")
+            return
+        if not (stats := tick_monitor.get_stats(server_name, utils.parse_time_window(window))):
+            await backend.send_msg(f"No TPS data for `{server_name}` yet. Data is collected every {config.get_config('tick_monitor_interval')}s while server is online.")
+            return
+
+        metrics = [['tps', 'TPS', lambda v: f"{v:.1f}"], ['mspt', 'MSPT', lambda v: f"{v:.1f}ms"], ['behind_ms', 'Lag (Can\'t keep up!)', lambda v: f"{v:.0f}ms"]]
+        fields = []
+        latest = tick_monitor.get_buffer(server_name).latest()
+        for key, name, fmt in metrics:
+            if data := stats.get(key):
+                now_value = fmt(latest[key]) if not math.isnan(latest[key]) else 'N/A'
+                fields.append([name, f"Now: `{now_value}`\nMin: `{fmt(data['min'])}` | Avg: `{fmt(data['avg'])}`\nMax: `{fmt(data['max'])}` | P95: `{fmt(data['p95'])}`", True])
+        fields.append(['Alerts', f"TPS below `{config.get_config('tps_alert_threshold')}`, MSPT above `{config.get_config('mspt_alert_threshold')}` (0 is disabled)", False])
+        await backend.send_msg(embed=comps.new_embed(fields, f"Tick Health - {server_name} ({window}) :chart_with_downwards_trend:"))
+        lprint(ctx, f"Fetched TPS: {server_name} {window}")
+
+
+async def setup(bot):
+    await bot.add_cog(Performance(bot))
@@ -18,7 +18,7 @@ class Player(commands.Cog):
     async def players(self, ctx, *args):
         """
         Show list of online players.
-        NOTE: If getting player locations might take awhile if a lot of online players. Needs to use /data get entity command to get coords.
+        NOTE: Getting player locations uses /data get entity command, all players are fetched in one batch.
 
         Args:
             args optional: Just used to catch possible 'location' arg.
@@ -42,10 +42,13 @@ class Player(commands.Cog):
             await backend.send_msg("**Error:** Unable to fetch player list.")
             return
 
+        # Get xyz coords for all players at once.
+        coords = await backend.get_players_coords(player_list[0]) if 'location' in args else {}
+
         _player_list = []
         for i in player_list[0]:
-            if 'location' in args:  # Get xyz coords for each player.
-                player_location = await backend.get_coords(i)
+            if 'location' in args:
+                player_location = coords.get(i.strip().lower())
                 _player_list.append(f'{i.strip()} {player_location if player_location else "Location N/A"}\n')
             else: _player_list.append(f'{i.strip()}, ')
 
@@ -64,7 +67,7 @@ class Player(commands.Cog):
     async def playerlocations(self, ctx):
         """
         Shows all online player's xyz location.
-        NOTE: Might take awhile if a lot of online players. Needs to use '/data get entity' command to get coords.
+        NOTE: Uses '/data get entity' command to get coords, all players are fetched in one batch.
         """
 
         await ctx.invoke(self.bot.get_command('players'), 'location')
@@ -1,3 +1,4 @@
+import time
 import asyncio
 from os import listdir
 from os.path import join, isdir, isfile
@@ -9,6 +10,7 @@ from bot_files.slime_backend import backend
 from bot_files.slime_config import config
 from bot_files.slime_utils import lprint, utils, file_utils
 from bot_files.discord_components import comps
+from bot_files.address_resolver import address_resolver
 
 
 # ========== Server: autosave, Start/stop, Status, edit property, backup/restore.
@@ -329,6 +331,8 @@ class Server_Admin(commands.Cog):
         """Automatically sends save-all command to server at interval of x minutes."""
 
         await self.bot.wait_until_ready()
+        # Skipped while a backup has saving paused, a save would change files being copied.
+        if config.server_name in backend.saving_paused: return
         # Will only send command if server is active. use ?check or ?stats to update server_active boolean so this can work.
         if await backend.send_command('save-all'):
             lprint(f"Autosaved (interval: {config.get_config('autosave_interval')}m)")
@@ -472,7 +476,7 @@ class Server_Admin(commands.Cog):
         """
         Start Minecraft server.
 
-        Note: Depending on your system, server may take 15 to 40+ seconds to fully boot.
+        Note: Finishes when server logs that it's done loading or replies to a ping. Depending on your system, server may take 15 to 40+ seconds to fully boot.
         """
 
         # Exits function if server already online.
@@ -481,14 +485,20 @@ class Server_Admin(commands.Cog):
             await backend.send_msg("**Server ACTIVE** :green_circle:")
             return False
 
+        log_position = backend.get_log_position()
+        started_at = time.monotonic()
         if not await backend.server_api.server_start():
             await backend.send_msg("**Error:** Could not start Minecraft server.")
             return False
-        await backend.send_msg(f"***Launching Minecraft Server...*** :rocket:\nServer Selected: **{config.get_config('server_name')}**\nStartup time: {config.get_config('startup_wait_time')}s.")
-        await backend.send_msg("Use `?check` or `?status` to get more server info.")
-
+        await backend.send_msg(f"***Launching Minecraft Server...*** :rocket:\nServer Selected: **{config.get_config('server_name')}**\nTimeout: {backend.get_startup_timeout():.0f}s.")
         lprint(ctx, "Starting Minecraft Server")
 
+        if startup_time := await backend.wait_for_server_start(log_position, started_at):
+            await backend.send_msg(f"**Server ACTIVE** :green_circle: Startup took {startup_time}s.")
+        else:
+            await backend.send_msg("**WARNING:** Server hasn't reported it's ready yet, it may still be starting. Check `?serverlog`.")
+        await backend.send_msg("Use `?check` or `?status` to get more server info.")
+
     @commands.command(aliases=['stopserver', 'stop'])
     async def serverstop(self, ctx, now=''):
         """
@@ -507,23 +517,21 @@ class Server_Admin(commands.Cog):
             return
 
         await backend.send_msg("***Stopping Minecraft Server...***")
-        if 'now' in now:
-            await backend.send_command('save-all')
-            await asyncio.sleep(3)
-            await backend.server_api.server_stop()
-        else:
+        if 'now' not in now:
             await backend.send_command('say ---WARNING--- Server will halt in 15s!')
             await backend.send_msg("***Halting Minecraft Server in 15s...***")
             await asyncio.sleep(10)
             await backend.send_command('say ---WARNING--- 5s left!')
             await asyncio.sleep(5)
-            await backend.send_command('save-all')
-            await asyncio.sleep(3)
 
-            await backend.server_api.server_stop()
+        # Server saves world on stop, wait_for_server_stop() waits for it to finish.
+        log_position = backend.get_log_position()
+        await backend.server_api.server_stop()
 
-        await asyncio.sleep(1)
-        await backend.send_msg("**Halted Minecraft Server** :stop_sign:")
+        if await backend.wait_for_server_stop(log_position):
+            await backend.send_msg("**Halted Minecraft Server** :stop_sign:")
+        else:
+            await backend.send_msg(f"**WARNING:** Server didn't confirm shutdown within {config.get_config('shutdown_timeout')}s. Check with `?check`.")
         lprint(ctx, "Stopping Server")
 
     @commands.command(aliases=['restartserver', 'restart'])
@@ -543,14 +551,45 @@ class Server_Admin(commands.Cog):
         lprint(ctx, "Restarting Server")
         await backend.send_msg("***Restarting Minecraft Server...*** :repeat:")
         await ctx.invoke(self.bot.get_command('serverstop'), now=now)
-
-        await asyncio.sleep(3)
         await ctx.invoke(self.bot.get_command('serverstart'))
 
+    @commands.command(aliases=['starttimes', 'startuptimes', 'sst'])
+    async def serverstarttimes(self, ctx, amount=10):
+        """
+        Show recorded startup times for selected server.
+
+        Args:
+            amount optional default(10): Number of most recent startups to show.
+
+        Usage:
+            ?serverstarttimes
+            ?sst 20
+        """
+
+        history = backend.get_startup_history()
+        if not history:
+            await backend.send_msg("No recorded startup times. Start server with `?start` to record one.")
+            return
+
+        seconds = [i['seconds'] for i in history]
+        fields = [['Recent', '\n'.join(f"{i['date']}: `{i['seconds']}s`" for i in history[-amount:])],
+                  ['Stats', f"Min: `{min(seconds)}s` | Avg: `{sum(seconds) / len(seconds):.1f}s` | Max: `{max(seconds)}s`"],
+                  ['Startup Timeout', f"`{backend.get_startup_timeout():.0f}s`"]]
+        await backend.send_msg(embed=comps.new_embed(fields, f"Startup Times - {config.get_config('server_name')} :stopwatch:"))
+        lprint(ctx, "Fetched startup times")
+
 
 class Server(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.address_refresh_task.start()
+
+    @tasks.loop(seconds=config.get_config('address_refresh_interval'))
+    async def address_refresh_task(self):
+        """Keeps public IP and server_address lookup fresh so status commands don't have to wait on them."""
+
+        await self.bot.wait_until_ready()
+        await address_resolver.refresh()
 
     @commands.command(aliases=['lversion', 'lver', 'lv', 'checklatest', 'checkupdate'])
     async def latestversion(self, ctx):
@@ -566,6 +605,9 @@ class Server(commands.Cog):
     async def saveall(self, ctx):
         """Save current world using server save-all command."""
 
+        if config.server_name in backend.saving_paused:
+            await backend.send_msg("Saving is paused while a backup runs, world was saved when it started.")
+            return
         if await backend.send_command('save-all') is False: return
 
         await backend.send_msg("World Saved  :floppy_disk:")
@@ -613,23 +655,54 @@ class Server(commands.Cog):
 
     @commands.command(aliases=['stat', 'stats', 'status', 'info'])
     async def serverstatus(self, ctx):
-        """Shows server active status, version, motd, and online players"""
+        """
+        Shows server active status, version, motd, and online players.
+        All info is fetched at the same time, anything that takes longer than status_field_timeout shows as N/A.
+        """
+
+        timeout = config.get_config('status_field_timeout')
+        # Shared between fields, so ping and version are only checked once.
+        ping_task = asyncio.ensure_future(backend.server_ping())
+        version_task = asyncio.ensure_future(backend.get_server_version(force_check=True))
+
+        async def get_status():
+            if config.get_config('check_before_command'):
+                return await backend.server_api.server_console_reachable()
+            return await asyncio.shield(ping_task)  # Same check server_status() would do.
+        status_task = asyncio.ensure_future(get_status())
+
+        async def get_player_list():
+            if not await asyncio.shield(status_task): return False  # Only fetches players list if server online.
+            return await backend.get_players(version=await asyncio.shield(version_task))
+
+        sstatus, version, motd, ping, player_list = await asyncio.gather(
+            utils.run_with_timeout(asyncio.shield(status_task), timeout),
+            utils.run_with_timeout(asyncio.shield(version_task), timeout, 'N/A'),
+            utils.run_with_timeout(backend.get_motd(), timeout, 'N/A'),
+            utils.run_with_timeout(asyncio.shield(ping_task), timeout, 'N/A'),
+            utils.run_with_timeout(get_player_list(), timeout, 'N/A'),
+        )
 
-        sstatus = await backend.server_status()
         if sstatus: status = '**ACTIVE** :green_circle:'
         elif sstatus is False: status = '**INACTIVE** :red_circle:'
         else: status = 'N/A'
+        if ping != 'N/A': ping = 'Working' if ping else 'Broken'
+
         fields = [
-            ['Current Server', f"Status: {status}\nServer: {config.get_config('server_name')}\nDescription: {config.get_config('server_description')}\nVersion: {await backend.get_server_version(force_check=True)}\nMOTD: {await backend.get_motd()}"],
+            ['Current Server', f"Status: {status}\nServer: {config.get_config('server_name')}\nDescription: {config.get_config('server_description')}\nVersion: {version or 'N/A'}\nMOTD: {motd}"],
             ['Autosave', f"{'Enabled' if config.get_config('enable_autosave') else 'Disabled'} ({config.get_config('autosave_interval')}min)"],
-            ['Address', f"Address: ||`{config.get_config('server_address')}:{config.get_config('server_part')}`|| ({'Working' if await backend.server_ping() else 'Broken'})\nIP: ||`{utils.get_public_ip()}`|| (Use if Address broken)"],
+            ['Address', f"Address: ||`{config.get_config('server_address')}:{config.get_config('server_port')}`|| ({ping})\nIP: ||`{address_resolver.get_public_ip()}`|| (Use if Address broken)"],
             ['Location', f"`{config.get_config('server_path')}`"],
             ['Launch Command', f"`{config.get_config('server_launch_command')}`"]
         ]
+        if sstatus is not False:
+            if isinstance(player_list, tuple):
+                players = f"{player_list[1].strip()}\n{', '.join(i.strip() for i in player_list[0])}"
+            elif player_list is None: players = 'No players online.'
+            else: players = 'N/A'
+            fields.insert(1, ['Players', players[:1000]])  # Embed field values are limited to 1024 characters.
         await backend.send_msg(embed=comps.new_embed(fields, 'Server Status'))
 
-        if status is not False:  # Only fetches players list if server online.
-            await ctx.invoke(self.bot.get_command('players'))
         await ctx.invoke(self.bot.get_command('bannermsg'))
         lprint(ctx, "Fetched server status")
 
@@ -205,6 +205,7 @@ class Slime_Bot:
             # TODO use return?
             sys.exit()
 
+        proc_utils.write_pid_file('slime_bot', os.getpid())
         from bot_files.slime_bot import bot
         bot.run(TOKEN, reconnect=True)
 